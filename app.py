@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import streamlit as st
 
-from db.engine import SessionLocal, init_db
-from ui.pages import activity, map_view, rules, settings, simulate, tasks_view
+from db.engine import init_db
+from db.profiler import profile_queries
+from db.tenancy import IDLE_SECONDS, MAX_ENGINES, open_session
+from ui.pages import activity, map_view, metrics, rules, settings, simulate, tasks_view
+from ui.tenant import current_tenant
 
 st.set_page_config(page_title="FlowLedger", layout="wide")
 
@@ -14,22 +17,32 @@ PAGES = {
     "Rule Builder": rules.render,
     "Simulator": simulate.render,
     "Activity": activity.render,
+    "Metrics": metrics.render,
     "Next Actions": tasks_view.render,
     "Settings": settings.render,
 }
 
 
-@st.cache_resource
-def get_session():
-    return SessionLocal()
+@st.cache_resource(max_entries=MAX_ENGINES, ttl=IDLE_SECONDS)
+def get_session(tenant: str | None):
+    return open_session(tenant)
 
 
 def main():
     st.title("FlowLedger")
     st.caption("Personal money routing simulator (dry-run only)")
-    session = get_session()
+    session = get_session(current_tenant())
     page = st.sidebar.radio("Navigate", list(PAGES.keys()))
-    PAGES[page](session)
+    if not st.sidebar.checkbox("Profile SQL", value=False):
+        PAGES[page](session)
+        return
+
+    with profile_queries(session.get_bind(), label=page) as profile:
+        PAGES[page](session)
+    with st.sidebar.expander(f"SQL: {profile.count} queries, {profile.total_seconds * 1000:.1f} ms", expanded=True):
+        for shape in profile.likely_n_plus_one():
+            st.warning(f"Possible N+1 ({shape.count}x): {shape.shape[:200]}")
+        st.code(profile.summary(), language="text")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from db import models
+from db.engine import Base
+from services.imports import ingest_transactions
+from services.rules_engine import evaluate_rules_for_event, run_rule
+from services.simulator import simulate_rule
+
+TX_SIZES = [1_000, 100_000, 1_000_000]
+RULE_SIZES = [10, 1_000]
+# run_rule / evaluate_rules_for_event are timed over a fixed number of events so the
+# curve shows per-event cost as the tables grow, not total work.
+EVENTS_PER_CASE = 1_000
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_OUTPUT = Path("bench_results.json")
+DEFAULT_TOLERANCE = 0.25
+
+DESCRIPTIONS = ["Payroll Deposit", "Coffee Spot Purchase", "Grocer Purchase", "Rent Payment", "Transit Purchase"]
+
+
+@dataclass
+class Case:
+    name: str
+    params: dict
+    setup: Callable[[], tuple[Callable[[], object], Callable[[], None]]]
+
+    @property
+    def key(self) -> str:
+        args = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.name}[{args}]"
+
+
+def _new_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    def close():
+        session.close()
+        engine.dispose()
+
+    return session, close
+
+
+def _tx_rows(n: int) -> list[dict]:
+    start = date.today() - timedelta(days=364)
+    rows = []
+    for i in range(n):
+        desc = DESCRIPTIONS[i % len(DESCRIPTIONS)]
+        amount = 2200.0 if desc == "Payroll Deposit" else -round(10 + (i % 97) * 1.37, 2)
+        rows.append(
+            {
+                "tx_hash": f"bench-{i}",
+                "date": start + timedelta(days=i % 365),
+                "description": f"{desc} #{i}",
+                "amount": amount,
+                "account": "Main Checking",
+                "category": "Bench",
+                "merchant": desc.split()[0],
+                "currency": "USD",
+            }
+        )
+    return rows
+
+
+def _csv_buffer(n: int) -> io.BytesIO:
+    df = pd.DataFrame(_tx_rows(n)).drop(columns=["tx_hash"])
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def _rule_rows(n: int) -> list[dict]:
+    templates = [
+        {
+            "trigger_type": "transaction",
+            "trigger_config": {"description_contains": "Payroll"},
+            "conditions": [{"type": "amount_gte", "value": 1000}],
+            "actions": [{"type": "allocate_percent", "pod_id": 1, "percent": 20}],
+        },
+        {
+            "trigger_type": "transaction",
+            "trigger_config": {"description_contains": "Coffee"},
+            "conditions": [{"type": "amount_lte", "value": -3}],
+            "actions": [{"type": "allocate_fixed", "pod_id": 1, "amount": 5, "up_to_available": True}],
+        },
+        {
+            "trigger_type": "transaction",
+            "trigger_config": {},
+            "conditions": [{"type": "balance_gte", "value": 100}],
+            "actions": [{"type": "liability_suggestion", "title": "Review spend"}],
+        },
+    ]
+    return [
+        {"name": f"bench-rule-{i}", "priority": 100 + i % 50, "enabled": True, **templates[i % len(templates)]}
+        for i in range(n)
+    ]
+
+
+def _seed(session, tx_count: int = 0, rule_count: int = 0) -> None:
+    session.add(models.Pod(name="Essentials", target_balance=1000, current_balance=200))
+    session.add(models.BalanceSnapshot(source_type="account", source_id=1, balance=5000))
+    if tx_count:
+        session.execute(insert(models.Transaction), _tx_rows(tx_count))
+    if rule_count:
+        session.execute(insert(models.Rule), _rule_rows(rule_count))
+    session.commit()
+
+
+def _ingest_case(tx_count: int):
+    def setup():
+        session, close = _new_session()
+        buffer = _csv_buffer(tx_count)
+        return (lambda: ingest_transactions(session, buffer)), close
+
+    return setup
+
+
+def _run_rule_case(tx_count: int):
+    def setup():
+        session, close = _new_session()
+        _seed(session, tx_count=tx_count, rule_count=1)
+        rule = session.scalar(select(models.Rule))
+        txs = session.scalars(select(models.Transaction).limit(EVENTS_PER_CASE)).all()
+
+        def run():
+            for tx in txs:
+                run_rule(session, rule, {"type": "transaction", "event_key": f"tx:{tx.id}", "transaction_id": tx.id}, tx=tx)
+
+        return run, close
+
+    return setup
+
+
+def _evaluate_case(tx_count: int, rule_count: int):
+    def setup():
+        session, close = _new_session()
+        _seed(session, tx_count=tx_count, rule_count=rule_count)
+        tx_ids = session.scalars(select(models.Transaction.id).limit(EVENTS_PER_CASE)).all()
+
+        def run():
+            for tx_id in tx_ids:
+                evaluate_rules_for_event(session, {"type": "transaction", "event_key": f"tx:{tx_id}", "transaction_id": tx_id})
+
+        return run, close
+
+    return setup
+
+
+def _simulate_case(tx_count: int):
+    def setup():
+        session, close = _new_session()
+        _seed(session, tx_count=tx_count, rule_count=1)
+        rule_id = session.scalar(select(models.Rule.id))
+        return (lambda: simulate_rule(session, rule_id, days=365)), close
+
+    return setup
+
+
+def _forecast_case(tx_count: int):
+    def setup():
+        from types import SimpleNamespace
+
+        from ui.pages.simulate import _forecast_cashflow
+
+        txs = [SimpleNamespace(date=r["date"], amount=r["amount"]) for r in _tx_rows(tx_count)]
+        return (lambda: _forecast_cashflow(txs, horizon_days=30)), (lambda: None)
+
+    return setup
+
+
+def build_cases(tx_sizes: list[int], rule_sizes: list[int], only: set[str] | None = None) -> list[Case]:
+    cases: list[Case] = []
+    for n in tx_sizes:
+        cases.append(Case("ingest_transactions", {"tx": n}, _ingest_case(n)))
+        cases.append(Case("run_rule", {"tx": n, "events": min(n, EVENTS_PER_CASE)}, _run_rule_case(n)))
+        for r in rule_sizes:
+            cases.append(
+                Case("evaluate_rules_for_event", {"tx": n, "rules": r, "events": min(n, EVENTS_PER_CASE)}, _evaluate_case(n, r))
+            )
+        cases.append(Case("simulate_rule", {"tx": n}, _simulate_case(n)))
+        cases.append(Case("_forecast_cashflow", {"tx": n}, _forecast_case(n)))
+    if only:
+        cases = [c for c in cases if c.name in only]
+    return cases
+
+
+def measure(case: Case, memory: bool = True) -> dict:
+    run, close = case.setup()
+    try:
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+    finally:
+        close()
+
+    peak_mb = None
+    if memory:
+        # Separate pass: tracemalloc slows allocation-heavy code and would skew timings.
+        run, close = case.setup()
+        try:
+            tracemalloc.start()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_mb = round(peak / (1024 * 1024), 3)
+        finally:
+            tracemalloc.stop()
+            close()
+
+    return {"key": case.key, "name": case.name, "params": case.params, "seconds": round(seconds, 6), "peak_mb": peak_mb}
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    by_key = {r["key"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = by_key.get(result["key"])
+        if not base:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            current, previous = result.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + tolerance):
+                regressions.append(
+                    f"{result['key']} {metric}: {current} vs baseline {previous} (+{(current / previous - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def run_suite(cases: list[Case], memory: bool = True, log=print) -> list[dict]:
+    results = []
+    for case in cases:
+        result = measure(case, memory=memory)
+        log(f"{result['key']:<70} {result['seconds']:>10.3f}s  peak={result['peak_mb']} MB")
+        results.append(result)
+    return results
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="FlowLedger performance benchmarks")
+    parser.add_argument("--tx-sizes", type=_int_list, default=TX_SIZES, help="comma separated transaction counts")
+    parser.add_argument("--rule-sizes", type=_int_list, default=RULE_SIZES, help="comma separated rule counts")
+    parser.add_argument("--only", action="append", help="limit to a benchmark name (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="smallest dataset only (1k tx, 10 rules)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory pass")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="where to write results JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown ratio, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    tx_sizes, rule_sizes = (TX_SIZES[:1], RULE_SIZES[:1]) if args.quick else (args.tx_sizes, args.rule_sizes)
+    cases = build_cases(tx_sizes, rule_sizes, set(args.only) if args.only else None)
+    results = run_suite(cases, memory=not args.no_memory)
+
+    payload = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "results": results}
+    args.output.write_text(json.dumps(payload, indent=2))
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(payload, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
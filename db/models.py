@@ -8,6 +8,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -72,6 +73,16 @@ class Transaction(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class QuarantinedRow(Base):
+    __tablename__ = "quarantined_rows"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    source: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    row_number: Mapped[int] = mapped_column(Integer)
+    payload: Mapped[dict] = mapped_column(JSON, default=dict)
+    errors: Mapped[list] = mapped_column(JSON, default=list)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class BalanceSnapshot(Base):
     __tablename__ = "balance_snapshots"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -81,6 +92,29 @@ class BalanceSnapshot(Base):
     snapshot_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_type: Mapped[str] = mapped_column(String(20))
+    owner_id: Mapped[int] = mapped_column(Integer)
+    entry_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    amount: Mapped[float] = mapped_column(Float)
+    balance_after: Mapped[float] = mapped_column(Float)
+    source: Mapped[str] = mapped_column(String(32), default="adjustment")
+    run_id: Mapped[int | None] = mapped_column(ForeignKey("runs.id"), nullable=True)
+    note: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_ledger_owner_asof", "owner_type", "owner_id", "entry_at", "id"),)
+
+
+class LedgerBalance(Base):
+    __tablename__ = "ledger_balances"
+    owner_type: Mapped[str] = mapped_column(String(20), primary_key=True)
+    owner_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    balance: Mapped[float] = mapped_column(Float, default=0)
+    last_entry_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
 class MoneyMapNode(Base):
     __tablename__ = "money_map_nodes"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -110,6 +144,30 @@ class Rule(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class RuleVersion(Base):
+    __tablename__ = "rule_versions"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rule_id: Mapped[int] = mapped_column(ForeignKey("rules.id"))
+    version: Mapped[int] = mapped_column(Integer)
+    name: Mapped[str] = mapped_column(String(160))
+    priority: Mapped[int] = mapped_column(Integer, default=100)
+    trigger_type: Mapped[str] = mapped_column(String(32))
+    trigger_config: Mapped[dict] = mapped_column(JSON, default=dict)
+    conditions: Mapped[list] = mapped_column(JSON, default=list)
+    actions: Mapped[list] = mapped_column(JSON, default=list)
+    content_hash: Mapped[str] = mapped_column(String(40))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (UniqueConstraint("rule_id", "version", name="uq_rule_version"),)
+
+
+class RuleSchedule(Base):
+    __tablename__ = "rule_schedules"
+    rule_id: Mapped[int] = mapped_column(ForeignKey("rules.id"), primary_key=True)
+    freq: Mapped[str] = mapped_column(String(20))
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    last_run_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
 class Run(Base):
     __tablename__ = "runs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -140,6 +198,29 @@ class ErrorLog(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class RunDailySummary(Base):
+    # Roll-up of compacted runs: one row per rule, day and run status.
+    __tablename__ = "run_daily_summaries"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rule_id: Mapped[int] = mapped_column(ForeignKey("rules.id"))
+    day: Mapped[date] = mapped_column(Date)
+    status: Mapped[str] = mapped_column(String(24))
+    runs: Mapped[int] = mapped_column(Integer, default=0)
+    actions: Mapped[int] = mapped_column(Integer, default=0)
+    failed_actions: Mapped[int] = mapped_column(Integer, default=0)
+    allocated: Mapped[float] = mapped_column(Float, default=0)
+    errors: Mapped[int] = mapped_column(Integer, default=0)
+    __table_args__ = (UniqueConstraint("rule_id", "day", "status", name="uq_run_summary_rule_day_status"),)
+
+
+class RetentionState(Base):
+    # Highest run id compacted so far; advanced in the same transaction as the compaction itself.
+    __tablename__ = "retention_state"
+    name: Mapped[str] = mapped_column(String(40), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -158,3 +239,60 @@ class Task(Base):
     reference_id: Mapped[str | None] = mapped_column(String(120), nullable=True)
     status: Mapped[str] = mapped_column(String(24), default="open")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_tasks_created", "created_at", "id"),
+        Index("ix_tasks_status_created", "status", "created_at", "id"),
+    )
+
+
+class QueuedEvent(Base):
+    __tablename__ = "event_queue"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_key: Mapped[str] = mapped_column(String(180))
+    payload: Mapped[dict] = mapped_column(JSON, default=dict)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    claim_token: Mapped[str | None] = mapped_column(String(36), nullable=True)
+    visible_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_event_queue_visible", "visible_at", "id"),)
+
+
+class DeadLetterEvent(Base):
+    # Events a table-backed queue gave up on after max_attempts deliveries; kept for inspection.
+    __tablename__ = "event_dead_letters"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_key: Mapped[str] = mapped_column(String(180))
+    payload: Mapped[dict] = mapped_column(JSON, default=dict)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class OutboxEvent(Base):
+    # Written in the same transaction as the rows the events describe; drain_outbox publishes them.
+    __tablename__ = "event_outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    payload: Mapped[dict] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(40))
+    status: Mapped[str] = mapped_column(String(24), default="queued", index=True)
+    progress: Mapped[float] = mapped_column(Float, default=0)
+    message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    params: Mapped[dict] = mapped_column(JSON, default=dict)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    # "<host>:<pid>" of the runner that accepted the job; only that process ever runs it.
+    owner: Mapped[str | None] = mapped_column(String(80), nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+# Registers the transaction search index DDL with create_all.
+from db import search_index  # noqa: E402,F401
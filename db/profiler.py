@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+
+from sqlalchemy import event
+
+N_PLUS_ONE_THRESHOLD = 5
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class ShapeStats:
+    shape: str
+    count: int = 0
+    total_seconds: float = 0.0
+
+
+@dataclass
+class QueryProfile:
+    label: str | None = None
+    count: int = 0
+    total_seconds: float = 0.0
+    shapes: dict[str, ShapeStats] = field(default_factory=dict)
+
+    def record(self, statement: str, seconds: float) -> None:
+        shape = statement_shape(statement)
+        stats = self.shapes.get(shape)
+        if stats is None:
+            stats = self.shapes[shape] = ShapeStats(shape)
+        stats.count += 1
+        stats.total_seconds += seconds
+        self.count += 1
+        self.total_seconds += seconds
+
+    def likely_n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[ShapeStats]:
+        repeated = [s for s in self.shapes.values() if s.count >= threshold and s.shape.upper().startswith("SELECT")]
+        return sorted(repeated, key=lambda s: s.count, reverse=True)
+
+    def top(self, n: int = 10) -> list[ShapeStats]:
+        return sorted(self.shapes.values(), key=lambda s: s.total_seconds, reverse=True)[:n]
+
+    def summary(self) -> str:
+        lines = [f"{self.label or 'profile'}: {self.count} queries in {self.total_seconds * 1000:.1f} ms"]
+        for s in self.top():
+            lines.append(f"  {s.count:>5}x {s.total_seconds * 1000:>8.1f} ms  {s.shape[:160]}")
+        return "\n".join(lines)
+
+
+class QueryProfiler:
+    # Listeners are engine-wide; only statements from the thread that created the profiler are recorded.
+    def __init__(self, engine, label: str | None = None):
+        self.engine = engine
+        self.profile = QueryProfile(label=label)
+        self._thread_id = threading.get_ident()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread_id:
+            conn.info.setdefault("flowledger_query_start", []).append(perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() != self._thread_id:
+            return
+        starts = conn.info.get("flowledger_query_start")
+        if starts:
+            self.profile.record(statement, perf_counter() - starts.pop())
+
+    def start(self) -> QueryProfile:
+        event.listen(self.engine, "before_cursor_execute", self._before)
+        event.listen(self.engine, "after_cursor_execute", self._after)
+        return self.profile
+
+    def stop(self) -> QueryProfile:
+        event.remove(self.engine, "before_cursor_execute", self._before)
+        event.remove(self.engine, "after_cursor_execute", self._after)
+        return self.profile
+
+
+def _engine_for(bind):
+    # Accept an Engine, Connection or Session so callers can pass whatever they hold.
+    if hasattr(bind, "get_bind"):
+        bind = bind.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+@contextmanager
+def profile_queries(bind, label: str | None = None):
+    profiler = QueryProfiler(_engine_for(bind), label=label)
+    profile = profiler.start()
+    try:
+        yield profile
+    finally:
+        profiler.stop()
+
+
+@contextmanager
+def assert_max_queries(bind, limit: int, label: str | None = None):
+    with profile_queries(bind, label=label) as profile:
+        yield profile
+    if profile.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {profile.count}\n{profile.summary()}")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+from db.engine import Base
+
+FTS_TABLE = "transactions_fts"
+# Extensions are per database, not per schema: pg_trgm lives in one shared schema that every tenant's
+# search_path includes, rather than in whichever tenant schema happened to be created first.
+EXTENSION_SCHEMA = "public"
+
+# External-content FTS5 table: the index stores trigrams only and reads text back from
+# transactions. The trigram tokenizer makes a quoted phrase a case-insensitive substring match,
+# which is exactly what description_contains means.
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, merchant, content='transactions', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, merchant) VALUES (new.id, new.description, new.merchant);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, merchant)
+        VALUES ('delete', old.id, old.description, old.merchant);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, merchant ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, merchant)
+        VALUES ('delete', old.id, old.description, old.merchant);
+        INSERT INTO {FTS_TABLE}(rowid, description, merchant) VALUES (new.id, new.description, new.merchant);
+    END""",
+]
+
+# Elsewhere the search service falls back to lower(col) LIKE '%term%', which these indexes serve.
+POSTGRES_DDL = [
+    f"CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA {EXTENSION_SCHEMA}",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_description_trgm ON transactions "
+    f"USING gin (lower(description) {EXTENSION_SCHEMA}.gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_merchant_trgm ON transactions "
+    f"USING gin (lower(merchant) {EXTENSION_SCHEMA}.gin_trgm_ops)",
+]
+
+
+def ensure_search_index(connection) -> None:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first()
+        if exists:
+            return
+        try:
+            for statement in SQLITE_DDL:
+                connection.exec_driver_sql(statement)
+        except OperationalError:
+            logging.warning("SQLite lacks FTS5 trigram support; transaction search will use LIKE scans")
+            return
+        # Index rows imported before the table existed; the triggers keep it current from here on.
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        try:
+            with connection.begin_nested():
+                installed = connection.scalar(
+                    text(
+                        "SELECT n.nspname FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+                        "WHERE e.extname = 'pg_trgm'"
+                    )
+                )
+                if installed is not None and installed != EXTENSION_SCHEMA:
+                    # Installed into a tenant schema by an earlier version; other tenants can't see it there.
+                    connection.exec_driver_sql(f"ALTER EXTENSION pg_trgm SET SCHEMA {EXTENSION_SCHEMA}")
+                for statement in POSTGRES_DDL:
+                    connection.exec_driver_sql(statement)
+        except (IntegrityError, OperationalError, ProgrammingError):
+            logging.warning("pg_trgm unavailable; transaction search will use sequential LIKE scans")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw) -> None:
+    ensure_search_index(connection)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from db.engine import SessionLocal, init_db
+from db.search_index import EXTENSION_SCHEMA
+
+TENANT_ROOT = Path(os.environ.get("FLOWLEDGER_TENANT_DIR", Path("data") / "tenants"))
+# A postgresql:// URL switches tenants from one SQLite file each to one schema each in that database.
+TENANT_DATABASE_URL = os.environ.get("FLOWLEDGER_TENANT_DATABASE_URL")
+MAX_ENGINES = int(os.environ.get("FLOWLEDGER_TENANT_MAX_ENGINES", 64))
+IDLE_SECONDS = 15 * 60
+
+# Tenant ids become file names and schema names, so only a conservative alphabet is accepted.
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+def check_tenant_id(tenant: str) -> str:
+    if not isinstance(tenant, str) or not _TENANT_ID.match(tenant):
+        raise ValueError(f"Invalid tenant id {tenant!r}: use 1-63 lowercase letters, digits, '-' or '_'")
+    return tenant
+
+
+@dataclass(slots=True)
+class TenantHandle:
+    tenant: str
+    engine: Engine
+    factory: sessionmaker
+    data_dir: Path
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class TenantRegistry:
+    # One engine (and so one connection pool) per tenant, kept in LRU order. Engines past max_engines,
+    # or idle longer than idle_seconds, are disposed; the next request for that tenant opens a new one.
+    # Per-tenant state lives in each session's info: the compiled-rule cache, the columnar mirror and
+    # the archive directory, so nothing keyed by row id is shared between tenants.
+    def __init__(
+        self,
+        root: Path = TENANT_ROOT,
+        database_url: str | None = TENANT_DATABASE_URL,
+        max_engines: int = MAX_ENGINES,
+        idle_seconds: float = IDLE_SECONDS,
+        pool_size: int = 2,
+        max_overflow: int = 3,
+    ):
+        self.root = Path(root)
+        self.database_url = database_url
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self._handles: OrderedDict[str, TenantHandle] = OrderedDict()
+        self._opening: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _create_engine(self, tenant: str, data_dir: Path) -> Engine:
+        pool = {"pool_size": self.pool_size, "max_overflow": self.max_overflow, "pool_pre_ping": True}
+        if self.database_url:
+            # Unqualified table names resolve in the tenant's schema, so models and raw DDL work unchanged;
+            # the shared extension schema comes after it for pg_trgm's operator classes and functions.
+            options = f"-csearch_path={tenant},{EXTENSION_SCHEMA}"
+            engine = create_engine(self.database_url, connect_args={"options": options}, **pool)
+            with engine.begin() as conn:
+                conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{tenant}"'))
+            return engine
+        data_dir.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(f"sqlite:///{data_dir / 'moneymesh.db'}", connect_args={"check_same_thread": False}, **pool)
+        with engine.connect() as conn:
+            # Takes effect only while the file is empty, so new shards start in incremental auto_vacuum.
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        return engine
+
+    def _open(self, tenant: str) -> TenantHandle:
+        data_dir = self.root / tenant
+        engine = self._create_engine(tenant, data_dir)
+        init_db(engine)
+        info = {
+            "tenant": tenant,
+            "rule_cache": {},
+            "columnar_root": data_dir / "columnar",
+            "archive_dir": data_dir / "archive",
+        }
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, info=info)
+        return TenantHandle(tenant, engine, factory, data_dir)
+
+    def handle(self, tenant: str) -> TenantHandle:
+        check_tenant_id(tenant)
+        with self._lock:
+            handle = self._handles.get(tenant)
+            if handle is not None:
+                self._handles.move_to_end(tenant)
+                handle.last_used = time.monotonic()
+                # Idle engines go on any request, not only when a new tenant opens.
+                evicted = self._evictions()
+            else:
+                opening = self._opening.setdefault(tenant, threading.Lock())
+        if handle is not None:
+            for stale in evicted:
+                stale.engine.dispose()
+            return handle
+        # Opening (and for a new tenant, creating the schema) holds only that tenant's lock, so a slow
+        # first request for one tenant does not hold up requests for the others.
+        with opening:
+            with self._lock:
+                handle = self._handles.get(tenant)
+            if handle is None:
+                handle = self._open(tenant)
+                with self._lock:
+                    self._handles[tenant] = handle
+                    self._opening.pop(tenant, None)
+                    evicted = self._evictions()
+                for stale in evicted:
+                    stale.engine.dispose()
+        return handle
+
+    def _evictions(self) -> list[TenantHandle]:
+        # Called with the lock held; the most recently used tenant is never evicted.
+        now = time.monotonic()
+        evicted = []
+        while len(self._handles) > 1:
+            tenant, oldest = next(iter(self._handles.items()))
+            if len(self._handles) <= self.max_engines and now - oldest.last_used < self.idle_seconds:
+                break
+            evicted.append(self._handles.pop(tenant))
+        return evicted
+
+    def session(self, tenant: str) -> Session:
+        return self.handle(tenant).factory()
+
+    def session_factory(self, tenant: str):
+        # Resolves the handle per call, so long-lived holders (job runners) survive an eviction.
+        return lambda: self.session(tenant)
+
+    def evict(self, tenant: str | None = None) -> None:
+        with self._lock:
+            handles = list(self._handles.values()) if tenant is None else [self._handles.get(tenant)]
+            for handle in handles:
+                if handle is not None:
+                    self._handles.pop(handle.tenant, None)
+        for handle in handles:
+            if handle is not None:
+                handle.engine.dispose()
+
+    def tenants(self) -> list[str]:
+        with self._lock:
+            return list(self._handles)
+
+
+registry = TenantRegistry()
+
+
+def open_session(tenant: str | None = None) -> Session:
+    # No tenant means the single-household database, so existing deployments keep working unchanged.
+    return SessionLocal() if tenant is None else registry.session(tenant)
+
+
+def session_factory(tenant: str | None = None):
+    return SessionLocal if tenant is None else registry.session_factory(tenant)
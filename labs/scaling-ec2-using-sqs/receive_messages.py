@@ -1,36 +1,265 @@
 #!/usr/bin/env python3
 
+import argparse
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 from botocore.exceptions import ClientError
 
-QUEUE_NAME = "Messages"
+MAX_BATCH = 10  # SQS hard limit for receive/delete/change-visibility batches
 
-logging.basicConfig(format="[%(levelname)s] %(message)s", level="INFO")
-sqs = boto3.client("sqs")
 
-try:
-    logging.info(f"Getting queue URL for queue: {QUEUE_NAME}")
-    response = sqs.get_queue_url(QueueName=QUEUE_NAME)
-except ClientError as e:
-    logging.error(e)
-    exit(1)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue-name", "-q", default="Messages", help="SQS queue name")
+    parser.add_argument("--workers", "-w", default=10, help="concurrent message handlers", type=int)
+    parser.add_argument("--wait-time", default=20, help="long poll WaitTimeSeconds (0-20)", type=int)
+    parser.add_argument("--visibility-timeout", default=30, help="seconds a received message stays hidden", type=int)
+    parser.add_argument("--work-seconds", default=1.0, help="simulated processing time per message", type=float)
+    parser.add_argument("--stats-interval", default=10.0, help="seconds between throughput reports", type=float)
+    parser.add_argument("--max-messages", default=0, help="stop after this many messages (0 = run forever)", type=int)
+    parser.add_argument("--idle-exit", default=0, help="stop after this many empty polls (0 = never)", type=int)
+    parser.add_argument("--endpoint-url", help="SQS endpoint, e.g. a local moto/ElasticMQ server")
+    parser.add_argument("--log", "-l", default="INFO", help="logging level")
+    return parser.parse_args(argv)
 
-queue_url = response["QueueUrl"]
-logging.info(f"Queue URL: {queue_url}")
 
-logging.info("Receiving messages from queue...")
+def simulate_work(message, work_seconds):
+    logging.debug(f"Message body: {message['Body']}")
+    time.sleep(work_seconds)
 
-while True:
-    messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)
-    if "Messages" in messages:
-        for message in messages["Messages"]:
-            logging.info(f"Message body: {message['Body']}")
-            time.sleep(1)  # simulate work
-            sqs.delete_message(
-                QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"]
-            )
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.polls = 0
+        self.empty_polls = 0
+        self.extended = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"processed={self.processed} failed={self.failed} rate={self.processed / elapsed:.1f} msg/s "
+            f"polls={self.polls} empty={self.empty_polls} extended={self.extended} elapsed={elapsed:.1f}s"
+        )
+
+
+class VisibilityExtender(threading.Thread):
+    """Keeps slow in-flight messages hidden by pushing their visibility timeout forward."""
+
+    def __init__(self, sqs, queue_url, visibility_timeout, stats):
+        super().__init__(daemon=True)
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.in_flight = {}  # receipt handle -> monotonic time visibility was last set
+        self.stopped = threading.Event()
+
+    def track(self, receipt_handle):
+        with self.lock:
+            self.in_flight[receipt_handle] = time.monotonic()
+
+    def untrack(self, receipt_handle):
+        with self.lock:
+            self.in_flight.pop(receipt_handle, None)
+
+    def due(self, now):
+        # Extend once half the timeout has elapsed so there is headroom for the API call.
+        threshold = self.visibility_timeout / 2
+        with self.lock:
+            return [h for h, since in self.in_flight.items() if now - since >= threshold]
+
+    def extend(self, handles):
+        for start in range(0, len(handles), MAX_BATCH):
+            chunk = handles[start : start + MAX_BATCH]
+            entries = [
+                {"Id": str(i), "ReceiptHandle": h, "VisibilityTimeout": self.visibility_timeout}
+                for i, h in enumerate(chunk)
+            ]
+            try:
+                response = self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            except ClientError as e:
+                logging.warning(f"Visibility extension failed: {e}")
+                continue
+            now = time.monotonic()
+            with self.lock:
+                for ok in response.get("Successful", []):
+                    handle = chunk[int(ok["Id"])]
+                    if handle in self.in_flight:
+                        self.in_flight[handle] = now
+            self.stats.add(extended=len(response.get("Successful", [])))
+
+    def run(self):
+        interval = max(self.visibility_timeout / 4, 0.5)
+        while not self.stopped.wait(interval):
+            handles = self.due(time.monotonic())
+            if handles:
+                self.extend(handles)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class Deleter:
+    """Buffers receipt handles of finished messages and removes them with delete_message_batch."""
+
+    def __init__(self, sqs, queue_url):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def add(self, receipt_handle):
+        with self.lock:
+            self.pending.append(receipt_handle)
+            ready = len(self.pending) >= MAX_BATCH
+        if ready:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            handles, self.pending = self.pending, []
+        for start in range(0, len(handles), MAX_BATCH):
+            chunk = handles[start : start + MAX_BATCH]
+            entries = [{"Id": str(i), "ReceiptHandle": h} for i, h in enumerate(chunk)]
+            try:
+                response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            except ClientError as e:
+                logging.error(f"Batch delete failed, messages will be redelivered: {e}")
+                continue
+            for failed in response.get("Failed", []):
+                logging.warning(f"Delete failed for entry {failed['Id']}: {failed.get('Message')}")
+
+
+def consume(
+    sqs,
+    queue_url,
+    handler,
+    workers=10,
+    wait_time=20,
+    visibility_timeout=30,
+    max_messages=0,
+    idle_exit=0,
+    stats_interval=10.0,
+):
+    stats = Stats()
+    extender = VisibilityExtender(sqs, queue_url, visibility_timeout, stats)
+    deleter = Deleter(sqs, queue_url)
+    slots = threading.BoundedSemaphore(workers)
+    extender.start()
+
+    def work(message):
+        try:
+            handler(message)
+        except Exception as e:
+            # Leave the message on the queue; it reappears after the visibility timeout.
+            logging.error(f"Handler failed for {message['MessageId']}: {e}")
+            stats.add(failed=1)
         else:
-            logging.info("Queue is now empty")
+            deleter.add(message["ReceiptHandle"])
+            stats.add(processed=1)
+        finally:
+            extender.untrack(message["ReceiptHandle"])
+            slots.release()
+
+    last_report = time.monotonic()
+    empty_streak = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not max_messages or stats.received < max_messages:
+                # Only ask for as many messages as there are free workers, so nothing sits
+                # received-but-idle while its visibility timeout runs down.
+                slots.acquire()
+                free = 1
+                while free < MAX_BATCH and slots.acquire(blocking=False):
+                    free += 1
+                if max_messages and free > max_messages - stats.received:
+                    # Hand back the slots this last, smaller request will not use.
+                    for _ in range(free - (max_messages - stats.received)):
+                        slots.release()
+                    free = max_messages - stats.received
+
+                response = sqs.receive_message(
+                    QueueUrl=queue_url,
+                    MaxNumberOfMessages=free,
+                    WaitTimeSeconds=wait_time,
+                    VisibilityTimeout=visibility_timeout,
+                )
+                messages = response.get("Messages", [])
+                stats.add(polls=1, received=len(messages), empty_polls=0 if messages else 1)
+                for _ in range(free - len(messages)):
+                    slots.release()
+
+                for message in messages:
+                    extender.track(message["ReceiptHandle"])
+                    pool.submit(work, message)
+
+                if messages:
+                    empty_streak = 0
+                else:
+                    deleter.flush()
+                    empty_streak += 1
+                    if idle_exit and empty_streak >= idle_exit:
+                        logging.info("Queue is empty, stopping")
+                        break
+
+                if time.monotonic() - last_report >= stats_interval:
+                    deleter.flush()
+                    logging.info(stats.report())
+                    last_report = time.monotonic()
+    finally:
+        extender.stop()
+        deleter.flush()
+    logging.info(stats.report())
+    return stats
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(format="[%(levelname)s] %(threadName)s %(message)s", level=args.log)
+    sqs = boto3.client("sqs", endpoint_url=args.endpoint_url)
+
+    try:
+        logging.info(f"Getting queue URL for queue: {args.queue_name}")
+        response = sqs.get_queue_url(QueueName=args.queue_name)
+    except ClientError as e:
+        logging.error(e)
+        return 1
+
+    queue_url = response["QueueUrl"]
+    logging.info(f"Queue URL: {queue_url}")
+    logging.info(f"Receiving messages with {args.workers} workers...")
+
+    try:
+        consume(
+            sqs,
+            queue_url,
+            lambda message: simulate_work(message, args.work_seconds),
+            workers=args.workers,
+            wait_time=args.wait_time,
+            visibility_timeout=args.visibility_timeout,
+            max_messages=args.max_messages,
+            idle_exit=args.idle_exit,
+            stats_interval=args.stats_interval,
+        )
+    except KeyboardInterrupt:
+        logging.info("Interrupted")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,45 +2,220 @@
 
 import argparse
 import logging
+import math
 import sys
+import threading
+import time
 import uuid
 from time import sleep
 
 import boto3
 from botocore.exceptions import ClientError
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--queue-name", "-q", default="Messages", help="SQS queue name")
-parser.add_argument("--interval", "-i", default=0.1, help="timer interval", type=float)
-parser.add_argument("--message", "-m", help="message to send")
-parser.add_argument("--log", "-l", default="INFO", help="logging level")
-args = parser.parse_args()
+MAX_BATCH = 10  # SQS hard limit for send_message_batch
+PROFILES = ["constant", "step", "spike", "sine"]
 
-if args.log:
-    logging.basicConfig(format="[%(levelname)s] %(message)s", level=args.log)
-else:
-    parser.print_help(sys.stderr)
 
-sqs = boto3.client("sqs")
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue-name", "-q", default="Messages", help="SQS queue name")
+    parser.add_argument("--interval", "-i", default=0.1, help="timer interval", type=float)
+    parser.add_argument("--message", "-m", help="message to send")
+    parser.add_argument("--log", "-l", default="INFO", help="logging level")
+    parser.add_argument("--endpoint-url", help="SQS endpoint, e.g. a local moto/ElasticMQ server")
+    load = parser.add_argument_group("load mode (enabled by --rate)")
+    load.add_argument("--rate", type=float, help="target messages per second; switches to batched load mode")
+    load.add_argument("--peak-rate", type=float, help="highest rate reached by step/spike/sine profiles")
+    load.add_argument("--profile", choices=PROFILES, default="constant", help="how the rate changes over time")
+    load.add_argument("--period", default=60.0, type=float, help="seconds per step / between spikes / per sine cycle")
+    load.add_argument("--duration", default=0.0, type=float, help="seconds to run (0 = until interrupted)")
+    load.add_argument("--senders", default=4, type=int, help="concurrent sender threads")
+    load.add_argument("--stats-interval", default=10.0, type=float, help="seconds between progress reports")
+    return parser
 
-try:
-    logging.info(f"Getting queue URL for queue: {args.queue_name}")
-    response = sqs.get_queue_url(QueueName=args.queue_name)
-except ClientError as e:
-    logging.error(e)
-    exit(1)
 
-queue_url = response["QueueUrl"]
+def rate_profile(profile, base, peak=None, period=60.0):
+    peak = base if peak is None else peak
 
-logging.info(f"Queue URL: {queue_url}")
+    if profile == "constant":
+        return lambda t: base
+    if profile == "step":
+        # Climb from base to peak in five equal steps, one step per period.
+        increment = (peak - base) / 5
+        return lambda t: min(peak, base + increment * math.floor(t / period))
+    if profile == "spike":
+        # Hold at base, then burst to peak for the last fifth of every period.
+        return lambda t: peak if (t % period) >= period * 0.8 else base
+    if profile == "sine":
+        return lambda t: base + (peak - base) * (1 - math.cos(2 * math.pi * t / period)) / 2
+    raise ValueError(f"Unknown profile {profile}")
 
-while True:
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Pacer:
+    """Hands out send slots so all senders together follow the target rate curve."""
+
+    def __init__(self, rate_fn, started):
+        self.rate_fn = rate_fn
+        self.started = started
+        self.next_at = started
+        self.lock = threading.Lock()
+
+    def reserve(self, count):
+        with self.lock:
+            # No catch-up bursts: if senders fell behind, the achieved rate just reports it.
+            slot = max(self.next_at, time.monotonic())
+            rate = self.rate_fn(slot - self.started)
+            if rate <= 0:
+                self.next_at = slot + 0.1
+                return None
+            self.next_at = slot + count / rate
+        return slot
+
+
+class LoadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.latencies = []
+
+    def record(self, sent, failed, latency):
+        with self.lock:
+            self.sent += sent
+            self.failed += failed
+            self.latencies.append(latency)
+
+    def summary(self, elapsed):
+        with self.lock:
+            latencies = list(self.latencies)
+            sent, failed = self.sent, self.failed
+        return {
+            "sent": sent,
+            "failed": failed,
+            "elapsed": round(elapsed, 2),
+            "rate": round(sent / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        }
+
+
+def send_batch(sqs, queue_url, body=None):
+    entries = [{"Id": str(i), "MessageBody": body or str(uuid.uuid4())} for i in range(MAX_BATCH)]
+    response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+    for failed in response.get("Failed", []):
+        logging.warning(f"Send failed for entry {failed['Id']}: {failed.get('Message')}")
+    return len(response.get("Successful", [])), len(response.get("Failed", []))
+
+
+def produce(sqs, queue_url, rate_fn, duration=0.0, senders=4, body=None, stats_interval=10.0):
+    if senders < 1:
+        raise ValueError(f"senders must be at least 1, got {senders}")
+    started = time.monotonic()
+    deadline = started + duration if duration else None
+    pacer = Pacer(rate_fn, started)
+    stats = LoadStats()
+    stop = threading.Event()
+
+    def sender():
+        while not stop.is_set():
+            # Checked before reserving too: while the rate is 0 no slot is handed out to compare.
+            if deadline and time.monotonic() >= deadline:
+                return
+            slot = pacer.reserve(MAX_BATCH)
+            if slot is None:
+                sleep(0.1)
+                continue
+            if deadline and slot >= deadline:
+                return
+            delay = slot - time.monotonic()
+            if delay > 0 and stop.wait(delay):
+                return
+            t0 = time.monotonic()
+            try:
+                sent, failed = send_batch(sqs, queue_url, body)
+            except ClientError as e:
+                logging.error(e)
+                sent, failed = 0, MAX_BATCH
+            stats.record(sent, failed, time.monotonic() - t0)
+
+    threads = [threading.Thread(target=sender, name=f"sender-{i}", daemon=True) for i in range(senders)]
+    for t in threads:
+        t.start()
     try:
-        message = str(uuid.uuid4())
-        logging.info("Sending message: " + message)
-        response = sqs.send_message(QueueUrl=queue_url, MessageBody=message)
-        logging.info("MessageId: " + response["MessageId"])
-        sleep(args.interval)
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=stats_interval / len(threads))
+            elapsed = time.monotonic() - started
+            summary = stats.summary(elapsed)
+            logging.info(
+                f"target={rate_fn(elapsed):.1f} msg/s achieved={summary['rate']} msg/s sent={summary['sent']} "
+                f"p50={summary['p50_ms']}ms p99={summary['p99_ms']}ms"
+            )
+    except KeyboardInterrupt:
+        logging.info("Interrupted")
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    return stats.summary(time.monotonic() - started)
+
+
+def send_forever(sqs, queue_url, interval, body=None):
+    while True:
+        try:
+            message = body or str(uuid.uuid4())
+            logging.info("Sending message: " + message)
+            response = sqs.send_message(QueueUrl=queue_url, MessageBody=message)
+            logging.info("MessageId: " + response["MessageId"])
+            sleep(interval)
+        except ClientError as e:
+            logging.error(e)
+            return 1
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.senders < 1:
+        parser.error("--senders must be at least 1")
+    if args.log:
+        logging.basicConfig(format="[%(levelname)s] %(message)s", level=args.log)
+    else:
+        parser.print_help(sys.stderr)
+
+    sqs = boto3.client("sqs", endpoint_url=args.endpoint_url)
+
+    try:
+        logging.info(f"Getting queue URL for queue: {args.queue_name}")
+        response = sqs.get_queue_url(QueueName=args.queue_name)
     except ClientError as e:
         logging.error(e)
-        exit(1)
+        return 1
+
+    queue_url = response["QueueUrl"]
+    logging.info(f"Queue URL: {queue_url}")
+
+    if args.rate is None:
+        return send_forever(sqs, queue_url, args.interval, args.message)
+
+    rate_fn = rate_profile(args.profile, args.rate, args.peak_rate, args.period)
+    summary = produce(sqs, queue_url, rate_fn, args.duration, args.senders, args.message, args.stats_interval)
+    logging.info(
+        f"Done: sent={summary['sent']} failed={summary['failed']} in {summary['elapsed']}s, "
+        f"achieved {summary['rate']} msg/s, latency p50={summary['p50_ms']}ms "
+        f"p90={summary['p90_ms']}ms p99={summary['p99_ms']}ms"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import boto3  # noqa: E402
+
+import receive_messages  # noqa: E402
+
+
+@pytest.fixture()
+def queue(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        sqs = boto3.client("sqs")
+        url = sqs.create_queue(QueueName="Messages")["QueueUrl"]
+        yield sqs, url
+
+
+def _depth(sqs, url):
+    attrs = sqs.get_queue_attributes(
+        QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+    )["Attributes"]
+    return int(attrs["ApproximateNumberOfMessages"]) + int(attrs["ApproximateNumberOfMessagesNotVisible"])
+
+
+def test_consume_processes_concurrently_and_batch_deletes(queue):
+    sqs, url = queue
+    for start in range(0, 40, 10):
+        sqs.send_message_batch(QueueUrl=url, Entries=[{"Id": str(i), "MessageBody": f"m{start + i}"} for i in range(10)])
+
+    seen, active, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def handler(message):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            seen.append(message["Body"])
+
+    stats = receive_messages.consume(sqs, url, handler, workers=8, wait_time=0, max_messages=40, stats_interval=60)
+
+    assert stats.processed == 40
+    assert sorted(seen) == sorted(f"m{i}" for i in range(40))
+    assert peak[0] > 1
+    assert _depth(sqs, url) == 0
+
+
+def test_failed_messages_stay_on_queue(queue):
+    sqs, url = queue
+    sqs.send_message(QueueUrl=url, MessageBody="boom")
+
+    def handler(message):
+        raise RuntimeError("bad payload")
+
+    stats = receive_messages.consume(sqs, url, handler, workers=2, wait_time=0, idle_exit=1, stats_interval=60)
+
+    assert stats.failed == 1 and stats.processed == 0
+    assert _depth(sqs, url) == 1
+
+
+def test_visibility_extender_extends_due_messages(queue):
+    sqs, url = queue
+    sqs.send_message(QueueUrl=url, MessageBody="slow")
+    message = sqs.receive_message(QueueUrl=url, VisibilityTimeout=2)["Messages"][0]
+
+    stats = receive_messages.Stats()
+    extender = receive_messages.VisibilityExtender(sqs, url, visibility_timeout=2, stats=stats)
+    extender.track(message["ReceiptHandle"])
+    assert extender.due(time.monotonic() + 5) == [message["ReceiptHandle"]]
+    extender.extend(extender.due(time.monotonic() + 5))
+    assert stats.extended == 1
+
+
+def test_slots_cut_by_max_messages_are_released(queue, monkeypatch):
+    sqs, url = queue
+    sqs.send_message(QueueUrl=url, MessageBody="only")
+    semaphores = []
+
+    class Recording(threading.BoundedSemaphore):
+        def __init__(self, value):
+            super().__init__(value)
+            semaphores.append(self)
+
+    monkeypatch.setattr(receive_messages.threading, "BoundedSemaphore", Recording)
+    stats = receive_messages.consume(
+        sqs, url, lambda m: None, workers=8, wait_time=0, max_messages=3, idle_exit=2, stats_interval=60
+    )
+
+    assert stats.processed == 1
+    # Every slot is back: none stayed acquired for the part of the batch max_messages cut off.
+    assert all(semaphores[0].acquire(blocking=False) for _ in range(8))
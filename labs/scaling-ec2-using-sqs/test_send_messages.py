@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import boto3  # noqa: E402
+
+import send_messages  # noqa: E402
+
+
+@pytest.fixture()
+def queue(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        sqs = boto3.client("sqs")
+        url = sqs.create_queue(QueueName="Messages")["QueueUrl"]
+        yield sqs, url
+
+
+def test_rate_profiles():
+    step = send_messages.rate_profile("step", 10, 60, period=5)
+    assert step(0) == 10 and step(5) == 20 and step(100) == 60
+    spike = send_messages.rate_profile("spike", 10, 100, period=10)
+    assert spike(1) == 10 and spike(9) == 100
+    sine = send_messages.rate_profile("sine", 10, 30, period=4)
+    assert sine(0) == pytest.approx(10) and sine(2) == pytest.approx(30)
+
+
+def test_percentile():
+    values = [0.001 * i for i in range(1, 101)]
+    assert send_messages.percentile(values, 50) == pytest.approx(0.05)
+    assert send_messages.percentile(values, 99) == pytest.approx(0.099)
+
+
+def test_produce_sends_batches_at_target_rate(queue):
+    sqs, url = queue
+    summary = send_messages.produce(sqs, url, send_messages.rate_profile("constant", 200), duration=1.0, senders=3)
+
+    attrs = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages"])["Attributes"]
+    assert summary["failed"] == 0
+    assert summary["sent"] % send_messages.MAX_BATCH == 0
+    assert 100 <= summary["sent"] <= 220
+    assert int(attrs["ApproximateNumberOfMessages"]) == summary["sent"]
+    assert summary["p50_ms"] <= summary["p99_ms"]
+
+
+def test_timed_run_ends_while_the_rate_is_zero(queue):
+    sqs, url = queue
+    started = time.monotonic()
+    summary = send_messages.produce(sqs, url, lambda t: 0, duration=0.3, senders=2, stats_interval=0.1)
+    assert time.monotonic() - started < 2
+    assert summary["sent"] == 0
+    with pytest.raises(ValueError):
+        send_messages.produce(sqs, url, lambda t: 10, duration=0.1, senders=0)
@@ -62,3 +62,12 @@ class SimulationReport(BaseModel):
     traces: list[dict]
     summary: dict
     generated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RuleDiffReport(BaseModel):
+    old_label: str
+    new_label: str
+    transactions_scanned: int
+    changed: list[dict]
+    summary: dict
+    generated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import re
+import string
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from db import models
+
+# Store numbers, references and punctuation: dropped from descriptions and from the pattern tables alike.
+MARKUP = re.compile(r"#?\d[\d\-/*#.]*|[^\w\s&']")
+# Card-statement noise stripped for history keys and merchant names: processor prefixes on top of MARKUP.
+# Pattern tables are matched without it, since keywords like "credit card" are made of those words.
+NOISE = re.compile(r"\b(?:pos|debit|credit|card|purchase|visa|mastercard|ach|ref|txn|online|recurring)\b|" + MARKUP.pattern)
+MERCHANT_WORDS = 3
+
+# Known merchants win over generic keywords ("uber eats" is Dining, not Transport).
+MERCHANT_CATEGORIES = {
+    "uber eats": "Dining",
+    "doordash": "Dining",
+    "starbucks": "Dining",
+    "mcdonald's": "Dining",
+    "netflix": "Subscriptions",
+    "spotify": "Subscriptions",
+    "apple com bill": "Subscriptions",
+    "amazon": "Shopping",
+    "target": "Shopping",
+    "walmart": "Groceries",
+    "costco": "Groceries",
+    "whole foods": "Groceries",
+    "uber": "Transport",
+    "lyft": "Transport",
+    "shell": "Transport",
+}
+CATEGORY_KEYWORDS = {
+    "Income": ["payroll", "salary", "direct dep", "paycheck", "interest paid"],
+    "Housing": ["rent", "mortgage", "landlord", "hoa"],
+    "Utilities": ["electric", "hydro", "water bill", "internet", "mobile", "phone bill", "utility"],
+    "Groceries": ["grocer", "grocery", "supermarket", "market"],
+    "Dining": ["coffee", "cafe", "restaurant", "pizza", "bar & grill", "bakery"],
+    "Transport": ["fuel", "gas station", "parking", "transit", "metro", "taxi"],
+    "Debt": ["loan", "card payment", "credit card", "student loan"],
+    "Transfers": ["transfer", "e-transfer", "zelle", "venmo"],
+    "Health": ["pharmacy", "dental", "clinic", "doctor"],
+    "Insurance": ["insurance"],
+}
+
+
+def normalize_descriptions(descriptions: pd.Series, noise: re.Pattern = NOISE) -> pd.Series:
+    return (
+        descriptions.fillna("")
+        .astype(str)
+        .str.lower()
+        .str.replace(noise, " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def _table_keys(terms) -> list[str]:
+    return normalize_descriptions(pd.Series(list(terms), dtype=object), MARKUP).tolist()
+
+
+def _alternation(terms) -> re.Pattern:
+    # Longest first so "uber eats" is tried before "uber".
+    ordered = sorted({t.lower() for t in terms}, key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(re.escape(t) for t in ordered) + r")\b")
+
+
+def learn_history(session) -> dict[str, str]:
+    # Most frequent category per normalized description among transactions that already have one.
+    rows = session.execute(
+        select(models.Transaction.description, models.Transaction.category, func.count())
+        .where(models.Transaction.category.is_not(None), models.Transaction.category != "")
+        .group_by(models.Transaction.description, models.Transaction.category)
+    ).all()
+    if not rows:
+        return {}
+    frame = pd.DataFrame(rows, columns=["description", "category", "n"])
+    frame["key"] = normalize_descriptions(frame["description"])
+    best = (
+        frame.groupby(["key", "category"], as_index=False)["n"]
+        .sum()
+        .sort_values(["n", "category"], ascending=[False, True])
+        .drop_duplicates("key")
+    )
+    return dict(zip(best["key"], best["category"]))
+
+
+class Categorizer:
+    # Classifies the distinct descriptions of a frame, not its rows, and memoizes them, so repeated
+    # descriptions across chunks and imports cost one dict lookup.
+    def __init__(
+        self,
+        history: dict[str, str] | None = None,
+        merchants: dict[str, str] = MERCHANT_CATEGORIES,
+        keywords: dict[str, list[str]] = CATEGORY_KEYWORDS,
+    ):
+        self.history = history or {}
+        # Normalized like the descriptions they are matched against ("e-transfer" -> "e transfer").
+        self.merchants = dict(zip(_table_keys(merchants), merchants.values()))
+        pairs = [(kw, category) for category, kws in keywords.items() for kw in kws]
+        self.keywords = dict(zip(_table_keys(kw for kw, _ in pairs), (category for _, category in pairs)))
+        self._merchant_pattern = _alternation(self.merchants)
+        self._keyword_pattern = _alternation(self.keywords)
+        self._cache: dict[str, tuple[str | None, str | None]] = {}
+
+    @classmethod
+    def from_history(cls, session, **kwargs) -> "Categorizer":
+        return cls(history=learn_history(session), **kwargs)
+
+    def _classify(self, keys: pd.Series, words: pd.Series) -> tuple[pd.Series, pd.Series]:
+        category = keys.map(self.history)
+        known = words.str.extract(self._merchant_pattern, expand=False)
+        category = category.fillna(known.map(self.merchants))
+        category = category.fillna(words.str.extract(self._keyword_pattern, expand=False).map(self.keywords))
+        merchant = known.fillna(keys.str.split().str[:MERCHANT_WORDS].str.join(" "))
+        merchant = merchant.map(lambda m: string.capwords(m) if isinstance(m, str) and m else None)
+        return category, merchant
+
+    def categorize(self, descriptions: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+        codes, uniques = pd.factorize(descriptions)
+        new = [d for d in uniques if d not in self._cache]
+        if new:
+            fresh = pd.Series(new, dtype=object)
+            categories, merchants = self._classify(normalize_descriptions(fresh), normalize_descriptions(fresh, MARKUP))
+            for description, category, merchant in zip(new, categories, merchants):
+                self._cache[description] = (
+                    None if pd.isna(category) else category,
+                    None if pd.isna(merchant) else merchant,
+                )
+        looked_up = [self._cache[d] for d in uniques]
+        categories = np.array([c for c, _ in looked_up] + [None], dtype=object)
+        merchants = np.array([m for _, m in looked_up] + [None], dtype=object)
+        # factorize marks missing descriptions with -1, which indexes the trailing None.
+        return categories[codes], merchants[codes]
+
+    def categorize_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Fills only empty category/merchant cells; values from the source file are kept.
+        categories, merchants = self.categorize(df["description"])
+        out = df.copy()
+        for col, guessed in (("category", categories), ("merchant", merchants)):
+            current = out[col] if col in out.columns else pd.Series(None, index=out.index, dtype=object)
+            empty = current.isna() | (current.astype("string").str.strip() == "")
+            filled = current.astype(object).where(~empty, guessed)
+            out[col] = filled.where(filled.notna(), None)
+        return out
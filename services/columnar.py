@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from db import models
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # optional: analytics fall back to SQL reads
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock still serializes the app and its job threads
+    fcntl = None
+
+ROOT = Path(os.environ.get("FLOWLEDGER_COLUMNAR_DIR", Path("data") / "columnar"))
+SYNC_BATCH = 50_000
+# Small incremental syncs leave many part files; merge a month once it has more than this.
+MAX_PARTS_PER_MONTH = 16
+
+_LOCKS: dict[Path, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+TABLES = {
+    "transactions": {
+        "model": models.Transaction,
+        "partition_by": "date",
+        "columns": {
+            "id": "int64",
+            "date": "date32",
+            "description": "string",
+            "amount": "float64",
+            "account": "string",
+            "category": "string",
+            "merchant": "string",
+            "currency": "string",
+        },
+    },
+    "runs": {
+        "model": models.Run,
+        "partition_by": "created_at",
+        "columns": {
+            "id": "int64",
+            "rule_id": "int64",
+            "event_key": "string",
+            "status": "string",
+            "created_at": "timestamp",
+        },
+    },
+}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(name: str):
+    return {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "date32": pa.date32(),
+        "timestamp": pa.timestamp("us"),
+    }[name]
+
+
+def _schema(table: str):
+    return pa.schema([(name, _arrow_type(kind)) for name, kind in TABLES[table]["columns"].items()])
+
+
+def _table_dir(table: str, root: Path | None) -> Path:
+    return (root or ROOT) / table
+
+
+@contextmanager
+def _locked(table_dir: Path):
+    # One writer per mirrored table: a thread lock for the app and its job threads, and a file lock
+    # for other processes (workers, CLIs). Without it two syncs both read the same watermark and
+    # append the same rows twice. The lock file sits beside the table so a reset can delete the table.
+    table_dir.parent.mkdir(parents=True, exist_ok=True)
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(table_dir.resolve(), threading.Lock())
+    with lock, open(table_dir.parent / f".{table_dir.name}.lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def _read_watermark(table_dir: Path) -> dict:
+    marker = table_dir / "_watermark.json"
+    return json.loads(marker.read_text()) if marker.exists() else {"max_id": 0}
+
+
+def _write_watermark(table_dir: Path, max_id: int, database: str | None = None, last_row: str | None = None) -> None:
+    tmp = table_dir / "_watermark.json.tmp"
+    tmp.write_text(json.dumps({"max_id": max_id, "database": database, "last_row": last_row}))
+    tmp.replace(table_dir / "_watermark.json")
+
+
+def _database_identity(session) -> str:
+    # A SQLite file is identified by its inode, so a file deleted and recreated, restored or swapped in
+    # under the same path is a different database; other backends by their URL.
+    url = session.get_bind().url
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        stat = os.stat(url.database)
+        return f"sqlite:{stat.st_dev}:{stat.st_ino}"
+    return url.render_as_string(hide_password=True)
+
+
+def _row_digest(row) -> str | None:
+    return hashlib.sha1(repr(tuple(row)).encode()).hexdigest() if row is not None else None
+
+
+def _month(value) -> str:
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def _write_part(part_dir: Path, batch, first_id: int, last_id: int) -> Path:
+    path = part_dir / f"part-{first_id:012d}-{last_id:012d}.arrow"
+    tmp = path.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+        writer.write_table(batch)
+    tmp.replace(path)
+    return path
+
+
+def _compact(part_dir: Path, schema) -> None:
+    parts = sorted(part_dir.glob("*.arrow"))
+    if len(parts) <= MAX_PARTS_PER_MONTH:
+        return
+    merged = pa.concat_tables([pa.ipc.open_file(pa.memory_map(str(p), "r")).read_all() for p in parts])
+    first_id, last_id = pc.min(merged["id"]).as_py(), pc.max(merged["id"]).as_py()
+    _write_part(part_dir, merged.cast(schema), first_id, last_id)
+    for path in parts:
+        if path.name != f"part-{first_id:012d}-{last_id:012d}.arrow":
+            path.unlink()
+
+
+def sync_table(session, table: str, root: Path | None = None, batch_size: int = SYNC_BATCH) -> int:
+    # Append rows with id above the watermark as month-partitioned Arrow IPC files. Only inserts reach
+    # the mirror. The app never edits or deletes mirrored columns (retention rewrites runs.trace, which
+    # is not mirrored); edits made outside it stay stale. A reset or swapped database is caught: the
+    # watermark records the database identity and a digest of the last mirrored row, and a mismatch
+    # on either rebuilds the table.
+    if pa is None:
+        return 0
+    table_dir = _table_dir(table, root or session.info.get("columnar_root"))
+    with _locked(table_dir):
+        return _sync_locked(session, table, table_dir, batch_size)
+
+
+def _sync_locked(session, table: str, table_dir: Path, batch_size: int) -> int:
+    spec = TABLES[table]
+    model = spec["model"]
+    table_dir.mkdir(parents=True, exist_ok=True)
+    names = list(spec["columns"])
+    selected = [getattr(model, c) for c in names]
+    state = _read_watermark(table_dir)
+    database = _database_identity(session)
+    watermark = state["max_id"]
+    if watermark and (
+        state.get("database") != database
+        or state.get("last_row") != _row_digest(session.execute(select(*selected).where(model.id == watermark)).first())
+    ):
+        # The database was reset, restored or swapped; the mirror no longer describes it.
+        shutil.rmtree(table_dir)
+        table_dir.mkdir(parents=True)
+        watermark = 0
+    max_id = session.scalar(select(func.max(model.id))) or 0
+    if max_id == watermark:
+        return 0
+
+    schema = _schema(table)
+    partition_idx = names.index(spec["partition_by"])
+    written = 0
+    while True:
+        rows = session.execute(
+            select(*selected).where(model.id > watermark).order_by(model.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        by_month: dict[str, list] = {}
+        for row in rows:
+            by_month.setdefault(_month(row[partition_idx]), []).append(row)
+        for month, month_rows in by_month.items():
+            columns = list(zip(*month_rows))
+            batch = pa.table([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema)
+            part_dir = table_dir / f"month={month}"
+            part_dir.mkdir(exist_ok=True)
+            _write_part(part_dir, batch, month_rows[0][0], month_rows[-1][0])
+            _compact(part_dir, schema)
+        watermark = rows[-1][0]
+        _write_watermark(table_dir, watermark, database, _row_digest(rows[-1]))
+        written += len(rows)
+    return written
+
+
+def sync_all(session, root: Path | None = None) -> dict[str, int]:
+    return {table: sync_table(session, table, root) for table in TABLES}
+
+
+def read_arrow(table: str, columns: list[str] | None = None, since: date | None = None, root: Path | None = None):
+    # Memory-mapped reads: column buffers point into the page cache rather than Python objects.
+    table_dir = _table_dir(table, root)
+    partition_by = TABLES[table]["partition_by"]
+    wanted = columns or list(TABLES[table]["columns"])
+    names = wanted if not since or partition_by in wanted else [*wanted, partition_by]
+    schema = _schema(table)
+    schema = pa.schema([schema.field(c) for c in names])
+
+    parts = []
+    # Held while listing and mapping files only: compaction unlinks parts, which mapped tables survive.
+    with _locked(table_dir):
+        for part_dir in sorted(table_dir.glob("month=*")):
+            if since and part_dir.name.split("=", 1)[1] < _month(since):
+                continue
+            for path in sorted(part_dir.glob("*.arrow")):
+                source = pa.memory_map(str(path), "r")
+                parts.append(pa.ipc.open_file(source).read_all().select(names))
+    result = pa.concat_tables(parts) if parts else schema.empty_table()
+    if since:
+        bound = since if partition_by == "date" else pd.Timestamp(since)
+        result = result.filter(pc.greater_equal(result[partition_by], pa.scalar(bound, type=schema.field(partition_by).type)))
+    return result.select(wanted)
+
+
+def read_frame(session, table: str, columns: list[str] | None = None, since: date | None = None, root: Path | None = None):
+    columns = columns or list(TABLES[table]["columns"])
+    root = root or session.info.get("columnar_root")
+    if pa is not None:
+        sync_table(session, table, root)
+        return read_arrow(table, columns, since, root).to_pandas()
+
+    model = TABLES[table]["model"]
+    query = select(*[getattr(model, c) for c in columns]).order_by(model.id)
+    if since:
+        query = query.where(getattr(model, TABLES[table]["partition_by"]) >= since)
+    return pd.DataFrame(session.execute(query).all(), columns=columns)
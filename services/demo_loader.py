@@ -7,6 +7,7 @@ from sqlalchemy import select
 
 from db import models
 from services.imports import ingest_transactions
+from services.ledger import record_snapshot
 
 
 SAMPLE_RULES = [
@@ -101,7 +102,10 @@ def generate_demo_csv(path: Path):
         writer.writerows(rows)
 
 
-def load_demo_data(session, root_path: str = "."):
+def load_demo_data(session, root_path: str = ".", progress=None):
+    # Flushes as it goes and commits once at the end, so an interrupted load leaves nothing behind.
+    if progress:
+        progress(0.0, "Seeding entities")
     settings = session.scalar(select(models.UserSettings))
     if not settings:
         session.add(models.UserSettings(user_name="Demo User", base_currency="USD"))
@@ -128,23 +132,28 @@ def load_demo_data(session, root_path: str = "."):
         if not session.scalar(select(models.Liability).where(models.Liability.name == l["name"])):
             session.add(models.Liability(**l))
 
-    session.commit()
+    session.flush()
 
     for rule in SAMPLE_RULES:
         if not session.scalar(select(models.Rule).where(models.Rule.name == rule["name"])):
             session.add(models.Rule(**rule, enabled=True))
 
     if not session.scalar(select(models.BalanceSnapshot)):
-        session.add(models.BalanceSnapshot(source_type="account", source_id=1, balance=3400))
+        record_snapshot(session, "account", 1, 3400)
 
-    session.commit()
+    session.flush()
 
     path = Path(root_path) / "data" / "demo_transactions.csv"
     path.parent.mkdir(parents=True, exist_ok=True)
     generate_demo_csv(path)
-    ingest_transactions(session, path)
+    if progress:
+        progress(0.4, "Importing demo transactions")
+    ingest_transactions(session, path, commit=False)
+    if progress:
+        progress(0.8, "Building money map")
 
     if session.scalar(select(models.MoneyMapNode).limit(1)):
+        session.commit()
         return
     for acct in session.scalars(select(models.Account)).all():
         session.add(models.MoneyMapNode(node_type="account", ref_id=acct.id, label=acct.name))
@@ -152,7 +161,7 @@ def load_demo_data(session, root_path: str = "."):
         session.add(models.MoneyMapNode(node_type="pod", ref_id=pod.id, label=pod.name))
     for debt in session.scalars(select(models.Liability)).all():
         session.add(models.MoneyMapNode(node_type="liability", ref_id=debt.id, label=debt.name))
-    session.commit()
+    session.flush()
 
     nodes = session.scalars(select(models.MoneyMapNode)).all()
     by_label = {n.label: n.id for n in nodes}
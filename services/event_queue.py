@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from db import models
+
+DEFAULT_VISIBILITY_TIMEOUT = 60
+DEFAULT_MAX_DEPTH = 10_000
+DEFAULT_MAX_ATTEMPTS = 5
+SQS_BATCH = 10
+# Outbox rows published and deleted per step; stays under SQLite's bound-parameter limit.
+OUTBOX_BATCH = 500
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Delivery:
+    handle: object
+    event: dict
+    attempts: int = 1
+
+
+class EventQueue(ABC):
+    max_depth: int | None = DEFAULT_MAX_DEPTH
+    # Stamped on every published event; workers only evaluate events of their own tenant.
+    tenant: str | None = None
+    # Deliveries after which workers hand a failing or refused event to dead_letter. None leaves it
+    # to the broker (SQS moves it to the redrive policy's dead-letter queue by receive count).
+    max_attempts: int | None = DEFAULT_MAX_ATTEMPTS
+
+    @abstractmethod
+    def depth(self) -> int: ...
+
+    @abstractmethod
+    def _put(self, events: list[dict]) -> None: ...
+
+    @abstractmethod
+    def receive(self, max_messages: int = 10, visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT) -> list[Delivery]: ...
+
+    @abstractmethod
+    def ack(self, deliveries: list[Delivery]) -> None: ...
+
+    def dead_letter(self, delivery: Delivery, reason: str) -> None:
+        # Removes the event from the queue for good; queues with max_attempts set override this.
+        raise NotImplementedError(f"{type(self).__name__} has no dead-letter store")
+
+    def publish(self, events: list[dict], timeout: float | None = 30.0, poll_interval: float = 0.5) -> int:
+        # Backpressure: events go out in chunks of at most max_depth, and before each chunk the producer
+        # waits until it fits under max_depth. QueueFull means no chunk fitted for `timeout` seconds.
+        if not events:
+            return 0
+        events = [{**e, "tenant": self.tenant} for e in events]
+        chunk_size = self.max_depth or len(events)
+        for start in range(0, len(events), chunk_size):
+            chunk = events[start : start + chunk_size]
+            if self.max_depth:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.depth() + len(chunk) > self.max_depth:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise QueueFull(f"Queue depth above {self.max_depth}; workers are not keeping up")
+                    time.sleep(poll_interval)
+            self._put(chunk)
+        return len(events)
+
+
+class InProcessQueue(EventQueue):
+    def __init__(
+        self,
+        max_depth: int | None = DEFAULT_MAX_DEPTH,
+        tenant: str | None = None,
+        max_attempts: int | None = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.max_depth = max_depth
+        self.tenant = tenant
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._ready: deque[tuple[int, dict, int]] = deque()
+        self._in_flight: dict[int, tuple[dict, int, float]] = {}
+        self.dead_letters: list[tuple[dict, int, str]] = []
+        self._next_id = 0
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._ready) + len(self._in_flight)
+
+    def _put(self, events: list[dict]) -> None:
+        with self._lock:
+            for event in events:
+                self._next_id += 1
+                self._ready.append((self._next_id, event, 0))
+
+    def receive(self, max_messages: int = 10, visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT) -> list[Delivery]:
+        now = time.monotonic()
+        with self._lock:
+            for handle, (event, attempts, deadline) in list(self._in_flight.items()):
+                if deadline <= now:
+                    del self._in_flight[handle]
+                    self._ready.appendleft((handle, event, attempts))
+            out = []
+            while self._ready and len(out) < max_messages:
+                handle, event, attempts = self._ready.popleft()
+                self._in_flight[handle] = (event, attempts + 1, now + visibility_timeout)
+                out.append(Delivery(handle, event, attempts + 1))
+            return out
+
+    def ack(self, deliveries: list[Delivery]) -> None:
+        with self._lock:
+            for d in deliveries:
+                self._in_flight.pop(d.handle, None)
+
+    def dead_letter(self, delivery: Delivery, reason: str) -> None:
+        with self._lock:
+            if self._in_flight.pop(delivery.handle, None) is not None:
+                self.dead_letters.append((delivery.event, delivery.attempts, reason))
+
+
+class SQLiteQueue(EventQueue):
+    def __init__(
+        self, session, max_depth: int | None = DEFAULT_MAX_DEPTH, max_attempts: int | None = DEFAULT_MAX_ATTEMPTS
+    ):
+        self.session = session
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.tenant = session.info.get("tenant")
+
+    def depth(self) -> int:
+        return self.session.scalar(select(func.count()).select_from(models.QueuedEvent)) or 0
+
+    def _put(self, events: list[dict]) -> None:
+        now = datetime.utcnow()
+        self.session.add_all(
+            [models.QueuedEvent(event_key=e["event_key"], payload=e, visible_at=now, created_at=now) for e in events]
+        )
+        self.session.commit()
+
+    def receive(self, max_messages: int = 10, visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT) -> list[Delivery]:
+        now = datetime.utcnow()
+        ids = self.session.scalars(
+            select(models.QueuedEvent.id)
+            .where(models.QueuedEvent.visible_at <= now)
+            .order_by(models.QueuedEvent.visible_at, models.QueuedEvent.id)
+            .limit(max_messages)
+        ).all()
+        if not ids:
+            return []
+        # Claim by pushing visible_at forward; the visible_at guard plus a per-call token keeps two
+        # workers that selected the same ids from both processing them.
+        token = str(uuid.uuid4())
+        self.session.execute(
+            update(models.QueuedEvent)
+            .where(models.QueuedEvent.id.in_(ids), models.QueuedEvent.visible_at <= now)
+            .values(
+                visible_at=now + timedelta(seconds=visibility_timeout),
+                attempts=models.QueuedEvent.attempts + 1,
+                claim_token=token,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        self.session.commit()
+        claimed = self.session.execute(
+            select(models.QueuedEvent.id, models.QueuedEvent.payload, models.QueuedEvent.attempts)
+            .where(models.QueuedEvent.claim_token == token)
+            .order_by(models.QueuedEvent.id)
+        ).all()
+        return [Delivery(row.id, row.payload, row.attempts) for row in claimed]
+
+    def ack(self, deliveries: list[Delivery]) -> None:
+        if not deliveries:
+            return
+        self.session.execute(delete(models.QueuedEvent).where(models.QueuedEvent.id.in_([d.handle for d in deliveries])))
+        self.session.commit()
+
+    def dead_letter(self, delivery: Delivery, reason: str) -> None:
+        # Moved, not copied: one transaction inserts the dead letter and deletes the queued row.
+        removed = self.session.execute(delete(models.QueuedEvent).where(models.QueuedEvent.id == delivery.handle))
+        if removed.rowcount:
+            self.session.add(
+                models.DeadLetterEvent(
+                    event_key=delivery.event.get("event_key", ""),
+                    payload=delivery.event,
+                    attempts=delivery.attempts,
+                    reason=reason,
+                )
+            )
+        self.session.commit()
+
+
+class SQSQueue(EventQueue):
+    max_attempts = None
+    def __init__(
+        self,
+        queue_url: str,
+        client=None,
+        max_depth: int | None = DEFAULT_MAX_DEPTH,
+        wait_time: int = 20,
+        tenant: str | None = None,
+    ):
+        if client is None:
+            import boto3
+
+            client = boto3.client("sqs", endpoint_url=os.environ.get("FLOWLEDGER_SQS_ENDPOINT"))
+        self.client = client
+        self.queue_url = queue_url
+        self.max_depth = max_depth
+        self.wait_time = wait_time
+        self.tenant = tenant
+
+    def depth(self) -> int:
+        attrs = self.client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"],
+        )["Attributes"]
+        return int(attrs["ApproximateNumberOfMessages"]) + int(attrs["ApproximateNumberOfMessagesNotVisible"])
+
+    def _put(self, events: list[dict]) -> None:
+        for start in range(0, len(events), SQS_BATCH):
+            chunk = events[start : start + SQS_BATCH]
+            entries = [{"Id": str(i), "MessageBody": json.dumps(e)} for i, e in enumerate(chunk)]
+            response = self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            if response.get("Failed"):
+                raise RuntimeError(f"SQS rejected {len(response['Failed'])} events: {response['Failed'][0]}")
+
+    def receive(self, max_messages: int = 10, visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT) -> list[Delivery]:
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, SQS_BATCH),
+            WaitTimeSeconds=self.wait_time,
+            VisibilityTimeout=visibility_timeout,
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        return [
+            Delivery(m["ReceiptHandle"], json.loads(m["Body"]), int(m.get("Attributes", {}).get("ApproximateReceiveCount", 1)))
+            for m in response.get("Messages", [])
+        ]
+
+    def ack(self, deliveries: list[Delivery]) -> None:
+        for start in range(0, len(deliveries), SQS_BATCH):
+            chunk = deliveries[start : start + SQS_BATCH]
+            entries = [{"Id": str(i), "ReceiptHandle": d.handle} for i, d in enumerate(chunk)]
+            self.client.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+
+
+def drain_outbox(session, queue: EventQueue, timeout: float | None = 30.0) -> int:
+    # Rows are deleted only after the queue accepted them, so a failed publish leaves them for the next
+    # drain. Delivery is at least once: a crash between publish and delete, or two drainers racing,
+    # republishes events, which consumers already tolerate because (rule_id, event_key) runs are idempotent.
+    published = 0
+    while True:
+        rows = session.execute(
+            select(models.OutboxEvent.id, models.OutboxEvent.payload).order_by(models.OutboxEvent.id).limit(OUTBOX_BATCH)
+        ).all()
+        if not rows:
+            return published
+        queue.publish([row.payload for row in rows], timeout=timeout)
+        session.execute(delete(models.OutboxEvent).where(models.OutboxEvent.id.in_([row.id for row in rows])))
+        session.commit()
+        published += len(rows)
+
+
+def tenant_queue_url(queue_url: str, tenant: str | None) -> str:
+    # One SQS queue per tenant: a "{tenant}" placeholder in the URL is filled in, otherwise the
+    # tenant id is appended to the queue name. No tenant keeps the configured queue.
+    if tenant is None:
+        return queue_url.replace("{tenant}", "default")
+    if "{tenant}" in queue_url:
+        return queue_url.replace("{tenant}", tenant)
+    return f"{queue_url.rstrip('/')}-{tenant}"
+
+
+def get_queue(session, client=None) -> EventQueue:
+    # The table-backed queue lives in the tenant's own database, so it is per tenant already.
+    tenant = session.info.get("tenant")
+    queue_url = os.environ.get("FLOWLEDGER_SQS_QUEUE_URL")
+    if queue_url:
+        return SQSQueue(tenant_queue_url(queue_url, tenant), client=client, tenant=tenant)
+    return SQLiteQueue(session)
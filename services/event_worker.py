@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from services.event_queue import DEFAULT_VISIBILITY_TIMEOUT, Delivery, EventQueue, QueueFull, drain_outbox, get_queue
+from services.rules_engine import evaluate_rules_for_event
+
+DEFAULT_BATCH_SIZE = 10
+
+
+def process_batch(
+    session,
+    queue: EventQueue,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT,
+    dry_run: bool = True,
+) -> dict:
+    deliveries = queue.receive(batch_size, visibility_timeout)
+    done: list[Delivery] = []
+    failed = refused = dead_lettered = 0
+    for delivery in deliveries:
+        if delivery.event.get("tenant") != queue.tenant:
+            # Never evaluated against this tenant's database, and not acked: a misrouted event is
+            # redelivered until max_attempts and then dead-lettered instead of being lost.
+            logging.error(
+                "Refusing %s from tenant %r on tenant %r's queue",
+                delivery.event.get("event_key"),
+                delivery.event.get("tenant"),
+                queue.tenant,
+            )
+            refused += 1
+            reason = f"refused: event of tenant {delivery.event.get('tenant')!r}"
+        else:
+            try:
+                evaluate_rules_for_event(session, delivery.event, dry_run=dry_run)
+            except Exception as exc:
+                # Not acked: the event becomes visible again after the timeout. A retry that had
+                # partially persisted runs is safe because (rule_id, event_key) runs are idempotent.
+                session.rollback()
+                logging.exception(
+                    "Failed to evaluate %s (attempt %s)", delivery.event.get("event_key"), delivery.attempts
+                )
+                failed += 1
+                reason = f"{type(exc).__name__}: {exc}"
+            else:
+                done.append(delivery)
+                continue
+        if queue.max_attempts and delivery.attempts >= queue.max_attempts:
+            # Local queues have no broker-side redrive; stop retrying an event that keeps failing.
+            logging.error("Dead-lettering %s after %s attempts", delivery.event.get("event_key"), delivery.attempts)
+            queue.dead_letter(delivery, reason)
+            dead_lettered += 1
+    queue.ack(done)
+    return {
+        "received": len(deliveries),
+        "processed": len(done),
+        "failed": failed,
+        "refused": refused,
+        "dead_lettered": dead_lettered,
+    }
+
+
+def run_worker(
+    session,
+    queue: EventQueue,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT,
+    dry_run: bool = True,
+    idle_sleep: float = 1.0,
+    idle_exit: int = 0,
+) -> dict:
+    totals = {"received": 0, "processed": 0, "failed": 0, "refused": 0, "dead_lettered": 0}
+    empty_streak = 0
+    while True:
+        try:
+            # Events whose import could not publish them (queue full or unreachable) go out from here.
+            drain_outbox(session, queue, timeout=0)
+        except QueueFull:
+            session.rollback()
+        except Exception:
+            session.rollback()
+            logging.warning("Outbox not drained; retrying on the next poll", exc_info=True)
+        stats = process_batch(session, queue, batch_size, visibility_timeout, dry_run)
+        for key, value in stats.items():
+            totals[key] += value
+        if stats["received"]:
+            empty_streak = 0
+            continue
+        empty_streak += 1
+        if idle_exit and empty_streak >= idle_exit:
+            return totals
+        time.sleep(idle_sleep)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from db.engine import init_db
+    from db.tenancy import open_session
+
+    parser = argparse.ArgumentParser(description="Evaluate queued transaction events through the rules engine")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--visibility-timeout", type=int, default=DEFAULT_VISIBILITY_TIMEOUT)
+    parser.add_argument("--apply", action="store_true", help="persist tasks (default is dry-run)")
+    parser.add_argument("--idle-exit", type=int, default=0, help="stop after this many empty polls (0 = never)")
+    parser.add_argument("--log", default="INFO")
+    parser.add_argument("--tenant", default=None, help="tenant id (default: the single-household database)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="[%(levelname)s] %(message)s", level=args.log)
+
+    if args.tenant is None:
+        init_db()
+    session = open_session(args.tenant)
+    queue = get_queue(session)
+    logging.info("Worker started on %s", type(queue).__name__)
+    try:
+        totals = run_worker(
+            session,
+            queue,
+            batch_size=args.batch_size,
+            visibility_timeout=args.visibility_timeout,
+            dry_run=not args.apply,
+            idle_exit=args.idle_exit,
+        )
+        logging.info("Worker finished: %s", totals)
+    except KeyboardInterrupt:
+        logging.info("Interrupted")
+    finally:
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
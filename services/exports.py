@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import sys
+import tempfile
+from datetime import datetime
+from typing import IO, Iterable, Iterator
+
+from sqlalchemy import select
+
+from db import models
+
+EXPORT_BATCH = 5_000
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Flattened trace fields shared by run and simulation exports.
+TRACE_COLUMNS = {
+    "trigger": "bool",
+    "dry_run": "bool",
+    "conditions": "string",
+    "failed_condition": "string",
+    "opening_balance": "float64",
+    "allocated": "float64",
+    "available_after": "float64",
+    "fx_currency": "string",
+    "amount_base": "float64",
+    "action_count": "int64",
+}
+ACTION_COLUMNS = {
+    "action_index": "int64",
+    "action_type": "string",
+    "action_status": "string",
+    "action_message": "string",
+    "action_allocated": "float64",
+    "action_pod_id": "string",
+}
+RUN_COLUMNS = {
+    "run_id": "int64",
+    "rule_id": "int64",
+    "event_key": "string",
+    "status": "string",
+    "created_at": "timestamp",
+    **TRACE_COLUMNS,
+}
+SIMULATION_COLUMNS = {"transaction_id": "int64", "status": "string", **TRACE_COLUMNS}
+
+
+def flatten_trace(trace: dict | None) -> dict:
+    trace = trace or {}
+    conditions = trace.get("conditions", [])
+    failed = next((c for c in conditions if not c.get("ok")), None)
+    ledger = trace.get("ledger", {})
+    fx = trace.get("fx", {})
+    return {
+        "trigger": trace.get("trigger"),
+        "dry_run": trace.get("dry_run"),
+        "conditions": "; ".join(c.get("message", "") for c in conditions) or None,
+        "failed_condition": failed.get("message") if failed else None,
+        "opening_balance": ledger.get("opening_balance"),
+        "allocated": ledger.get("allocated"),
+        "available_after": ledger.get("available_after"),
+        "fx_currency": fx.get("currency"),
+        "amount_base": fx.get("amount_base"),
+        "action_count": len(trace.get("actions", [])),
+    }
+
+
+def _action_fields(index: int, action_type: str | None, status: str, message: str, payload: dict | None) -> dict:
+    payload = payload or {}
+    pod_id = payload.get("pod_id")
+    return {
+        "action_index": index,
+        "action_type": action_type,
+        "action_status": status,
+        "action_message": message,
+        "action_allocated": payload.get("allocated"),
+        "action_pod_id": None if pod_id is None else str(pod_id),
+    }
+
+
+def run_columns(include_actions: bool = False) -> dict[str, str]:
+    return {**RUN_COLUMNS, **ACTION_COLUMNS} if include_actions else dict(RUN_COLUMNS)
+
+
+def simulation_columns(include_actions: bool = False) -> dict[str, str]:
+    return {**SIMULATION_COLUMNS, **ACTION_COLUMNS} if include_actions else dict(SIMULATION_COLUMNS)
+
+
+def iter_run_rows(
+    session,
+    include_actions: bool = False,
+    since: datetime | None = None,
+    batch_size: int = EXPORT_BATCH,
+) -> Iterator[dict]:
+    # Keyset pages over runs.id with core selects: no ORM instances pile up in the identity map, so
+    # memory stays flat however many runs there are. With include_actions, each action result is its
+    # own row (runs without results still get one row).
+    last_id = 0
+    while True:
+        query = select(
+            models.Run.id, models.Run.rule_id, models.Run.event_key, models.Run.status, models.Run.created_at, models.Run.trace
+        ).where(models.Run.id > last_id)
+        if since is not None:
+            query = query.where(models.Run.created_at >= since)
+        runs = session.execute(query.order_by(models.Run.id).limit(batch_size)).all()
+        if not runs:
+            return
+        last_id = runs[-1].id
+
+        actions: dict[int, list] = {}
+        if include_actions:
+            rows = session.execute(
+                select(
+                    models.ActionResult.run_id,
+                    models.ActionResult.action_index,
+                    models.ActionResult.status,
+                    models.ActionResult.message,
+                    models.ActionResult.payload,
+                )
+                .where(models.ActionResult.run_id.in_([r.id for r in runs]))
+                .order_by(models.ActionResult.run_id, models.ActionResult.action_index)
+            ).all()
+            for row in rows:
+                actions.setdefault(row.run_id, []).append(row)
+
+        for run in runs:
+            base = {
+                "run_id": run.id,
+                "rule_id": run.rule_id,
+                "event_key": run.event_key,
+                "status": run.status,
+                "created_at": run.created_at,
+                **flatten_trace(run.trace),
+            }
+            if not include_actions:
+                yield base
+                continue
+            trace_actions = (run.trace or {}).get("actions", [])
+            results = actions.get(run.id) or [None]
+            for result in results:
+                if result is None:
+                    yield {**base, **dict.fromkeys(ACTION_COLUMNS)}
+                    continue
+                kind = trace_actions[result.action_index]["action"].get("type") if result.action_index < len(trace_actions) else None
+                yield {**base, **_action_fields(result.action_index, kind, result.status, result.message, result.payload)}
+
+
+def iter_simulation_rows(traces: Iterable[dict], include_actions: bool = False) -> Iterator[dict]:
+    for item in traces:
+        base = {"transaction_id": item["transaction_id"], "status": item["status"], **flatten_trace(item["trace"])}
+        actions = item["trace"].get("actions", []) if include_actions else []
+        if not include_actions:
+            yield base
+        elif not actions:
+            yield {**base, **dict.fromkeys(ACTION_COLUMNS)}
+        for idx, action in enumerate(actions):
+            yield {
+                **base,
+                **_action_fields(idx, action["action"].get("type"), action["status"], action["message"], action.get("payload")),
+            }
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv_chunks(rows: Iterable[dict], columns: dict[str, str], batch_size: int = EXPORT_BATCH) -> Iterator[str]:
+    # Yields the header, then one CSV text chunk per batch; suitable for a streaming response body.
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in _batches(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def write_csv(rows: Iterable[dict], columns: dict[str, str], out: IO, batch_size: int = EXPORT_BATCH) -> int:
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    binary = not isinstance(out, io.TextIOBase)
+    for chunk in iter_csv_chunks(counted(), columns, batch_size):
+        out.write(chunk.encode() if binary else chunk)
+    return count
+
+
+def _arrow_schema(columns: dict[str, str]):
+    import pyarrow as pa
+
+    types = {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns.items()])
+
+
+def write_parquet(
+    rows: Iterable[dict], columns: dict[str, str], out, batch_size: int = EXPORT_BATCH, compression: str = "snappy"
+) -> int:
+    # One row group per batch, written as it is produced; the fixed schema keeps all-null batches valid.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    count = 0
+    with pq.ParquetWriter(out, schema, compression=compression) as writer:
+        for batch in _batches(rows, batch_size):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def export_rows(rows: Iterable[dict], columns: dict[str, str], out, fmt: str = "csv", batch_size: int = EXPORT_BATCH) -> int:
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return WRITERS[fmt](rows, columns, out, batch_size)
+
+
+def export_to_spool(rows: Iterable[dict], columns: dict[str, str], fmt: str = "csv") -> IO[bytes]:
+    # Small exports stay in memory; large ones spill to a temp file instead of one growing string.
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    export_rows(rows, columns, out, fmt)
+    out.seek(0)
+    return out
+
+
+def export_runs(session, out, fmt: str = "csv", include_actions: bool = False, since: datetime | None = None) -> int:
+    return export_rows(iter_run_rows(session, include_actions, since), run_columns(include_actions), out, fmt)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from db.engine import init_db
+    from db.tenancy import open_session
+
+    parser = argparse.ArgumentParser(description="Stream rule runs to CSV or Parquet")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--out", default="-", help="output path, or - for stdout (CSV only)")
+    parser.add_argument("--actions", action="store_true", help="one row per action result")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--tenant", default=None, help="tenant id (default: the single-household database)")
+    args = parser.parse_args(argv)
+
+    if args.tenant is None:
+        init_db()
+    with open_session(args.tenant) as session:
+        if args.out == "-":
+            if args.format != "csv":
+                parser.error("Parquet export needs --out")
+            count = export_runs(session, sys.stdout, "csv", args.actions, args.since)
+        else:
+            with open(args.out, "wb") as out:
+                count = export_runs(session, out, args.format, args.actions, args.since)
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db import models
+
+DEFAULT_RATES_PATH = Path("data") / "fx_rates.csv"
+DEFAULT_BASE_CURRENCY = "USD"
+# Pairs with no quote of their own are crossed through this currency (EUR->CAD as EUR->USD->CAD).
+PIVOT_CURRENCY = "USD"
+BASE_CURRENCY_KEY = "fx_base_currency"
+RATE_COLUMNS = ["date", "from_currency", "to_currency", "rate"]
+
+logger = logging.getLogger(__name__)
+
+
+class FxTable:
+    # Rates file rows mean: 1 unit of from_currency = rate units of to_currency, effective from date
+    # until the next row for the same pair. Lookups are as-of (latest rate on or before the date), and
+    # a pair without quotes is triangulated through PIVOT_CURRENCY.
+    def __init__(self, rates: pd.DataFrame):
+        rates = rates[RATE_COLUMNS].copy()
+        rates["date"] = pd.to_datetime(rates["date"]).astype("datetime64[ns]")
+        rates["from_currency"] = rates["from_currency"].str.upper()
+        rates["to_currency"] = rates["to_currency"].str.upper()
+        inverse = rates.rename(columns={"from_currency": "to_currency", "to_currency": "from_currency"})
+        inverse["rate"] = 1.0 / inverse["rate"]
+        # Direct quotes win over inverted ones for the same pair and date.
+        self.rates = (
+            pd.concat([rates, inverse[RATE_COLUMNS]], ignore_index=True)
+            .drop_duplicates(["date", "from_currency", "to_currency"], keep="first")
+            .sort_values("date", ignore_index=True)
+        )
+        self._index = {
+            pair: (group["date"].to_numpy(), group["rate"].to_numpy())
+            for pair, group in self.rates.groupby(["from_currency", "to_currency"], sort=False)
+        }
+        self.rate = lru_cache(maxsize=65_536)(self._rate)
+        self._warned: set[tuple[str, str]] = set()
+
+    def _rate(self, from_currency: str, to_currency: str, on: date) -> float | None:
+        direct = self._quoted(from_currency, to_currency, on)
+        if direct is not None or PIVOT_CURRENCY in (from_currency, to_currency):
+            return direct
+        to_pivot = self._quoted(from_currency, PIVOT_CURRENCY, on)
+        from_pivot = self._quoted(PIVOT_CURRENCY, to_currency, on)
+        return to_pivot * from_pivot if to_pivot is not None and from_pivot is not None else None
+
+    def _quoted(self, from_currency: str, to_currency: str, on: date) -> float | None:
+        if from_currency == to_currency:
+            return 1.0
+        entry = self._index.get((from_currency, to_currency))
+        if entry is None:
+            return None
+        dates, values = entry
+        idx = int(np.searchsorted(dates, np.datetime64(on, "ns"), side="right")) - 1
+        return float(values[idx]) if idx >= 0 else None
+
+    def to_base(self, amount: float, currency: str | None, on: date, base: str) -> float:
+        if not currency or currency.upper() == base:
+            return amount
+        rate = self.rate(currency.upper(), base, on)
+        if rate is None:
+            # Once per pair, not per transaction: a backtest over a missing pair would log every row.
+            if (currency.upper(), base) not in self._warned:
+                self._warned.add((currency.upper(), base))
+                logger.warning("No %s->%s rate on or before %s; using unconverted amounts", currency, base, on)
+            return amount
+        return amount * rate
+
+    def convert_frame(
+        self,
+        df: pd.DataFrame,
+        base: str,
+        amount_col: str = "amount",
+        currency_col: str = "currency",
+        date_col: str = "date",
+    ) -> pd.DataFrame:
+        # One vectorized as-of join for the whole frame; adds amount_base and keeps row order.
+        out = df.copy()
+        if currency_col not in out.columns:
+            out["amount_base"] = out[amount_col].astype(float)
+            return out
+        currency = out[currency_col].fillna(base).astype(str).str.upper().to_numpy()
+        dates = pd.to_datetime(out[date_col]).astype("datetime64[ns]").to_numpy()
+        rate = self._asof(dates, currency, base)
+        crossed = np.isnan(rate) & (currency != PIVOT_CURRENCY)
+        if crossed.any() and base != PIVOT_CURRENCY:
+            to_pivot = self._asof(dates[crossed], currency[crossed], PIVOT_CURRENCY)
+            pivot = np.full(len(to_pivot), PIVOT_CURRENCY, dtype=object)
+            rate[crossed] = to_pivot * self._asof(dates[crossed], pivot, base)
+        missing = np.isnan(rate)
+        if missing.any():
+            logger.warning("%d rows have no %s rate; using unconverted amounts", int(missing.sum()), base)
+            rate = np.where(missing, 1.0, rate)
+        out["amount_base"] = out[amount_col].to_numpy(dtype=float) * rate
+        return out
+
+    def _asof(self, dates: np.ndarray, currencies: np.ndarray, to_currency: str) -> np.ndarray:
+        # Quoted rate to to_currency for each (date, currency) row, NaN where there is none.
+        left = pd.DataFrame({"_row": np.arange(len(dates)), "date": dates, "from_currency": currencies})
+        left = left.astype({"from_currency": object}).sort_values("date", kind="stable")
+        right = self.rates.loc[self.rates["to_currency"] == to_currency, ["date", "from_currency", "rate"]]
+        # merge_asof wants one key dtype on both sides, and pandas may infer string columns for either.
+        right = right.astype({"from_currency": object, "rate": float})
+        joined = pd.merge_asof(left, right, on="date", by="from_currency", direction="backward").sort_values("_row")
+        return np.where(currencies == to_currency, 1.0, joined["rate"].to_numpy(dtype=float))
+
+
+@lru_cache(maxsize=8)
+def _load(path: str, mtime: float) -> FxTable:
+    return FxTable(pd.read_csv(path))
+
+
+def load_fx_table(path: Path | str = DEFAULT_RATES_PATH) -> FxTable:
+    path = Path(path)
+    if not path.exists():
+        return FxTable(pd.DataFrame(columns=RATE_COLUMNS))
+    return _load(str(path), path.stat().st_mtime)
+
+
+def base_currency(session) -> str:
+    # Cached on the session for the current transaction, so per-event evaluation does not re-query
+    # settings for every rule; the listeners below drop it when settings may have changed.
+    cached = session.info.get(BASE_CURRENCY_KEY)
+    if cached is None:
+        cached = session.scalar(select(models.UserSettings.base_currency).limit(1)) or DEFAULT_BASE_CURRENCY
+        session.info[BASE_CURRENCY_KEY] = cached = cached.upper()
+    return cached
+
+
+@event.listens_for(Session, "after_flush")
+def _settings_saved(session, flush_context) -> None:
+    if any(isinstance(obj, models.UserSettings) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info.pop(BASE_CURRENCY_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _transaction_ended(session, transaction) -> None:
+    # Settings saved through another session (or process) are read afresh by the next transaction.
+    if transaction.parent is None:
+        session.info.pop(BASE_CURRENCY_KEY, None)
+
+
+def tx_amount_in_base(session, tx, table: FxTable | None = None) -> float | None:
+    # Batch callers load the table once and pass it in, rather than statting the rates file per row.
+    if tx is None:
+        return None
+    currency = getattr(tx, "currency", None)
+    base = base_currency(session)
+    if not currency or currency.upper() == base:
+        return tx.amount
+    return (table or load_fx_table()).to_base(tx.amount, currency, tx.date, base)
@@ -1,17 +1,55 @@
 from __future__ import annotations
 
 import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import func, insert, select
 
 from db import models
+from services.categorize import Categorizer
+from services.event_queue import drain_outbox
+from services.readers import read_transactions_frame
+from services.validation import validate_transactions
 
 REQUIRED_COLUMNS = ["date", "description", "amount"]
 OPTIONAL_COLUMNS = ["account", "category", "merchant", "currency"]
+# Rows per INSERT and per existing-hash lookup; stays under SQLite's bound-parameter limit.
+WRITE_BATCH = 500
+MAX_IMPORT_WORKERS = 8
+
+
+def tx_hashes(df: pd.DataFrame) -> list[str]:
+    # The dedup key, from validated values in one canonical form: ISO date, stripped description, amount
+    # to the cent and account or "". Two statements holding the same row then agree on the key even when
+    # pandas infers different dtypes for their columns (2200 in one file, 2200.0 in the other).
+    return [
+        hashlib.sha1(f"{d.isoformat()}|{desc.strip()}|{float(amount):.2f}|{account or ''}".encode()).hexdigest()
+        for d, desc, amount, account in zip(
+            df["date"].tolist(), df["description"].tolist(), df["amount"].tolist(), df["account"].tolist()
+        )
+    ]
 
 
-def ingest_transactions(session, csv_path_or_buffer):
-    df = pd.read_csv(csv_path_or_buffer)
+def legacy_tx_hashes(df: pd.DataFrame) -> list[str]:
+    # The key imports stored before it was canonical: the raw values as pandas read them (2200 or 2200.0,
+    # nan for an empty account, None for a missing column). Only looked up, so old rows are not re-imported.
+    return [
+        hashlib.sha1(f"{d}|{desc}|{amount}|{account}".encode()).hexdigest()
+        for d, desc, amount, account in zip(
+            df["date"].tolist(), df["description"].tolist(), df["amount"].tolist(), df["account"].tolist()
+        )
+    ]
+
+
+def prepare_transactions(source, fmt: str | None = None) -> tuple[pd.DataFrame, list[dict]]:
+    # The CPU-bound half of an import: parse, validate and hash. It touches no database, so the
+    # multi-file import runs it in worker processes.
+    df = read_transactions_frame(source, fmt)
     cols = [c.lower().strip() for c in df.columns]
     df.columns = cols
     missing = [c for c in REQUIRED_COLUMNS if c not in cols]
@@ -22,17 +60,151 @@ def ingest_transactions(session, csv_path_or_buffer):
         if col not in df.columns:
             df[col] = None
 
-    df["date"] = pd.to_datetime(df["date"]).dt.date
-    created, events = 0, []
-    for row in df.to_dict(orient="records"):
-        tx_hash = hashlib.sha1(f"{row['date']}|{row['description']}|{row['amount']}|{row.get('account')}".encode()).hexdigest()
-        exists = session.scalar(select(models.Transaction).where(models.Transaction.tx_hash == tx_hash))
-        if exists:
-            continue
-        tx = models.Transaction(tx_hash=tx_hash, **row)
-        session.add(tx)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
+    legacy = legacy_tx_hashes(df)
+    df, rejected = validate_transactions(df[REQUIRED_COLUMNS + OPTIONAL_COLUMNS])
+    df["tx_hash"] = tx_hashes(df)
+    df["legacy_hash"] = [legacy[pos] for pos in df.index]
+    return df.reset_index(drop=True), rejected
+
+
+def _prepare_file(path: str) -> tuple[pd.DataFrame | None, list[dict], str | None]:
+    try:
+        df, rejected = prepare_transactions(path)
+    except Exception as exc:  # reported per file; the other files still import
+        return None, [], f"{type(exc).__name__}: {exc}"
+    return df, rejected, None
+
+
+def _source_name(source, source_name: str | None = None) -> str | None:
+    return source_name or getattr(source, "name", None) or (str(source) if isinstance(source, (str, Path)) else None)
+
+
+def _existing_hashes(session, hashes: list[str]) -> set[str]:
+    found = set()
+    for start in range(0, len(hashes), WRITE_BATCH):
+        chunk = hashes[start : start + WRITE_BATCH]
+        found.update(session.scalars(select(models.Transaction.tx_hash).where(models.Transaction.tx_hash.in_(chunk))))
+    return found
+
+
+def _write_prepared(
+    session,
+    prepared: list[tuple[str | None, pd.DataFrame, list[dict]]],
+    publisher=None,
+    progress=None,
+    categorizer: Categorizer | None = None,
+    commit: bool = True,
+) -> dict:
+    # The single writer: quarantines rejects, drops rows whose tx_hash repeats within or across the
+    # prepared files or already exists, then inserts the rest in batches and commits once. With
+    # commit=False it only flushes, for callers that commit the import with their own writes.
+    rejected = []
+    for name, _, rows in prepared:
+        session.add_all(
+            [models.QuarantinedRow(source=name, row_number=r["row"], payload=r["payload"], errors=r["errors"]) for r in rows]
+        )
+        rejected.extend(rows)
+
+    frames = [df for _, df, _ in prepared]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    df = df.drop_duplicates("tx_hash", keep="first")
+    known = _existing_hashes(session, df["tx_hash"].tolist() + df["legacy_hash"].tolist())
+    if known:
+        df = df[~(df["tx_hash"].isin(known) | df["legacy_hash"].isin(known))]
+    df = df.drop(columns="legacy_hash")
+    # Fill empty category/merchant from patterns and past categorizations; tx_hash ignores both columns.
+    df = (categorizer or Categorizer.from_history(session)).categorize_frame(df)
+
+    events = []
+    rows = df.to_dict(orient="records")
+    total = len(rows)
+    statement = insert(models.Transaction).returning(models.Transaction.id, sort_by_parameter_order=True)
+    for start in range(0, total, WRITE_BATCH):
+        if progress:
+            progress(start / total, f"Imported {start}/{total} rows")
+        ids = session.scalars(statement, rows[start : start + WRITE_BATCH]).all()
+        events.extend({"type": "transaction", "event_key": f"tx:{tx_id}", "transaction_id": tx_id} for tx_id in ids)
+    if publisher is not None:
+        # The outbox commits with the transactions, so a queue outage cannot lose their events.
+        session.add_all([models.OutboxEvent(payload=e) for e in events])
+    unpublished = 0
+    if not commit:
+        # The events wait in the outbox until the caller commits; the worker drains them from there.
         session.flush()
-        events.append({"event_key": f"tx:{tx.id}", "transaction_id": tx.id})
-        created += 1
-    session.commit()
-    return {"created": created, "events": events}
+        unpublished = len(events) if publisher is not None else 0
+    else:
+        session.commit()
+        if publisher is not None:
+            try:
+                drain_outbox(session, publisher)
+            except Exception:
+                # The import itself succeeded; the worker drains what is left once the queue recovers.
+                session.rollback()
+                unpublished = session.scalar(select(func.count()).select_from(models.OutboxEvent))
+                logging.exception("Could not publish import events; %s left in the outbox", unpublished)
+    return {
+        "created": len(events),
+        "events": events,
+        "unpublished": unpublished,
+        "quarantined": len(rejected),
+        "errors": rejected,
+    }
+
+
+def ingest_transactions(
+    session,
+    source,
+    publisher=None,
+    progress=None,
+    fmt: str | None = None,
+    source_name: str | None = None,
+    categorizer: Categorizer | None = None,
+    commit: bool = True,
+):
+    df, rejected = prepare_transactions(source, fmt)
+    name = _source_name(source, source_name)
+    return _write_prepared(session, [(name, df, rejected)], publisher, progress, categorizer, commit)
+
+
+def ingest_files(
+    session,
+    paths: list,
+    publisher=None,
+    progress=None,
+    names: list[str] | None = None,
+    categorizer: Categorizer | None = None,
+    max_workers: int | None = None,
+) -> dict:
+    # Files are prepared in parallel, one per worker process, and then written together, so a batch
+    # takes about as long as its slowest file plus one bulk insert. A file that cannot be read is
+    # reported in "files" and skipped; the rest are still imported.
+    paths = [str(p) for p in paths]
+    names = names or paths
+    workers = max_workers or min(len(paths), os.cpu_count() or 1, MAX_IMPORT_WORKERS)
+    if progress:
+        progress(0.0, f"Parsing {len(paths)} files")
+    if workers <= 1 or len(paths) <= 1:
+        results = [_prepare_file(p) for p in paths]
+    else:
+        # spawn, not fork: the app and job runner are multi-threaded, and forking those can deadlock.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(_prepare_file, paths))
+    if progress:
+        progress(0.5, "Merging files")
+
+    prepared, files = [], []
+    for name, (df, rejected, error) in zip(names, results):
+        files.append({"source": name, "rows": 0 if df is None else len(df), "quarantined": len(rejected), "error": error})
+        if df is not None:
+            prepared.append((name, df, [{**r, "source": name} for r in rejected]))
+    if not prepared:
+        return {"created": 0, "events": [], "unpublished": 0, "quarantined": 0, "errors": [], "files": files}
+
+    def write_progress(fraction, message=None):
+        progress(0.5 + fraction / 2, message)
+
+    result = _write_prepared(session, prepared, publisher, write_progress if progress else None, categorizer)
+    result["files"] = files
+    return result
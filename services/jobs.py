@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import select, update
+
+from db import models
+from services import columnar
+from services.demo_loader import load_demo_data
+from services.event_queue import get_queue
+from services.imports import ingest_files, ingest_transactions
+from services.retention import ARCHIVE_DIR, DETAIL_DAYS, RetentionPolicy, apply_retention
+from services.simulator import simulate_rule
+
+ACTIVE_STATUSES = {"queued", "running"}
+UPLOAD_DIR = Path("data") / "uploads"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _import_job(session, params: dict, progress) -> dict:
+    paths = [Path(p) for p in params.get("paths") or [params["path"]]]
+    try:
+        publisher = get_queue(session) if params.get("publish") else None
+        if "paths" in params:
+            result = ingest_files(session, paths, publisher=publisher, progress=progress, names=params.get("names"))
+        else:
+            result = ingest_transactions(
+                session, paths[0], publisher=publisher, progress=progress, source_name=params.get("name")
+            )
+        columnar.sync_table(session, "transactions")
+    finally:
+        if params.get("delete_after"):
+            for path in paths:
+                path.unlink(missing_ok=True)
+    summary = {
+        "created": result["created"],
+        "events": len(result["events"]),
+        "unpublished": result["unpublished"],
+        "quarantined": result["quarantined"],
+        "errors": result["errors"][:50],
+    }
+    if "files" in result:
+        summary["files"] = result["files"]
+    return summary
+
+
+def _simulate_job(session, params: dict, progress) -> dict:
+    report = simulate_rule(session, int(params["rule_id"]), days=int(params.get("days", 90)), progress=progress)
+    return report.model_dump(mode="json")
+
+
+def _demo_job(session, params: dict, progress) -> dict:
+    load_demo_data(session, params.get("root_path", "."), progress=progress)
+    columnar.sync_table(session, "transactions")
+    return {}
+
+
+def _retention_job(session, params: dict, progress) -> dict:
+    policy = RetentionPolicy(
+        detail_days=int(params.get("detail_days", DETAIL_DAYS)),
+        archive=bool(params.get("archive", True)),
+        archive_dir=session.info.get("archive_dir", ARCHIVE_DIR),
+    )
+    report = apply_retention(session, policy, progress=progress)
+    return {
+        "runs_compacted": report.runs_compacted,
+        "action_results_deleted": report.action_results_deleted,
+        "error_logs_deleted": report.error_logs_deleted,
+        "archived_files": len(report.archived_files),
+        "pages_freed": report.pages_freed,
+    }
+
+
+JOB_HANDLERS = {
+    "import": _import_job,
+    "simulate": _simulate_job,
+    "demo": _demo_job,
+    "retention": _retention_job,
+}
+
+
+def save_upload(name: str, data: bytes, upload_dir: Path = UPLOAD_DIR) -> Path:
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / f"{datetime.utcnow():%Y%m%d%H%M%S%f}_{os.path.basename(name)}"
+    path.write_bytes(data)
+    return path
+
+
+def _owner_exited(owner: str, host: str) -> bool:
+    owner_host, _, pid = owner.rpartition(":")
+    # Signal 0 only probes on POSIX; on Windows os.kill would terminate the process.
+    if owner_host != host or not pid.isdigit() or os.name == "nt":
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:  # alive, under another user
+        pass
+    return False
+
+
+class JobRunner:
+    # Progress and cancel flags live in memory: a running import holds SQLite's write lock until it
+    # commits, so the job row is only written at status transitions.
+    def __init__(self, session_factory, max_workers: int = 2):
+        self.session_factory = session_factory
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flowledger-job")
+        self._lock = threading.Lock()
+        self._live: dict[int, dict] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._fail_orphans()
+
+    def _fail_orphans(self) -> None:
+        # Only jobs whose owning process on this host has exited: other runners, in this process or in
+        # another live one, keep theirs. Jobs on other hosts are left to those hosts.
+        host = socket.gethostname()
+        with self.session_factory() as session:
+            owners = session.scalars(
+                select(models.Job.owner).where(models.Job.status.in_(ACTIVE_STATUSES)).distinct()
+            ).all()
+            dead = [owner for owner in owners if owner is not None and _owner_exited(owner, host)]
+            if not dead and None not in owners:
+                return
+            # Rows without an owner predate owner tracking and cannot belong to a live runner.
+            session.execute(
+                update(models.Job)
+                .where(models.Job.status.in_(ACTIVE_STATUSES), models.Job.owner.is_(None) | models.Job.owner.in_(dead))
+                .values(status="failed", error="Interrupted by restart", finished_at=datetime.utcnow())
+            )
+            session.commit()
+
+    def submit(self, kind: str, params: dict | None = None) -> int:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind {kind}")
+        with self.session_factory() as session:
+            job = models.Job(kind=kind, params=params or {}, status="queued", owner=self.owner)
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        with self._lock:
+            self._live[job_id] = {"progress": 0.0, "message": "Queued", "cancel": False}
+        self.pool.submit(self._execute, job_id)
+        return job_id
+
+    def cancel(self, job_id: int) -> None:
+        with self._lock:
+            if job_id in self._live:
+                self._live[job_id]["cancel"] = True
+        with self.session_factory() as session:
+            session.execute(update(models.Job).where(models.Job.id == job_id).values(cancel_requested=True))
+            session.commit()
+
+    def _report(self, job_id: int, fraction: float, message: str | None = None) -> None:
+        with self._lock:
+            live = self._live[job_id]
+            live["progress"] = max(0.0, min(1.0, fraction))
+            if message:
+                live["message"] = message
+            cancelled = live["cancel"]
+        if cancelled:
+            raise JobCancelled()
+
+    def _finish(self, job_id: int, **values) -> None:
+        with self._lock:
+            live = dict(self._live.get(job_id, {}))
+        values.setdefault("progress", live.get("progress", 0.0))
+        values.setdefault("message", live.get("message"))
+        with self.session_factory() as session:
+            session.execute(
+                update(models.Job).where(models.Job.id == job_id).values(finished_at=datetime.utcnow(), **values)
+            )
+            session.commit()
+        with self._lock:
+            self._live.pop(job_id, None)
+
+    def _execute(self, job_id: int) -> None:
+        with self.session_factory() as session:
+            job = session.get(models.Job, job_id)
+            if job.cancel_requested:
+                self._finish(job_id, status="cancelled", message="Cancelled before start")
+                return
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            session.commit()
+            handler, params = JOB_HANDLERS[job.kind], dict(job.params)
+
+            try:
+                result = handler(session, params, lambda fraction, message=None: self._report(job_id, fraction, message))
+            except JobCancelled:
+                session.rollback()
+                self._finish(job_id, status="cancelled", message="Cancelled")
+            except Exception as exc:
+                session.rollback()
+                logging.exception("Job %s (%s) failed", job_id, job.kind)
+                self._finish(job_id, status="failed", error=str(exc))
+            else:
+                self._finish(job_id, status="succeeded", progress=1.0, message="Done", result=result)
+
+    def status(self, session, job_id: int) -> dict | None:
+        job = session.get(models.Job, job_id, populate_existing=True)
+        if job is None:
+            return None
+        snapshot = {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": job.progress,
+            "message": job.message,
+            "result": job.result,
+            "error": job.error,
+        }
+        with self._lock:
+            live = self._live.get(job_id)
+            if live and job.status in ACTIVE_STATUSES:
+                snapshot.update(progress=live["progress"], message=live["message"])
+        return snapshot
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.pool.shutdown(wait=wait)
+
+
+def list_jobs(session, limit: int = 20) -> list[models.Job]:
+    return session.scalars(select(models.Job).order_by(models.Job.id.desc()).limit(limit)).all()
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time
+
+import numpy as np
+from sqlalchemy import case, func, select, update
+
+from db import models
+
+OWNER_TYPES = ("pod", "account")
+
+
+def _as_datetime(at: date | datetime) -> datetime:
+    # A bare date means "as of the end of that day".
+    return at if isinstance(at, datetime) else datetime.combine(at, time.max)
+
+
+def _balance_row(session, owner_type: str, owner_id: int) -> models.LedgerBalance:
+    state = session.get(models.LedgerBalance, (owner_type, owner_id))
+    if state is not None:
+        return state
+    state = models.LedgerBalance(owner_type=owner_type, owner_id=owner_id, balance=0.0)
+    session.add(state)
+    # Pods created before the ledger existed carry their balance in Pod.current_balance; open with it.
+    pod = session.get(models.Pod, owner_id) if owner_type == "pod" else None
+    if pod is not None and pod.current_balance:
+        opened_at = pod.created_at or datetime.utcnow()
+        session.add(
+            models.LedgerEntry(
+                owner_type=owner_type,
+                owner_id=owner_id,
+                entry_at=opened_at,
+                amount=pod.current_balance,
+                balance_after=pod.current_balance,
+                source="opening",
+            )
+        )
+        state.balance, state.last_entry_at = pod.current_balance, opened_at
+    # Flush so the next lookup in this transaction finds the row instead of opening a second one.
+    session.flush()
+    return state
+
+
+def post_entry(
+    session,
+    owner_type: str,
+    owner_id: int,
+    amount: float,
+    entry_at: datetime | None = None,
+    source: str = "adjustment",
+    run_id: int | None = None,
+    note: str | None = None,
+) -> models.LedgerEntry:
+    # Append-only: entries are never edited, only their materialized balance_after moves when an
+    # entry is backdated in front of them. The caller commits.
+    if owner_type not in OWNER_TYPES:
+        raise ValueError(f"Unknown ledger owner type {owner_type}")
+    entry_at = entry_at or datetime.utcnow()
+    _balance_row(session, owner_type, owner_id)
+    # Increment in SQL rather than read-modify-write in Python: the UPDATE takes the row (on SQLite,
+    # the database) write lock, so concurrent workers posting to one owner serialize here and each
+    # sees the balance the previous one left.
+    balance, last_entry_at = session.execute(
+        update(models.LedgerBalance)
+        .where(models.LedgerBalance.owner_type == owner_type, models.LedgerBalance.owner_id == owner_id)
+        .values(
+            balance=models.LedgerBalance.balance + amount,
+            last_entry_at=case(
+                (
+                    (models.LedgerBalance.last_entry_at == None)  # noqa: E711
+                    | (models.LedgerBalance.last_entry_at <= entry_at),
+                    entry_at,
+                ),
+                else_=models.LedgerBalance.last_entry_at,
+            ),
+        )
+        .returning(models.LedgerBalance.balance, models.LedgerBalance.last_entry_at)
+        .execution_options(synchronize_session="fetch")
+    ).one()
+    if last_entry_at == entry_at:
+        prior = balance - amount
+    else:
+        # Backdated: under the lock taken above, so the entries being shifted can't move underneath.
+        prior = balance_as_of(session, owner_type, owner_id, entry_at) or 0.0
+        session.execute(
+            update(models.LedgerEntry)
+            .where(
+                models.LedgerEntry.owner_type == owner_type,
+                models.LedgerEntry.owner_id == owner_id,
+                models.LedgerEntry.entry_at > entry_at,
+            )
+            .values(balance_after=models.LedgerEntry.balance_after + amount)
+            .execution_options(synchronize_session=False)
+        )
+
+    entry = models.LedgerEntry(
+        owner_type=owner_type,
+        owner_id=owner_id,
+        entry_at=entry_at,
+        amount=amount,
+        balance_after=prior + amount,
+        source=source,
+        run_id=run_id,
+        note=note,
+    )
+    session.add(entry)
+    if owner_type == "pod":
+        session.execute(
+            update(models.Pod)
+            .where(models.Pod.id == owner_id)
+            .values(current_balance=balance)
+            .execution_options(synchronize_session="evaluate")
+        )
+    # The app's sessions don't autoflush; later as-of reads in this transaction must see the entry.
+    session.flush()
+    return entry
+
+
+def current_balance(session, owner_type: str, owner_id: int) -> float:
+    state = session.get(models.LedgerBalance, (owner_type, owner_id))
+    if state is not None:
+        return state.balance
+    if owner_type == "pod":
+        pod = session.get(models.Pod, owner_id)
+        return pod.current_balance if pod else 0.0
+    return 0.0
+
+
+def balance_as_of(session, owner_type: str, owner_id: int, at: date | datetime) -> float | None:
+    # Served by ix_ledger_owner_asof: one index seek to the last entry at or before `at`.
+    return session.scalar(
+        select(models.LedgerEntry.balance_after)
+        .where(
+            models.LedgerEntry.owner_type == owner_type,
+            models.LedgerEntry.owner_id == owner_id,
+            models.LedgerEntry.entry_at <= _as_datetime(at),
+        )
+        .order_by(models.LedgerEntry.entry_at.desc(), models.LedgerEntry.id.desc())
+        .limit(1)
+    )
+
+
+def balances(session, owner_type: str, owner_ids: list[int], as_of: date | datetime | None = None) -> dict[int, float]:
+    # current_balance / balance_as_of for many owners in one query instead of one per owner.
+    if not owner_ids:
+        return {}
+    if as_of is None:
+        if owner_type == "pod":
+            # Pods with no ledger row yet still carry their balance on the pod, as in current_balance.
+            query = (
+                select(models.Pod.id, func.coalesce(models.LedgerBalance.balance, models.Pod.current_balance))
+                .outerjoin(
+                    models.LedgerBalance,
+                    (models.LedgerBalance.owner_type == owner_type) & (models.LedgerBalance.owner_id == models.Pod.id),
+                )
+                .where(models.Pod.id.in_(owner_ids))
+            )
+        else:
+            query = select(models.LedgerBalance.owner_id, models.LedgerBalance.balance).where(
+                models.LedgerBalance.owner_type == owner_type, models.LedgerBalance.owner_id.in_(owner_ids)
+            )
+        found = dict(session.execute(query).all())
+        return {owner_id: found.get(owner_id) or 0.0 for owner_id in owner_ids}
+
+    latest = (
+        select(
+            models.LedgerEntry.owner_id,
+            models.LedgerEntry.balance_after,
+            func.row_number()
+            .over(
+                partition_by=models.LedgerEntry.owner_id,
+                order_by=(models.LedgerEntry.entry_at.desc(), models.LedgerEntry.id.desc()),
+            )
+            .label("rank"),
+        )
+        .where(
+            models.LedgerEntry.owner_type == owner_type,
+            models.LedgerEntry.owner_id.in_(owner_ids),
+            models.LedgerEntry.entry_at <= _as_datetime(as_of),
+        )
+        .subquery()
+    )
+    found = dict(session.execute(select(latest.c.owner_id, latest.c.balance_after).where(latest.c.rank == 1)).all())
+    return {owner_id: found.get(owner_id) or 0.0 for owner_id in owner_ids}
+
+
+def record_snapshot(
+    session, source_type: str, source_id: int, balance: float, snapshot_at: datetime | None = None
+) -> models.BalanceSnapshot:
+    # A snapshot is an observed absolute balance; the ledger gets the difference as a reconciliation entry.
+    snapshot_at = snapshot_at or datetime.utcnow()
+    snapshot = models.BalanceSnapshot(source_type=source_type, source_id=source_id, balance=balance, snapshot_at=snapshot_at)
+    session.add(snapshot)
+    known = balance_as_of(session, source_type, source_id, snapshot_at)
+    delta = balance - (known or 0.0)
+    if delta or known is None:
+        post_entry(session, source_type, source_id, delta, entry_at=snapshot_at, source="snapshot")
+    return snapshot
+
+
+def post_allocations(session, run: models.Run, action_rows: list, at: datetime | None = None) -> list[models.LedgerEntry]:
+    entries = []
+    for _, status, _, payload in action_rows:
+        pod_id, allocated = payload.get("pod_id"), payload.get("allocated") or 0
+        if status == "success" and pod_id is not None and allocated > 0:
+            entries.append(
+                post_entry(session, "pod", int(pod_id), allocated, entry_at=at, source="allocation", run_id=run.id)
+            )
+    return entries
+
+
+class BalanceSeries:
+    # Snapshot balances as sorted arrays for backtests. The balance in effect at t is the newest
+    # snapshot at or before t (a bare date means end of that day), the same rule run_rule applies
+    # to "now".
+    def __init__(self, times: np.ndarray, values: np.ndarray):
+        self.times = times
+        self.values = values
+
+    @classmethod
+    def load(cls, session, source_type: str | None = None, source_id: int | None = None) -> "BalanceSeries":
+        query = select(models.BalanceSnapshot.snapshot_at, models.BalanceSnapshot.balance).order_by(
+            models.BalanceSnapshot.snapshot_at, models.BalanceSnapshot.id
+        )
+        if source_type is not None:
+            query = query.where(models.BalanceSnapshot.source_type == source_type)
+        if source_id is not None:
+            query = query.where(models.BalanceSnapshot.source_id == source_id)
+        rows = session.execute(query).all()
+        times = np.array([r[0] for r in rows], dtype="datetime64[us]")
+        values = np.array([r[1] for r in rows], dtype=float)
+        return cls(times, values)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def at_many(self, whens) -> list[float | None]:
+        if not len(whens):
+            return []
+        points = np.array([_as_datetime(w) for w in whens], dtype="datetime64[us]")
+        idx = np.searchsorted(self.times, points, side="right") - 1
+        found = self.values[np.maximum(idx, 0)] if len(self.values) else np.zeros(len(idx))
+        return [float(v) if i >= 0 else None for i, v in zip(idx, found)]
+
+    def at(self, when: date | datetime) -> float | None:
+        return self.at_many([when])[0]
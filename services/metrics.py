@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import os
+import threading
+from time import perf_counter
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HELP = {
+    "flowledger_trigger_match_seconds": "Time spent matching a rule trigger against an event",
+    "flowledger_condition_check_seconds": "Time spent evaluating one rule condition",
+    "flowledger_action_execution_seconds": "Time spent executing one rule action",
+    "flowledger_persist_seconds": "Time spent persisting a run and its action results",
+    "flowledger_runs_total": "Rule runs by final status",
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                return lower + (bound - lower) * ((rank - seen) / n)
+            seen += n
+            lower = bound
+        return self.buckets[-1]
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: tuple):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._observe(self.name, self.labels, perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+        self.counters: dict[tuple[str, tuple], int] = {}
+
+    def timer(self, name: str, **labels):
+        # Disabled path is one attribute check and a shared no-op context manager.
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, amount: int = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def _observe(self, name: str, labels: tuple, value: float) -> None:
+        key = (name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def histogram_rows(self) -> list[dict]:
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+        rows = []
+        for (name, labels), hist in histograms:
+            p50, p95 = hist.quantile(0.5), hist.quantile(0.95)
+            rows.append(
+                {
+                    "metric": name,
+                    **dict(labels),
+                    "count": hist.count,
+                    "avg_ms": round(hist.sum / hist.count * 1000, 3) if hist.count else None,
+                    "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+                }
+            )
+        return rows
+
+    def counter_rows(self) -> list[dict]:
+        with self._lock:
+            counters = sorted(self.counters.items())
+        return [{"metric": name, **dict(labels), "value": value} for (name, labels), value in counters]
+
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        typed: set[str] = set()
+
+        def header(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        for (name, labels), hist in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {hist.count}")
+            lines.append(f"{name}_sum{_labels(labels)} {hist.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _labels(labels: tuple, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry(enabled=os.environ.get("FLOWLEDGER_METRICS", "").lower() in {"1", "true", "yes"})
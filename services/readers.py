@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import io
+import re
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pandas as pd
+
+# Columns every reader tries to produce; ingest enforces which are required.
+WANTED_COLUMNS = ["date", "description", "amount", "account", "category", "merchant", "currency"]
+OFX_CHUNK = 64 * 1024
+
+READERS: dict[str, Callable] = {}
+EXTENSIONS: dict[str, str] = {}
+MAGIC: list[tuple[bytes, str]] = []
+
+
+def register_reader(fmt: str, extensions: list[str], magic: list[bytes] | None = None):
+    def decorator(fn):
+        READERS[fmt] = fn
+        for ext in extensions:
+            EXTENSIONS[ext] = fmt
+        for prefix in magic or []:
+            MAGIC.append((prefix, fmt))
+        return fn
+
+    return decorator
+
+
+def _name_of(source) -> str | None:
+    if isinstance(source, (str, Path)):
+        return str(source)
+    return getattr(source, "name", None)
+
+
+def _peek(source, size: int = 512) -> bytes:
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return f.read(size)
+    pos = source.tell()
+    head = source.read(size)
+    source.seek(pos)
+    return head.encode() if isinstance(head, str) else head
+
+
+def detect_format(source) -> str:
+    name = _name_of(source)
+    if name:
+        fmt = EXTENSIONS.get(Path(name).suffix.lower().lstrip("."))
+        if fmt:
+            return fmt
+    head = _peek(source).lstrip()
+    for prefix, fmt in MAGIC:
+        if head.startswith(prefix) or prefix in head[:256]:
+            return fmt
+    return "csv"
+
+
+def _project(names: list[str], wanted: list[str]) -> list[str]:
+    lookup = {n.lower().strip(): n for n in names}
+    return [lookup[w] for w in wanted if w in lookup]
+
+
+@register_reader("csv", ["csv", "txt"])
+def read_csv(source, columns: list[str] = WANTED_COLUMNS) -> pd.DataFrame:
+    return pd.read_csv(source, usecols=lambda c: c.lower().strip() in columns)
+
+
+@register_reader("parquet", ["parquet", "pq"], magic=[b"PAR1"])
+def read_parquet(source, columns: list[str] = WANTED_COLUMNS) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(source)
+    # Column projection: only the normalized columns are decoded, whatever else the dump carries.
+    return parquet.read(columns=_project(parquet.schema_arrow.names, columns)).to_pandas()
+
+
+@register_reader("arrow", ["arrow", "feather", "ipc"], magic=[b"ARROW1"])
+def read_arrow(source, columns: list[str] = WANTED_COLUMNS) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    if isinstance(source, (str, Path)):
+        source = pa.memory_map(str(source), "r")
+    try:
+        table = ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        table = ipc.open_stream(source).read_all()
+    return table.select(_project(table.column_names, columns)).to_pandas()
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _text_chunks(source) -> Iterator[str]:
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            yield from _text_chunks(f)
+        return
+    while True:
+        chunk = source.read(OFX_CHUNK)
+        if not chunk:
+            return
+        yield chunk.decode("latin-1") if isinstance(chunk, bytes) else chunk
+
+
+def iter_ofx_tags(source) -> Iterator[tuple[bool, str, str]]:
+    # Streams (is_closing, TAG, value) tokens; works for both SGML OFX 1.x (unclosed leaf tags)
+    # and XML OFX 2.x without holding the whole statement in memory.
+    buffer = ""
+    for chunk in _text_chunks(source):
+        buffer += chunk
+        cut = buffer.rfind("<")
+        if cut <= 0:
+            continue
+        for match in _OFX_TAG.finditer(buffer, 0, cut):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:]
+    for match in _OFX_TAG.finditer(buffer):
+        yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+
+def iter_ofx_transactions(source) -> Iterator[dict]:
+    currency, account, current = None, None, None
+    for closing, tag, value in iter_ofx_tags(source):
+        if tag == "STMTTRN":
+            if closing and current is not None:
+                yield {
+                    "date": pd.to_datetime(current["DTPOSTED"][:8], format="%Y%m%d").date(),
+                    "description": current.get("NAME") or current.get("MEMO") or current.get("TRNTYPE", ""),
+                    "amount": float(current["TRNAMT"]),
+                    "account": account,
+                    "category": None,
+                    "merchant": current.get("NAME"),
+                    "currency": current.get("CURSYM") or currency,
+                }
+                current = None
+            elif not closing:
+                current = {}
+        elif closing:
+            continue
+        elif current is not None and value:
+            current[tag] = value
+        elif tag == "CURDEF":
+            currency = value
+        elif tag == "ACCTID":
+            account = value
+
+
+@register_reader("ofx", ["ofx", "qfx"], magic=[b"OFXHEADER", b"<OFX>"])
+def read_ofx(source, columns: list[str] = WANTED_COLUMNS) -> pd.DataFrame:
+    df = pd.DataFrame(iter_ofx_transactions(source), columns=WANTED_COLUMNS)
+    return df[[c for c in WANTED_COLUMNS if c in columns]]
+
+
+def read_transactions_frame(source, fmt: str | None = None, columns: list[str] = WANTED_COLUMNS) -> pd.DataFrame:
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    fmt = fmt or detect_format(source)
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+    return READERS[fmt](source, columns)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from datetime import date
+
+from sqlalchemy import select
+
+from db import models
+
+
+@dataclass(slots=True, frozen=True)
+class TxRecord:
+    # Read-only stand-in for models.Transaction in evaluation loops: no identity map entry, no
+    # instrumented attributes, no per-instance __dict__. The engine only needs these columns.
+    id: int
+    date: date
+    description: str
+    amount: float
+    currency: str | None = None
+
+
+TX_RECORD_COLUMNS = [f.name for f in fields(TxRecord)]
+
+
+def _tx_select():
+    return select(*[getattr(models.Transaction, c) for c in TX_RECORD_COLUMNS])
+
+
+def load_tx_records(
+    session,
+    since: date | None = None,
+    ids: list[int] | None = None,
+    where=None,
+    limit: int | None = None,
+    newest_first: bool = False,
+) -> list[TxRecord]:
+    order = (models.Transaction.date, models.Transaction.id)
+    query = _tx_select().order_by(*(c.desc() for c in order) if newest_first else order)
+    if since is not None:
+        query = query.where(models.Transaction.date >= since)
+    if ids is not None:
+        query = query.where(models.Transaction.id.in_(ids))
+    if where is not None:
+        query = query.where(where)
+    if limit is not None:
+        query = query.limit(limit)
+    return [TxRecord(*row) for row in session.execute(query)]
+
+
+def get_tx_record(session, tx_id: int) -> TxRecord | None:
+    row = session.execute(_tx_select().where(models.Transaction.id == tx_id)).first()
+    return TxRecord(*row) if row else None
+
+
+def as_tx_record(tx) -> TxRecord:
+    if isinstance(tx, TxRecord):
+        return tx
+    return TxRecord(*(getattr(tx, c) for c in TX_RECORD_COLUMNS))
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import takewhile
+from pathlib import Path
+
+from sqlalchemy import delete, func, select, text, update
+
+from db import models
+from services.exports import write_parquet
+
+ARCHIVE_DIR = Path(os.environ.get("FLOWLEDGER_ARCHIVE_DIR", Path("data") / "archive"))
+DETAIL_DAYS = 90
+VACUUM_PAGES = 1_000
+STATE_NAME = "runs"
+# Compacted runs keep this trace so pages and exports can tell them from runs that recorded nothing.
+COMPACTED_TRACE = {"compacted": True}
+
+# Raw rows as archived: JSON columns are stored as text so the files restore without loss.
+ARCHIVE_COLUMNS = {
+    "runs": {
+        "id": "int64",
+        "rule_id": "int64",
+        "event_key": "string",
+        "status": "string",
+        "created_at": "timestamp",
+        "trace": "string",
+    },
+    "action_results": {
+        "id": "int64",
+        "run_id": "int64",
+        "action_index": "int64",
+        "status": "string",
+        "message": "string",
+        "payload": "string",
+    },
+    "error_logs": {
+        "id": "int64",
+        "run_id": "int64",
+        "message": "string",
+        "details": "string",
+        "created_at": "timestamp",
+    },
+}
+
+
+@dataclass(slots=True, frozen=True)
+class RetentionPolicy:
+    # Runs older than detail_days lose their trace, action results and error logs. The run row itself
+    # stays: (rule_id, event_key) is what makes redelivered events and re-simulations idempotent, and
+    # ledger entries reference it.
+    detail_days: int = DETAIL_DAYS
+    archive: bool = True
+    archive_dir: Path = ARCHIVE_DIR
+    compression: str = "zstd"
+    batch_size: int = 5_000
+    # Pages handed back to the OS per pass; None skips vacuuming.
+    vacuum_pages: int | None = VACUUM_PAGES
+
+
+@dataclass(slots=True)
+class RetentionReport:
+    runs_compacted: int = 0
+    action_results_deleted: int = 0
+    error_logs_deleted: int = 0
+    summary_rows: int = 0
+    archived_files: list[str] = field(default_factory=list)
+    pages_freed: int = 0
+
+
+def _state(session) -> models.RetentionState:
+    state = session.get(models.RetentionState, STATE_NAME)
+    if state is None:
+        state = models.RetentionState(name=STATE_NAME, last_id=0)
+        session.add(state)
+    return state
+
+
+def _jsonable(rows: list, json_fields: tuple[str, ...]) -> list[dict]:
+    out = []
+    for row in rows:
+        item = dict(row._mapping)
+        for name in json_fields:
+            item[name] = None if item[name] is None else json.dumps(item[name], sort_keys=True, default=str)
+        out.append(item)
+    return out
+
+
+def _archive(policy: RetentionPolicy, table: str, name: str, rows: list[dict]) -> str | None:
+    # Named after the id range it covers, so a batch retried after a failed commit overwrites its own file.
+    if not rows:
+        return None
+    path = policy.archive_dir / table / f"{table}-{name}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as out:
+        write_parquet(rows, ARCHIVE_COLUMNS[table], out, policy.batch_size, compression=policy.compression)
+    return str(path)
+
+
+def _roll_up(session, runs: list, actions: list, errors: list) -> int:
+    totals: dict[tuple, dict] = {}
+    by_run = {}
+    for run in runs:
+        key = (run.rule_id, run.created_at.date(), run.status)
+        by_run[run.id] = key
+        bucket = totals.setdefault(key, {"runs": 0, "actions": 0, "failed_actions": 0, "allocated": 0.0, "errors": 0})
+        bucket["runs"] += 1
+    for action in actions:
+        bucket = totals[by_run[action.run_id]]
+        bucket["actions"] += 1
+        if action.status == "failed":
+            bucket["failed_actions"] += 1
+        else:
+            bucket["allocated"] += (action.payload or {}).get("allocated") or 0.0
+    for error in errors:
+        totals[by_run[error.run_id]]["errors"] += 1
+
+    rule_ids = {key[0] for key in totals}
+    days = {key[1] for key in totals}
+    existing = {
+        (s.rule_id, s.day, s.status): s
+        for s in session.scalars(
+            select(models.RunDailySummary).where(
+                models.RunDailySummary.rule_id.in_(rule_ids), models.RunDailySummary.day.in_(days)
+            )
+        )
+    }
+    for (rule_id, day, status), bucket in totals.items():
+        summary = existing.get((rule_id, day, status))
+        if summary is None:
+            session.add(models.RunDailySummary(rule_id=rule_id, day=day, status=status, **bucket))
+            continue
+        for name, value in bucket.items():
+            setattr(summary, name, getattr(summary, name) + value)
+    return len(totals)
+
+
+def _compact_batch(session, policy: RetentionPolicy, state: models.RetentionState, cutoff: datetime, report) -> bool:
+    runs = session.execute(
+        select(
+            models.Run.id, models.Run.rule_id, models.Run.event_key, models.Run.status, models.Run.created_at, models.Run.trace
+        )
+        .where(models.Run.id > state.last_id)
+        .order_by(models.Run.id)
+        .limit(policy.batch_size)
+    ).all()
+    # Only the prefix older than the cutoff: runs are appended in time order, so the watermark stays exact.
+    old = list(takewhile(lambda run: run.created_at < cutoff, runs))
+    if not old:
+        return False
+
+    run_ids = [run.id for run in old]
+    actions = session.execute(
+        select(
+            models.ActionResult.id,
+            models.ActionResult.run_id,
+            models.ActionResult.action_index,
+            models.ActionResult.status,
+            models.ActionResult.message,
+            models.ActionResult.payload,
+        )
+        .where(models.ActionResult.run_id.in_(run_ids))
+        .order_by(models.ActionResult.id)
+    ).all()
+    errors = session.execute(
+        select(
+            models.ErrorLog.id, models.ErrorLog.run_id, models.ErrorLog.message, models.ErrorLog.details, models.ErrorLog.created_at
+        )
+        .where(models.ErrorLog.run_id.in_(run_ids))
+        .order_by(models.ErrorLog.id)
+    ).all()
+
+    if policy.archive:
+        span = f"{run_ids[0]}-{run_ids[-1]}"
+        for table, rows, json_fields in (
+            ("runs", old, ("trace",)),
+            ("action_results", actions, ("payload",)),
+            ("error_logs", errors, ("details",)),
+        ):
+            path = _archive(policy, table, span, _jsonable(rows, json_fields))
+            if path:
+                report.archived_files.append(path)
+
+    report.summary_rows += _roll_up(session, old, actions, errors)
+    session.execute(delete(models.ActionResult).where(models.ActionResult.run_id.in_(run_ids)))
+    session.execute(delete(models.ErrorLog).where(models.ErrorLog.run_id.in_(run_ids)))
+    session.execute(
+        update(models.Run).where(models.Run.id.in_(run_ids)).values(trace=COMPACTED_TRACE),
+        execution_options={"synchronize_session": False},
+    )
+    state.last_id = run_ids[-1]
+    state.updated_at = datetime.utcnow()
+    session.commit()
+
+    report.runs_compacted += len(old)
+    report.action_results_deleted += len(actions)
+    report.error_logs_deleted += len(errors)
+    return len(old) == len(runs)
+
+
+def _purge_orphan_errors(session, policy: RetentionPolicy, cutoff: datetime, report) -> None:
+    # Error logs not tied to a run have no summary to roll into; they are archived and dropped.
+    errors = session.execute(
+        select(
+            models.ErrorLog.id, models.ErrorLog.run_id, models.ErrorLog.message, models.ErrorLog.details, models.ErrorLog.created_at
+        )
+        .where(models.ErrorLog.run_id.is_(None), models.ErrorLog.created_at < cutoff)
+        .order_by(models.ErrorLog.id)
+    ).all()
+    if not errors:
+        return
+    if policy.archive:
+        path = _archive(policy, "error_logs", f"orphans-{errors[0].id}-{errors[-1].id}", _jsonable(errors, ("details",)))
+        report.archived_files.append(path)
+    session.execute(delete(models.ErrorLog).where(models.ErrorLog.id.in_([e.id for e in errors])))
+    session.commit()
+    report.error_logs_deleted += len(errors)
+
+
+def enable_incremental_vacuum(session) -> bool:
+    # auto_vacuum only changes on an empty database or through a full VACUUM, so an existing file is
+    # rebuilt once; after that, incremental_vacuum releases free pages without rewriting the file.
+    if session.get_bind().dialect.name != "sqlite":
+        return False
+    if session.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+        return True
+    session.commit()
+    session.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    session.execute(text("VACUUM"))
+    return session.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+
+def incremental_vacuum(session, pages: int) -> int:
+    # On PostgreSQL autovacuum already reclaims dead tuples; nothing to do here.
+    if not enable_incremental_vacuum(session):
+        return 0
+    before = session.execute(text("PRAGMA freelist_count")).scalar()
+    # pysqlite steps a statement without result columns only once, which frees a single page;
+    # executescript runs it to completion.
+    session.connection().connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    after = session.execute(text("PRAGMA freelist_count")).scalar()
+    session.commit()
+    return before - after
+
+
+def apply_retention(
+    session, policy: RetentionPolicy | None = None, now: datetime | None = None, progress=None
+) -> RetentionReport:
+    policy = policy or RetentionPolicy()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=policy.detail_days)
+    report = RetentionReport()
+    state = _state(session)
+    pending = session.scalar(
+        select(func.count()).select_from(models.Run).where(models.Run.id > state.last_id, models.Run.created_at < cutoff)
+    )
+    # One transaction per batch: archive file, roll-up, deletes and the watermark move together.
+    while _compact_batch(session, policy, state, cutoff, report):
+        if progress and pending:
+            progress(min(report.runs_compacted / pending, 1.0), f"Compacted {report.runs_compacted}/{pending} runs")
+    session.commit()
+    _purge_orphan_errors(session, policy, cutoff, report)
+    if policy.vacuum_pages:
+        report.pages_freed = incremental_vacuum(session, policy.vacuum_pages)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from db.engine import init_db
+    from db.tenancy import open_session
+
+    parser = argparse.ArgumentParser(description="Compact, summarize and archive old rule runs")
+    parser.add_argument("--detail-days", type=int, default=DETAIL_DAYS)
+    parser.add_argument("--archive-dir", type=Path, default=None, help="default: the tenant's archive directory")
+    parser.add_argument("--no-archive", action="store_true", help="drop old detail without writing Parquet")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES, help="0 skips vacuuming")
+    parser.add_argument("--tenant", default=None, help="tenant id (default: the single-household database)")
+    args = parser.parse_args(argv)
+
+    if args.tenant is None:
+        init_db()
+    with open_session(args.tenant) as session:
+        policy = RetentionPolicy(
+            detail_days=args.detail_days,
+            archive=not args.no_archive,
+            archive_dir=args.archive_dir or session.info.get("archive_dir", ARCHIVE_DIR),
+            vacuum_pages=args.vacuum_pages or None,
+        )
+        report = apply_retention(session, policy)
+    print(
+        f"Compacted {report.runs_compacted} runs, deleted {report.action_results_deleted} action results and "
+        f"{report.error_logs_deleted} error logs, freed {report.pages_freed} pages",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from db import models
+from services.ledger import current_balance
+from services.metrics import registry as metrics
+
+# Factories take one JSON config (a trigger_config, condition or action dict) and return a closure.
+# They parse and type-check the config up front and raise on bad input, so the same factories
+# both validate a rule at save time and compile it for evaluation.
+TRIGGERS: dict[str, Callable] = {}
+CONDITIONS: dict[str, Callable] = {}
+ACTIONS: dict[str, Callable] = {}
+
+_CACHE: dict[int, "CompiledRule"] = {}
+# Instance-dict keys holding a rule's content hash and its compiled form, so the per-event lookup
+# is a dict read instead of re-serializing and hashing the definition.
+_DIGEST_KEY = "_compiled_digest"
+_COMPILED_KEY = "_compiled_rule"
+# Bumped by invalidate(): compiled forms held by instances from an older generation are re-checked.
+_generation = 0
+_HASHED_FIELDS = ("trigger_type", "trigger_config", "conditions", "actions")
+
+
+class RuleValidationError(ValueError):
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+@dataclass(slots=True)
+class EvalContext:
+    tx: Any
+    amount: float | None
+    latest_balance: float | None
+    now: datetime
+
+
+@dataclass(slots=True)
+class ActionOutcome:
+    status: str
+    message: str
+    payload: dict
+    allocated: float = 0.0
+
+
+@dataclass(slots=True)
+class CompiledRule:
+    rule_id: int | None
+    content_hash: str
+    trigger: Callable[[dict, Any], bool]
+    conditions: list[tuple[dict, Callable[[EvalContext], tuple[bool, str]]]]
+    actions: list[tuple[dict, Callable[[Any, EvalContext, float], ActionOutcome]]]
+
+
+def _registrar(table: dict[str, Callable]):
+    def register(kind: str):
+        def decorator(factory):
+            table[kind] = factory
+            return factory
+
+        return decorator
+
+    return register
+
+
+register_trigger = _registrar(TRIGGERS)
+register_condition = _registrar(CONDITIONS)
+register_action = _registrar(ACTIONS)
+
+
+@register_trigger("manual")
+def _manual_trigger(config: dict):
+    return lambda event, tx: event.get("type") == "manual"
+
+
+@register_trigger("transaction")
+def _transaction_trigger(config: dict):
+    contains = (config.get("description_contains") or "").lower()
+
+    def match(event, tx):
+        if event.get("type") != "transaction" or not tx:
+            return False
+        return contains in tx.description.lower() if contains else True
+
+    return match
+
+
+@register_trigger("schedule")
+def _schedule_trigger(config: dict):
+    return lambda event, tx: event.get("type") == "schedule"
+
+
+def _amount_condition(config: dict, op: str, compare):
+    raw = config["value"]
+    threshold = float(raw)
+
+    def check(ctx: EvalContext):
+        ok = ctx.tx is not None and compare(ctx.amount, threshold)
+        return ok, f"amount {ctx.amount if ctx.tx else 'n/a'} {op} {raw}"
+
+    return check
+
+
+@register_condition("amount_gte")
+def _amount_gte(config: dict):
+    return _amount_condition(config, ">=", lambda amount, threshold: amount >= threshold)
+
+
+@register_condition("amount_lte")
+def _amount_lte(config: dict):
+    return _amount_condition(config, "<=", lambda amount, threshold: amount <= threshold)
+
+
+@register_condition("day_of_month_eq")
+def _day_of_month_eq(config: dict):
+    raw = config["value"]
+    day = int(raw)
+
+    def check(ctx: EvalContext):
+        return ctx.now.day == day, f"day {ctx.now.day} == {raw}"
+
+    return check
+
+
+@register_condition("balance_gte")
+def _balance_gte(config: dict):
+    raw = config["value"]
+    threshold = float(raw)
+
+    def check(ctx: EvalContext):
+        ok = ctx.latest_balance is not None and ctx.latest_balance >= threshold
+        return ok, f"balance {ctx.latest_balance} >= {raw}"
+
+    return check
+
+
+@register_action("allocate_fixed")
+def _allocate_fixed(config: dict):
+    amount = float(config["amount"])
+    pod_id = config["pod_id"]
+    up_to = bool(config.get("up_to_available", False))
+
+    def run(session, ctx: EvalContext, allocated: float):
+        available = (ctx.latest_balance or 0.0) - allocated
+        actual = min(amount, max(0.0, available)) if up_to else amount
+        if up_to and actual <= 0:
+            return ActionOutcome("failed", "No available funds", {})
+        return ActionOutcome("success", f"Allocated {actual} to pod {pod_id}", {"allocated": actual, "pod_id": pod_id}, actual)
+
+    return run
+
+
+@register_action("allocate_percent")
+def _allocate_percent(config: dict):
+    raw = config["percent"]
+    fraction = float(raw) / 100
+    pod_id = config.get("pod_id")
+
+    def run(session, ctx: EvalContext, allocated: float):
+        base = abs(ctx.amount) if ctx.tx else 0.0
+        amount = round(base * fraction, 2)
+        leftover = round(base - amount, 2)
+        return ActionOutcome(
+            "success",
+            f"Allocated {amount} ({raw}%), leftover {leftover}",
+            {"allocated": amount, "leftover": leftover, "pod_id": pod_id},
+            amount,
+        )
+
+    return run
+
+
+@register_action("top_up_pod")
+def _top_up_pod(config: dict):
+    pod_id = int(config["pod_id"])
+    target = float(config["target"])
+
+    def run(session, ctx: EvalContext, allocated: float):
+        need = max(target - current_balance(session, "pod", pod_id), 0)
+        return ActionOutcome("success", f"Top up suggestion {need}", {"allocated": need, "pod_id": config.get("pod_id")}, need)
+
+    return run
+
+
+@register_action("liability_suggestion")
+def _liability_suggestion(config: dict):
+    payload = {"task_title": config.get("title", "Pay liability"), "task_note": config.get("note")}
+
+    def run(session, ctx: EvalContext, allocated: float):
+        return ActionOutcome("success", "Task suggested", dict(payload))
+
+    return run
+
+
+def _describe(exc: Exception) -> str:
+    if isinstance(exc, KeyError):
+        return f"missing '{exc.args[0]}'"
+    return str(exc)
+
+
+def _never(event, tx) -> bool:
+    return False
+
+
+def compile_condition(condition: dict):
+    factory = CONDITIONS.get(condition.get("type")) if isinstance(condition, dict) else None
+    if factory is None:
+        return lambda ctx: (False, "unknown condition")
+    try:
+        return factory(condition)
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        message = f"invalid condition: {_describe(exc)}"
+        return lambda ctx: (False, message)
+
+
+def compile_action(action: dict):
+    kind = action.get("type") if isinstance(action, dict) else None
+    factory = ACTIONS.get(kind)
+    if factory is None:
+        message = f"Unsupported action {kind}"
+    else:
+        try:
+            return factory(action)
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            message = f"Invalid action {kind}: {_describe(exc)}"
+    return lambda session, ctx, allocated: ActionOutcome("failed", message, {})
+
+
+def content_hash(rule: models.Rule) -> str:
+    body = json.dumps(
+        [rule.trigger_type, rule.trigger_config or {}, rule.conditions or [], rule.actions or []],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+def compile_rule(rule: models.Rule, digest: str | None = None) -> CompiledRule:
+    # Rules saved before validation existed can still hold unknown or malformed entries; those
+    # compile to closures that fail the same way the old interpreter did instead of raising.
+    trigger_factory = TRIGGERS.get(rule.trigger_type)
+    try:
+        trigger = trigger_factory(rule.trigger_config or {}) if trigger_factory else _never
+    except (AttributeError, KeyError, TypeError, ValueError):
+        trigger = _never
+    metrics.inc("flowledger_rule_compiles_total", rule_id=rule.id)
+    return CompiledRule(
+        rule_id=rule.id,
+        content_hash=digest or content_hash(rule),
+        trigger=trigger,
+        conditions=[(c, compile_condition(c)) for c in rule.conditions or []],
+        actions=[(a, compile_action(a)) for a in rule.actions or []],
+    )
+
+
+def _cache_for(session) -> dict[int, CompiledRule]:
+    # Rule ids are only unique within one database, so tenant sessions bring their own cache.
+    return session.info.get("rule_cache", _CACHE) if session is not None else _CACHE
+
+
+def _rule_digest(rule: models.Rule) -> str:
+    digest = rule.__dict__.get(_DIGEST_KEY)
+    if digest is None:
+        digest = rule.__dict__[_DIGEST_KEY] = content_hash(rule)
+    return digest
+
+
+def _forget_compiled(target, *args) -> None:
+    target.__dict__.pop(_DIGEST_KEY, None)
+    target.__dict__.pop(_COMPILED_KEY, None)
+
+
+# Dropped whenever the definition can change: an attribute assignment, or a reload of the row
+# (a refresh after expiry picks up edits made by other sessions or processes).
+for _field in _HASHED_FIELDS:
+    event.listen(getattr(models.Rule, _field), "set", _forget_compiled)
+for _name in ("refresh", "expire"):
+    event.listen(models.Rule, _name, _forget_compiled)
+
+
+def compiled_rule(rule: models.Rule) -> CompiledRule:
+    held = rule.__dict__.get(_COMPILED_KEY)
+    if held is not None and held[0] == _generation:
+        return held[1]
+    # Keyed by id, checked against the content hash so edits made outside the UI are picked up too.
+    cache = _cache_for(object_session(rule))
+    digest = _rule_digest(rule)
+    cached = cache.get(rule.id) if rule.id is not None else None
+    if cached is None or cached.content_hash != digest:
+        cached = compile_rule(rule, digest)
+        if rule.id is not None:
+            cache[rule.id] = cached
+    rule.__dict__[_COMPILED_KEY] = (_generation, cached)
+    return cached
+
+
+def invalidate(rule_id: int | None = None, session=None) -> None:
+    global _generation
+    cache = _cache_for(session)
+    if rule_id is None:
+        cache.clear()
+    else:
+        cache.pop(rule_id, None)
+    _generation += 1
+
+
+def _check_entries(label: str, entries, registry: dict[str, Callable]) -> list[str]:
+    if not isinstance(entries, list):
+        return [f"{label}s must be a JSON list"]
+    errors = []
+    for i, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            errors.append(f"{label} {i}: must be a JSON object")
+            continue
+        kind = entry.get("type")
+        factory = registry.get(kind)
+        if factory is None:
+            errors.append(f"{label} {i}: unknown type {kind!r} (known: {', '.join(sorted(registry))})")
+            continue
+        try:
+            factory(entry)
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            errors.append(f"{label} {i} ({kind}): {_describe(exc)}")
+    return errors
+
+
+def validate_rule(trigger_type: str, trigger_config, conditions, actions) -> list[str]:
+    errors = []
+    if trigger_type not in TRIGGERS:
+        errors.append(f"Unknown trigger type {trigger_type!r} (known: {', '.join(sorted(TRIGGERS))})")
+    if not isinstance(trigger_config, dict):
+        errors.append("Trigger config must be a JSON object")
+    elif trigger_type in TRIGGERS:
+        try:
+            TRIGGERS[trigger_type](trigger_config)
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            errors.append(f"Trigger config: {_describe(exc)}")
+        if trigger_type == "schedule" and "freq" in trigger_config:
+            from services.scheduler import INTERVALS, MONTHLY
+
+            if trigger_config["freq"] not in {*INTERVALS, MONTHLY}:
+                errors.append(f"Trigger config: unknown freq {trigger_config['freq']!r}")
+    errors += _check_entries("Condition", conditions, CONDITIONS)
+    errors += _check_entries("Action", actions, ACTIONS)
+    return errors
+
+
+def ensure_valid(trigger_type: str, trigger_config, conditions, actions) -> None:
+    errors = validate_rule(trigger_type, trigger_config, conditions, actions)
+    if errors:
+        raise RuleValidationError(errors)
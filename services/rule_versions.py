@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from db import models
+from schemas.domain import RuleDiffReport
+from services.fx import load_fx_table, tx_amount_in_base
+from services.ledger import BalanceSeries
+from services.records import load_tx_records
+from services.rule_compiler import EvalContext, compile_rule, content_hash, ensure_valid
+from services.rules_engine import AllocationLedger, _evaluate_rule
+from services.search import match_clause
+
+DEFINITION_FIELDS = ("name", "priority", "trigger_type", "trigger_config", "conditions", "actions")
+OUTCOME_FIELDS = ("status", "allocated", "tasks")
+PROGRESS_EVERY = 100
+
+
+def record_version(session, rule: models.Rule) -> models.RuleVersion | None:
+    # Appends the rule's current definition unless it matches the newest stored version. Caller commits.
+    digest = content_hash(rule)
+    latest = session.scalar(
+        select(models.RuleVersion).where(models.RuleVersion.rule_id == rule.id).order_by(models.RuleVersion.version.desc()).limit(1)
+    )
+    if latest is not None and latest.content_hash == digest:
+        return None
+    version = models.RuleVersion(
+        rule_id=rule.id,
+        version=latest.version + 1 if latest else 1,
+        content_hash=digest,
+        **{field: getattr(rule, field) for field in DEFINITION_FIELDS},
+    )
+    session.add(version)
+    return version
+
+
+def list_versions(session, rule_id: int) -> list[models.RuleVersion]:
+    return session.scalars(
+        select(models.RuleVersion).where(models.RuleVersion.rule_id == rule_id).order_by(models.RuleVersion.version.desc())
+    ).all()
+
+
+def _definition(source) -> models.Rule:
+    # A transient Rule (never added to the session) so diffs cannot persist anything or hit the
+    # compiled-rule cache entry of the live rule.
+    # Drafts are checked like a save would check them; stored versions compile however they were saved.
+    if isinstance(source, dict):
+        values = {field: source.get(field) for field in DEFINITION_FIELDS}
+        ensure_valid(values["trigger_type"], values["trigger_config"] or {}, values["conditions"] or [], values["actions"] or [])
+    else:
+        values = {field: getattr(source, field) for field in DEFINITION_FIELDS}
+    values["trigger_config"] = values.get("trigger_config") or {}
+    values["conditions"] = values.get("conditions") or []
+    values["actions"] = values.get("actions") or []
+    return models.Rule(**values)
+
+
+def _label(source) -> str:
+    if isinstance(source, models.RuleVersion):
+        return f"v{source.version}"
+    if isinstance(source, models.Rule) and source.id is not None:
+        return "current"
+    return "draft"
+
+
+def _window(session, rules: list[models.Rule], since):
+    # One read of the transactions either version could fire on: the union of their index matches.
+    clauses = []
+    for rule in rules:
+        if rule.trigger_type != "transaction" or not isinstance(rule.trigger_config, dict):
+            continue  # a malformed trigger config compiles to a trigger that never fires
+        contains = rule.trigger_config.get("description_contains")
+        if not contains:
+            return load_tx_records(session, since=since)
+        clauses.append(match_clause(session, contains, ("description",)))
+    return load_tx_records(session, since=since, where=or_(*clauses)) if clauses else []
+
+
+def _outcome(status: str, action_rows: list) -> dict:
+    allocated: dict[str, float] = {}
+    tasks = []
+    for _, a_status, _, payload in action_rows:
+        if a_status != "success":
+            continue
+        if payload.get("allocated"):
+            pod = str(payload.get("pod_id"))
+            allocated[pod] = round(allocated.get(pod, 0.0) + payload["allocated"], 2)
+        if payload.get("task_title"):
+            tasks.append(payload["task_title"])
+    return {"status": status, "allocated": allocated, "tasks": tasks}
+
+
+def diff_rule_versions(session, old, new, days: int = 90, progress=None) -> RuleDiffReport:
+    # Backtests both definitions in a single pass: the transaction window, as-of balances, base-currency
+    # amounts and (when the triggers are identical) trigger matches are computed once and shared.
+    old_rule, new_rule = _definition(old), _definition(new)
+    old_compiled, new_compiled = compile_rule(old_rule), compile_rule(new_rule)
+    shared_trigger = (old_rule.trigger_type, old_rule.trigger_config) == (new_rule.trigger_type, new_rule.trigger_config)
+
+    start_date = datetime.utcnow().date() - timedelta(days=days)
+    txs = _window(session, [old_rule, new_rule], start_date)
+    balances = BalanceSeries.load(session).at_many([tx.date for tx in txs])
+    fx_table = load_fx_table()
+    now = datetime.utcnow()
+
+    changed = []
+    counts = dict.fromkeys(OUTCOME_FIELDS, 0)
+    totals = {"old_allocated": 0.0, "new_allocated": 0.0, "old_tasks": 0, "new_tasks": 0}
+    for i, (tx, balance) in enumerate(zip(txs, balances)):
+        if progress and i % PROGRESS_EVERY == 0:
+            progress(i / len(txs), f"Compared {i}/{len(txs)} transactions")
+        event = {"type": "transaction", "event_key": f"diff:{tx.id}", "transaction_id": tx.id}
+        ctx = EvalContext(tx, tx_amount_in_base(session, tx, fx_table), balance, now)
+        old_match = old_compiled.trigger(event, tx)
+        new_match = old_match if shared_trigger else new_compiled.trigger(event, tx)
+
+        outcomes = []
+        for rule, compiled, matched in ((old_rule, old_compiled, old_match), (new_rule, new_compiled, new_match)):
+            status, _, action_rows = _evaluate_rule(
+                session, rule, event, ctx, AllocationLedger(balance), True, compiled=compiled, matched=matched
+            )
+            outcomes.append(_outcome(status, action_rows))
+        before, after = outcomes
+
+        totals["old_allocated"] += sum(before["allocated"].values())
+        totals["new_allocated"] += sum(after["allocated"].values())
+        totals["old_tasks"] += len(before["tasks"])
+        totals["new_tasks"] += len(after["tasks"])
+        differences = [field for field in OUTCOME_FIELDS if before[field] != after[field]]
+        for field in differences:
+            counts[field] += 1
+        if differences:
+            changed.append(
+                {
+                    "transaction_id": tx.id,
+                    "date": tx.date.isoformat(),
+                    "description": tx.description,
+                    "amount": tx.amount,
+                    "changes": differences,
+                    "old": before,
+                    "new": after,
+                }
+            )
+
+    return RuleDiffReport(
+        old_label=_label(old),
+        new_label=_label(new),
+        transactions_scanned=len(txs),
+        changed=changed,
+        summary={
+            "status_changes": counts["status"],
+            "allocation_changes": counts["allocated"],
+            "task_changes": counts["tasks"],
+            "old_total_allocated": round(totals["old_allocated"], 2),
+            "new_total_allocated": round(totals["new_allocated"], 2),
+            "old_tasks": totals["old_tasks"],
+            "new_tasks": totals["new_tasks"],
+        },
+    )
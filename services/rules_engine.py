@@ -1,143 +1,162 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime
+
 from sqlalchemy import select
 
 from db import models
+from services.fx import base_currency, tx_amount_in_base
+from services.ledger import post_allocations
+from services.metrics import registry as metrics
+from services.records import TxRecord, get_tx_record
+from services.rule_compiler import CompiledRule, EvalContext, compile_condition, compiled_rule
+
+# Anything with id, date, description, amount and currency: ORM rows from pages, slotted records in loops.
+TxLike = models.Transaction | TxRecord
 
 
 def sort_rules(rules: list[models.Rule]) -> list[models.Rule]:
     return sorted(rules, key=lambda r: (-r.priority, r.created_at, r.id))
 
 
-def trigger_matches(rule: models.Rule, event: dict, tx: models.Transaction | None = None) -> bool:
-    etype = event.get("type")
-    if rule.trigger_type == "manual":
-        return etype == "manual"
-    if rule.trigger_type == "transaction":
-        if etype != "transaction" or not tx:
-            return False
-        contains = rule.trigger_config.get("description_contains")
-        return contains.lower() in tx.description.lower() if contains else True
-    if rule.trigger_type == "schedule":
-        return etype == "schedule"
-    return False
+def trigger_matches(rule: models.Rule, event: dict, tx: TxLike | None = None) -> bool:
+    return compiled_rule(rule).trigger(event, tx)
 
 
 def check_condition(
     condition: dict,
-    tx: models.Transaction | None,
+    tx: TxLike | None,
     latest_balance: float | None,
     now: datetime | None = None,
+    amount: float | None = None,
 ) -> tuple[bool, str]:
-    now = now or datetime.utcnow()
-    ctype = condition.get("type")
-    if ctype == "amount_gte":
-        ok = tx is not None and tx.amount >= float(condition["value"])
-        return ok, f"amount {tx.amount if tx else 'n/a'} >= {condition['value']}"
-    if ctype == "amount_lte":
-        ok = tx is not None and tx.amount <= float(condition["value"])
-        return ok, f"amount {tx.amount if tx else 'n/a'} <= {condition['value']}"
-    if ctype == "day_of_month_eq":
-        ok = now.day == int(condition["value"])
-        return ok, f"day {now.day} == {condition['value']}"
-    if ctype == "balance_gte":
-        ok = latest_balance is not None and latest_balance >= float(condition["value"])
-        return ok, f"balance {latest_balance} >= {condition['value']}"
-    return False, "unknown condition"
-
-
-def _execute_actions(session, rule: models.Rule, tx: models.Transaction | None, latest_balance: float | None):
-    allocated = 0.0
+    # One-off evaluation of a single condition; run_rule uses the rule's cached compiled closures.
+    if amount is None and tx is not None:
+        amount = tx.amount
+    return compile_condition(condition)(EvalContext(tx, amount, latest_balance, now or datetime.utcnow()))
+
+
+@dataclass(slots=True)
+class AllocationLedger:
+    # Funds one event's rules draw from, in priority order. Every rule evaluated for the event shares
+    # one ledger, so up_to_available clamps see what higher-priority rules already allocated.
+    opening_balance: float | None
+    allocated: float = 0.0
+
+    @property
+    def available(self) -> float:
+        return (self.opening_balance or 0.0) - self.allocated
+
+
+def _execute_actions(
+    session,
+    rule: models.Rule,
+    tx: TxLike | None,
+    latest_balance: float | None,
+    amount: float | None = None,
+    now: datetime | None = None,
+    ledger: AllocationLedger | None = None,
+    compiled: CompiledRule | None = None,
+):
+    if amount is None and tx is not None:
+        amount = tx.amount
+    ctx = EvalContext(tx, amount, latest_balance, now or datetime.utcnow())
+    ledger = ledger or AllocationLedger(latest_balance)
     trace_actions = []
     action_rows = []
     final_status = "completed"
 
-    for idx, action in enumerate(rule.actions):
-        kind = action["type"]
-        status = "success"
-        message = ""
-        payload: dict = {}
-
-        if kind == "allocate_fixed":
-            amount = float(action["amount"])
-            up_to = action.get("up_to_available", False)
-            available = (latest_balance or 0.0) - allocated
-            actual = min(amount, max(0.0, available)) if up_to else amount
-            if up_to and actual <= 0:
-                status = "failed"
-                message = "No available funds"
-            else:
-                allocated += actual
-                message = f"Allocated {actual} to pod {action['pod_id']}"
-                payload = {"allocated": actual, "pod_id": action.get("pod_id")}
-        elif kind == "allocate_percent":
-            base = abs(tx.amount) if tx else 0.0
-            raw = base * (float(action["percent"]) / 100)
-            amount = round(raw, 2)
-            allocated += amount
-            leftover = round(base - amount, 2)
-            message = f"Allocated {amount} ({action['percent']}%), leftover {leftover}"
-            payload = {"allocated": amount, "leftover": leftover, "pod_id": action.get("pod_id")}
-        elif kind == "top_up_pod":
-            pod = session.get(models.Pod, int(action["pod_id"]))
-            target = float(action["target"])
-            need = max(target - (pod.current_balance if pod else 0), 0)
-            allocated += need
-            message = f"Top up suggestion {need}"
-            payload = {"allocated": need, "pod_id": action.get("pod_id")}
-        elif kind == "liability_suggestion":
-            message = "Task suggested"
-            payload = {
-                "task_title": action.get("title", "Pay liability"),
-                "task_note": action.get("note"),
-            }
-        else:
-            status = "failed"
-            message = f"Unsupported action {kind}"
-
-        trace_actions.append({"action": action, "status": status, "message": message, "payload": payload})
-        action_rows.append((idx, status, message, payload))
-        if status == "failed":
+    for idx, (action, execute) in enumerate((compiled or compiled_rule(rule)).actions):
+        with metrics.timer("flowledger_action_execution_seconds", rule_id=rule.id, action_type=action.get("type")):
+            outcome = execute(session, ctx, ledger.allocated)
+        ledger.allocated += outcome.allocated
+
+        trace_actions.append({"action": action, "status": outcome.status, "message": outcome.message, "payload": outcome.payload})
+        action_rows.append((idx, outcome.status, outcome.message, outcome.payload))
+        if outcome.status == "failed":
             final_status = "action_failed"
             break
 
     return final_status, trace_actions, action_rows
 
 
-def run_rule(session, rule: models.Rule, event: dict, tx: models.Transaction | None = None, dry_run: bool = True):
-    # idempotency: no duplicate persisted runs for same rule+event key
-    existing = session.scalar(
-        select(models.Run).where(models.Run.rule_id == rule.id, models.Run.event_key == event["event_key"])
-    )
-    if existing:
-        return existing, []
+def _event_time(event: dict) -> datetime | None:
+    # Scheduled events carry the window they fire for, so catch-up runs see that date, not today.
+    scheduled_for = event.get("scheduled_for")
+    return datetime.fromisoformat(scheduled_for) if scheduled_for else None
 
-    trace: dict = {"trigger": False, "conditions": [], "actions": [], "dry_run": dry_run}
+
+def _latest_balance(session) -> float | None:
     latest_snapshot = session.scalar(select(models.BalanceSnapshot).order_by(models.BalanceSnapshot.snapshot_at.desc()))
-    latest_balance = latest_snapshot.balance if latest_snapshot else None
+    return latest_snapshot.balance if latest_snapshot else None
 
-    if not trigger_matches(rule, event, tx):
-        run = models.Run(rule_id=rule.id, event_key=event["event_key"], status="skipped", trace=trace)
-        session.add(run)
-        session.commit()
-        return run, []
+
+def _fx_trace(session, tx: TxLike | None, amount: float | None) -> dict | None:
+    if tx is None or amount == tx.amount:
+        return None
+    return {"currency": tx.currency, "amount": tx.amount, "amount_base": amount, "base": base_currency(session)}
+
+
+def _evaluate_rule(
+    session,
+    rule: models.Rule,
+    event: dict,
+    ctx: EvalContext,
+    ledger: AllocationLedger,
+    dry_run: bool,
+    fx: dict | None = None,
+    compiled: CompiledRule | None = None,
+    matched: bool | None = None,
+) -> tuple[str, dict, list]:
+    # Pure evaluation: reads the session (pods) but adds nothing to it. Persistence is _record's job.
+    # Callers comparing rule versions pass their own compiled rule and a trigger result they share.
+    compiled = compiled or compiled_rule(rule)
+    trace: dict = {"trigger": False, "conditions": [], "actions": [], "dry_run": dry_run}
+    if matched is None:
+        with metrics.timer("flowledger_trigger_match_seconds", rule_id=rule.id):
+            matched = compiled.trigger(event, ctx.tx)
+    if not matched:
+        return "skipped", trace, []
 
     trace["trigger"] = True
-    for condition in rule.conditions:
-        ok, message = check_condition(condition, tx, latest_balance)
+    if fx:
+        trace["fx"] = fx
+    trace["ledger"] = {
+        "opening_balance": ledger.opening_balance,
+        "allocated_before": ledger.allocated,
+        "available_before": ledger.available,
+    }
+    for condition, check in compiled.conditions:
+        with metrics.timer("flowledger_condition_check_seconds", rule_id=rule.id, condition_type=condition.get("type")):
+            ok, message = check(ctx)
         trace["conditions"].append({"condition": condition, "ok": ok, "message": message})
         if not ok:
-            run = models.Run(rule_id=rule.id, event_key=event["event_key"], status="condition_failed", trace=trace)
-            session.add(run)
-            session.commit()
-            return run, []
+            return "condition_failed", trace, []
 
-    status, trace_actions, action_rows = _execute_actions(session, rule, tx, latest_balance)
+    before = ledger.allocated
+    status, trace_actions, action_rows = _execute_actions(
+        session, rule, ctx.tx, ctx.latest_balance, ctx.amount, ctx.now, ledger, compiled
+    )
     trace["actions"] = trace_actions
+    trace["ledger"].update(allocated=ledger.allocated - before, available_after=ledger.available)
+    return status, trace, action_rows
+
 
-    run = models.Run(rule_id=rule.id, event_key=event["event_key"], status=status, trace=trace)
+def _record(
+    session,
+    rule: models.Rule,
+    event_key: str,
+    status: str,
+    trace: dict,
+    action_rows: list,
+    dry_run: bool,
+    at: datetime | None = None,
+):
+    run = models.Run(rule_id=rule.id, event_key=event_key, status=status, trace=trace)
     session.add(run)
+    if not action_rows:
+        return run, []
     session.flush()
 
     results = []
@@ -154,26 +173,106 @@ def run_rule(session, rule: models.Rule, event: dict, tx: models.Transaction | N
                     note=payload.get("task_note"),
                 )
             )
+    if not dry_run:
+        post_allocations(session, run, action_rows, at)
+    return run, results
+
 
-    session.commit()
+def persist_runs(session, runs: list[models.Run], **labels) -> None:
+    # Labels are read before the commit expires the runs, which would reload each one.
+    counted = [(run.rule_id, run.status) for run in runs]
+    with metrics.timer("flowledger_persist_seconds", **labels):
+        session.commit()
+    for rule_id, status in counted:
+        metrics.inc("flowledger_runs_total", rule_id=rule_id, status=status)
+
+
+_LATEST = object()
+
+
+def run_rule(
+    session,
+    rule: models.Rule,
+    event: dict,
+    tx: TxLike | None = None,
+    dry_run: bool = True,
+    balance: float | None = _LATEST,
+    commit: bool = True,
+):
+    # balance overrides the latest snapshot, e.g. with the as-of balance when backtesting history.
+    # commit=False only flushes: the caller commits (and counts the runs) once its batch is done.
+    # idempotency: no duplicate persisted runs for same rule+event key
+    existing = session.scalar(
+        select(models.Run).where(models.Run.rule_id == rule.id, models.Run.event_key == event["event_key"])
+    )
+    if existing:
+        metrics.inc("flowledger_runs_total", rule_id=rule.id, status="duplicate")
+        return existing, []
+
+    latest_balance = _latest_balance(session) if balance is _LATEST else balance
+    amount = tx_amount_in_base(session, tx)
+    ctx = EvalContext(tx, amount, latest_balance, _event_time(event) or datetime.utcnow())
+    status, trace, action_rows = _evaluate_rule(
+        session, rule, event, ctx, AllocationLedger(latest_balance), dry_run, _fx_trace(session, tx, amount)
+    )
+    run, results = _record(session, rule, event["event_key"], status, trace, action_rows, dry_run, ctx.now)
+    if commit:
+        persist_runs(session, [run], rule_id=rule.id)
+    else:
+        session.flush()
     return run, results
 
 
 def evaluate_rules_for_event(session, event: dict, dry_run: bool = True):
+    # One pass for the whole event: a single snapshot read, one shared allocation ledger drawn down in
+    # priority order, and one commit for every run it produces.
     tx = None
     if event.get("transaction_id"):
-        tx = session.get(models.Transaction, event["transaction_id"])
+        tx = get_tx_record(session, event["transaction_id"])
 
     rules = session.scalars(select(models.Rule).where(models.Rule.enabled == True)).all()  # noqa: E712
-    ordered = sort_rules(rules)
-    runs = []
-    for rule in ordered:
-        if trigger_matches(rule, event, tx):
-            run, _ = run_rule(session, rule, event, tx=tx, dry_run=dry_run)
-            runs.append(run)
+    # Compile and match each rule once; _evaluate_rule reuses both instead of repeating them.
+    ordered = []
+    for rule in sort_rules(rules):
+        compiled = compiled_rule(rule)
+        with metrics.timer("flowledger_trigger_match_seconds", rule_id=rule.id):
+            if compiled.trigger(event, tx):
+                ordered.append((rule, compiled))
+    if not ordered:
+        return []
+    existing = {
+        run.rule_id: run
+        for run in session.scalars(
+            select(models.Run).where(
+                models.Run.event_key == event["event_key"], models.Run.rule_id.in_([r.id for r, _ in ordered])
+            )
+        )
+    }
+
+    latest_balance = _latest_balance(session)
+    amount = tx_amount_in_base(session, tx)
+    ctx = EvalContext(tx, amount, latest_balance, _event_time(event) or datetime.utcnow())
+    ledger = AllocationLedger(latest_balance)
+    fx = _fx_trace(session, tx, amount)
+
+    runs, created = [], []
+    for rule, compiled in ordered:
+        if rule.id in existing:
+            metrics.inc("flowledger_runs_total", rule_id=rule.id, status="duplicate")
+            runs.append(existing[rule.id])
+            continue
+        status, trace, action_rows = _evaluate_rule(
+            session, rule, event, ctx, ledger, dry_run, fx, compiled=compiled, matched=True
+        )
+        run, _ = _record(session, rule, event["event_key"], status, trace, action_rows, dry_run, ctx.now)
+        runs.append(run)
+        created.append(run)
+    if created:
+        persist_runs(session, created, scope="event")
     return runs
 
 
-def scheduler_tick(session):
-    event = {"type": "schedule", "event_key": f"schedule:{datetime.utcnow().strftime('%Y%m%d%H')}"}
-    return evaluate_rules_for_event(session, event, dry_run=True)
+def scheduler_tick(session, now: datetime | None = None):
+    from services.scheduler import run_due
+
+    return run_due(session, now=now, dry_run=True)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import calendar
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from db import models
+from services.rules_engine import run_rule, sort_rules
+
+INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "biweekly": timedelta(weeks=2),
+}
+MONTHLY = "monthly"
+# Rules without a recognised freq keep the old behaviour of firing on every hourly tick.
+DEFAULT_FREQ = "hourly"
+MAX_CATCH_UP = 24
+
+
+def rule_freq(rule: models.Rule) -> str:
+    freq = (rule.trigger_config or {}).get("freq")
+    return freq if freq in INTERVALS or freq == MONTHLY else DEFAULT_FREQ
+
+
+def _add_months(anchor: datetime, months: int) -> datetime:
+    month_index = anchor.month - 1 + months
+    year, month = anchor.year + month_index // 12, month_index % 12 + 1
+    day = min(anchor.day, calendar.monthrange(year, month)[1])
+    return anchor.replace(year=year, month=month, day=day)
+
+
+def fire_time(freq: str, anchor: datetime, index: int) -> datetime:
+    if freq == MONTHLY:
+        return _add_months(anchor, index)
+    return anchor + INTERVALS[freq] * index
+
+
+def fire_index_at_or_before(freq: str, anchor: datetime, at: datetime) -> int:
+    if at <= anchor:
+        return 0
+    if freq == MONTHLY:
+        index = (at.year - anchor.year) * 12 + at.month - anchor.month
+        return index if fire_time(freq, anchor, index) <= at else index - 1
+    return int((at - anchor) // INTERVALS[freq])
+
+
+def next_fire_after(freq: str, anchor: datetime, after: datetime) -> datetime:
+    if after < anchor:
+        return anchor
+    return fire_time(freq, anchor, fire_index_at_or_before(freq, anchor, after) + 1)
+
+
+def due_windows(
+    freq: str, anchor: datetime, last_run_at: datetime | None, now: datetime, catch_up: str, max_catch_up: int
+) -> list[datetime]:
+    latest = fire_index_at_or_before(freq, anchor, now)
+    if last_run_at is None or catch_up == "latest":
+        return [fire_time(freq, anchor, latest)]
+    first = fire_index_at_or_before(freq, anchor, last_run_at) + 1
+    first = max(first, latest - max_catch_up + 1)
+    return [fire_time(freq, anchor, i) for i in range(first, latest + 1)]
+
+
+def sync_schedules(session, now: datetime | None = None) -> int:
+    # Anti-join: only schedule rules that have no schedule row yet are touched.
+    now = now or datetime.utcnow()
+    missing = session.scalars(
+        select(models.Rule)
+        .outerjoin(models.RuleSchedule, models.RuleSchedule.rule_id == models.Rule.id)
+        .where(
+            models.Rule.trigger_type == "schedule",
+            models.Rule.enabled == True,  # noqa: E712
+            models.RuleSchedule.rule_id.is_(None),
+        )
+    ).all()
+    for rule in missing:
+        session.add(models.RuleSchedule(rule_id=rule.id, freq=rule_freq(rule), next_run_at=now))
+    if missing:
+        session.commit()
+    return len(missing)
+
+
+def reschedule_rule(session, rule: models.Rule, now: datetime | None = None) -> None:
+    # Call after a rule is edited or toggled so the stored freq and due time follow it.
+    session.execute(delete(models.RuleSchedule).where(models.RuleSchedule.rule_id == rule.id))
+    if rule.trigger_type == "schedule" and rule.enabled:
+        session.add(models.RuleSchedule(rule_id=rule.id, freq=rule_freq(rule), next_run_at=now or datetime.utcnow()))
+    session.commit()
+
+
+def run_due(
+    session,
+    now: datetime | None = None,
+    dry_run: bool = True,
+    catch_up: str = "latest",
+    max_catch_up: int = MAX_CATCH_UP,
+) -> list[models.Run]:
+    now = now or datetime.utcnow()
+    sync_schedules(session, now)
+    due = session.execute(
+        select(models.RuleSchedule, models.Rule)
+        .join(models.Rule, models.Rule.id == models.RuleSchedule.rule_id)
+        .where(models.RuleSchedule.next_run_at <= now)
+    ).all()
+    schedules = {rule.id: schedule for schedule, rule in due}
+
+    runs = []
+    for rule in sort_rules([rule for _, rule in due]):
+        schedule = schedules[rule.id]
+        if not rule.enabled or rule.trigger_type != "schedule":
+            session.delete(schedule)
+            continue
+        freq = rule_freq(rule)
+        anchor = rule.created_at
+        windows = due_windows(freq, anchor, schedule.last_run_at, now, catch_up, max_catch_up)
+        for window in windows:
+            event = {
+                "type": "schedule",
+                "event_key": f"schedule:{freq}:{window.strftime('%Y%m%d%H%M')}",
+                "scheduled_for": window.isoformat(),
+            }
+            run, _ = run_rule(session, rule, event, dry_run=dry_run)
+            runs.append(run)
+        schedule.freq = freq
+        schedule.last_run_at = windows[-1]
+        schedule.next_run_at = next_fire_after(freq, anchor, now)
+    session.commit()
+    return runs
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+
+from db import models
+from db.search_index import FTS_TABLE
+from services.records import TxRecord, load_tx_records
+
+# Trigram MATCH needs at least three characters; shorter terms use the LIKE fallback.
+MIN_FTS_TERM = 3
+SEARCH_COLUMNS = ("description", "merchant")
+
+_fts = table(FTS_TABLE, column("rowid"))
+
+
+def fts_ready(session) -> bool:
+    cached = session.info.get("fts_ready")
+    if cached is None:
+        cached = session.get_bind().dialect.name == "sqlite" and (
+            session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first() is not None
+        )
+        session.info["fts_ready"] = cached
+    return cached
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_clause(session, term: str, columns: tuple[str, ...] = SEARCH_COLUMNS):
+    # Case-insensitive substring match on any of `columns`, as a WHERE clause on transactions.
+    if _use_fts(session, term):
+        phrase = '"' + term.replace('"', '""') + '"'
+        query = phrase if set(columns) == set(SEARCH_COLUMNS) else f"{{{' '.join(columns)}}} : {phrase}"
+        matched = select(_fts.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(query))
+        return models.Transaction.id.in_(matched)
+    pattern = f"%{_escape_like(term.lower())}%"
+    return or_(*[func.lower(getattr(models.Transaction, c)).like(pattern, escape="\\") for c in columns])
+
+
+def _use_fts(session, term: str) -> bool:
+    return len(term) >= MIN_FTS_TERM and fts_ready(session)
+
+
+def search_transactions(
+    session, term: str, limit: int = 50, since: date | None = None, columns: tuple[str, ...] = SEARCH_COLUMNS
+) -> list[TxRecord]:
+    term = term.strip()
+    if not term:
+        return []
+    return load_tx_records(session, since=since, where=match_clause(session, term, columns), limit=limit, newest_first=True)
+
+
+def trigger_history(session, rule: models.Rule, since: date | None = None, limit: int | None = None) -> list[TxRecord]:
+    # Historical transactions this rule's trigger would fire on, oldest first, resolved by the index
+    # rather than by running trigger_matches over every row.
+    if rule.trigger_type != "transaction":
+        return []
+    contains = (rule.trigger_config or {}).get("description_contains")
+    where = match_clause(session, contains, ("description",)) if contains else None
+    return load_tx_records(session, since=since, where=where, limit=limit)
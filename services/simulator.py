@@ -1,35 +1,75 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
+
 from sqlalchemy import select
 
 from db import models
 from schemas.domain import SimulationReport
-from services.rules_engine import run_rule
+from services.fx import load_fx_table, tx_amount_in_base
+from services.ledger import BalanceSeries
+from services.metrics import registry as metrics
+from services.rule_compiler import EvalContext, compiled_rule
+from services.rules_engine import AllocationLedger, _evaluate_rule, _fx_trace, _record, persist_runs
+from services.search import trigger_history
+
+PROGRESS_EVERY = 100
 
 
-def simulate_rule(session, rule_id: int, days: int = 90) -> SimulationReport:
+def simulate_rule(session, rule_id: int, days: int = 90, progress=None) -> SimulationReport:
+    # Runs are committed once at the end, so a cancelled or failed simulation leaves nothing behind.
     rule = session.get(models.Rule, rule_id)
+    compiled = compiled_rule(rule)
+    prefix = f"simulate:{rule_id}:"
+    # Runs of earlier simulations, read in one query instead of an idempotency check per transaction.
+    existing = {
+        run.event_key: run
+        for run in session.scalars(
+            select(models.Run).where(models.Run.rule_id == rule_id, models.Run.event_key.startswith(prefix))
+        )
+    }
     start_date = datetime.utcnow().date() - timedelta(days=days)
-    txs = session.scalars(select(models.Transaction).where(models.Transaction.date >= start_date).order_by(models.Transaction.date)).all()
-    traces = []
+    # Only transactions the trigger fires on, found through the search index; the rest would be skipped runs.
+    txs = trigger_history(session, rule, since=start_date)
+    # Resolve the balance in effect on each transaction's date in one vectorized lookup.
+    balances = BalanceSeries.load(session).at_many([tx.date for tx in txs])
+    fx_table = load_fx_table()
+    runs = []
+    created = []
     total_allocated = {}
     tasks_created = 0
-    warnings = []
 
-    for tx in txs:
-        event = {"type": "transaction", "event_key": f"simulate:{rule_id}:{tx.id}", "transaction_id": tx.id}
-        run, results = run_rule(session, rule, event, tx=tx, dry_run=True)
-        traces.append({"transaction_id": tx.id, "status": run.status, "trace": run.trace})
+    for i, (tx, balance) in enumerate(zip(txs, balances)):
+        if progress and i % PROGRESS_EVERY == 0:
+            progress(i / len(txs), f"Simulated {i}/{len(txs)} transactions")
+        event = {"type": "transaction", "event_key": f"{prefix}{tx.id}", "transaction_id": tx.id}
+        run = existing.get(event["event_key"])
+        if run is not None:
+            metrics.inc("flowledger_runs_total", rule_id=rule_id, status="duplicate")
+            runs.append((tx, run))
+            continue
+        amount = tx_amount_in_base(session, tx, fx_table)
+        ctx = EvalContext(tx, amount, balance, datetime.utcnow())
+        status, trace, action_rows = _evaluate_rule(
+            session, rule, event, ctx, AllocationLedger(balance), True, _fx_trace(session, tx, amount), compiled=compiled
+        )
+        run, results = _record(session, rule, event["event_key"], status, trace, action_rows, True, ctx.now)
+        runs.append((tx, run))
+        created.append(run)
         for res in results:
             allocated = res.payload.get("allocated", 0)
             pod_id = res.payload.get("pod_id", "unknown")
             total_allocated[pod_id] = total_allocated.get(pod_id, 0) + allocated
             if res.payload.get("task_title"):
                 tasks_created += 1
-        if run.status in {"action_failed", "condition_failed"}:
-            warnings.append(f"Run {run.id} ended with {run.status}")
 
+    # One flush assigns the new runs their ids; read everything before the commit expires them.
+    session.flush()
+    traces = [{"transaction_id": tx.id, "status": run.status, "trace": run.trace} for tx, run in runs]
+    warnings = [
+        f"Run {run.id} ended with {run.status}" for _, run in runs if run.status in {"action_failed", "condition_failed"}
+    ]
+    persist_runs(session, created, scope="simulation")
     return SimulationReport(
         rule_name=rule.name,
         traces=traces,
@@ -1,15 +1,68 @@
 from __future__ import annotations
 
-from sqlalchemy import select
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from sqlalchemy import and_, func, or_, select, update
 
 from db import models
 
+PAGE_SIZE = 50
 
-def list_tasks(session, status: str | None = None):
-    query = select(models.Task)
+
+@dataclass
+class TaskPage:
+    items: list[models.Task]
+    # (created_at, id) of the last item; pass back as `after` for the next page. None on the last page.
+    next_cursor: tuple[datetime, int] | None
+
+
+def _filtered(query, status: str | None = None, due_from: date | None = None, due_to: date | None = None):
     if status:
         query = query.where(models.Task.status == status)
-    return session.scalars(query.order_by(models.Task.created_at.desc())).all()
+    if due_from:
+        query = query.where(models.Task.due_date >= due_from)
+    if due_to:
+        query = query.where(models.Task.due_date <= due_to)
+    return query
+
+
+def list_tasks(session, status: str | None = None):
+    query = _filtered(select(models.Task), status)
+    return session.scalars(query.order_by(models.Task.created_at.desc(), models.Task.id.desc())).all()
+
+
+def page_tasks(
+    session,
+    status: str | None = None,
+    due_from: date | None = None,
+    due_to: date | None = None,
+    after: tuple[datetime, int] | None = None,
+    limit: int = PAGE_SIZE,
+) -> TaskPage:
+    # Keyset pagination, newest first: seeks past the cursor on (created_at, id) instead of OFFSET,
+    # so page N costs the same as page 1.
+    query = _filtered(select(models.Task), status, due_from, due_to)
+    if after is not None:
+        created_at, task_id = after
+        query = query.where(
+            or_(
+                models.Task.created_at < created_at,
+                and_(models.Task.created_at == created_at, models.Task.id < task_id),
+            )
+        )
+    rows = session.scalars(query.order_by(models.Task.created_at.desc(), models.Task.id.desc()).limit(limit + 1)).all()
+    items = rows[:limit]
+    next_cursor = (items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return TaskPage(items=items, next_cursor=next_cursor)
+
+
+def count_tasks(session, status: str | None = None, due_from: date | None = None, due_to: date | None = None) -> int:
+    return session.scalar(_filtered(select(func.count(models.Task.id)), status, due_from, due_to))
+
+
+def task_counts(session) -> dict[str, int]:
+    return dict(session.execute(select(models.Task.status, func.count(models.Task.id)).group_by(models.Task.status)).all())
 
 
 def mark_done(session, task_id: int, note: str | None = None, reference_id: str | None = None):
@@ -23,3 +76,16 @@ def mark_done(session, task_id: int, note: str | None = None, reference_id: str
         task.reference_id = reference_id
     session.commit()
     return task
+
+
+def mark_many_done(session, task_ids: list[int]) -> int:
+    if not task_ids:
+        return 0
+    result = session.execute(
+        update(models.Task)
+        .where(models.Task.id.in_(task_ids), models.Task.status != "done")
+        .values(status="done")
+        .execution_options(synchronize_session="fetch")
+    )
+    session.commit()
+    return result.rowcount
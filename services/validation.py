@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter, ValidationError
+
+from schemas.domain import TransactionSchema
+
+CHUNK_SIZE = 10_000
+TEXT_COLUMNS = ["description", "account", "category", "merchant", "currency"]
+
+# Built once: constructing the adapter compiles the pydantic-core validator for the whole list.
+TRANSACTIONS_ADAPTER = TypeAdapter(list[TransactionSchema])
+
+
+def _column_errors(chunk: pd.DataFrame) -> dict[int, list[dict]]:
+    # Checks the schema does not express, done per column rather than per row.
+    errors: dict[int, list[dict]] = {}
+    amount = pd.to_numeric(chunk["amount"], errors="coerce")
+    for pos in np.flatnonzero(~np.isfinite(amount.to_numpy(dtype=float))):
+        errors.setdefault(int(pos), []).append({"field": "amount", "message": "amount must be a finite number"})
+    blank = chunk["description"].isna() | (chunk["description"].astype("string").str.strip() == "")
+    for pos in np.flatnonzero(blank.to_numpy()):
+        errors.setdefault(int(pos), []).append({"field": "description", "message": "description is empty"})
+    return errors
+
+
+def _records(chunk: pd.DataFrame) -> list[dict]:
+    columns = {}
+    for col in chunk.columns:
+        missing = chunk[col].isna().to_numpy()
+        values = chunk[col].tolist()
+        if col in TEXT_COLUMNS:
+            columns[col] = [None if m else str(v) for v, m in zip(values, missing)]
+        else:
+            columns[col] = [None if m else v for v, m in zip(values, missing)]
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _validate_chunk(chunk: pd.DataFrame) -> tuple[list[dict], list[int], dict[int, list[dict]]]:
+    errors = _column_errors(chunk)
+    records = _records(chunk)
+    try:
+        validated = TRANSACTIONS_ADAPTER.validate_python(records)
+    except ValidationError as exc:
+        validated = None
+        for err in exc.errors(include_url=False):
+            pos, field = err["loc"][0], err["loc"][1] if len(err["loc"]) > 1 else None
+            errors.setdefault(int(pos), []).append({"field": field, "message": err["msg"]})
+
+    good = [i for i in range(len(records)) if i not in errors]
+    if not good:
+        return [], [], errors
+    if validated is None:
+        # pydantic returns nothing for a list with a bad item; re-run the clean rows for their coerced values.
+        validated = TRANSACTIONS_ADAPTER.validate_python([records[i] for i in good])
+    elif len(good) < len(records):
+        validated = [validated[i] for i in good]
+    return TRANSACTIONS_ADAPTER.dump_python(validated), good, errors
+
+
+def validate_transactions(df: pd.DataFrame, chunk_size: int = CHUNK_SIZE) -> tuple[pd.DataFrame, list[dict]]:
+    # The valid frame is indexed by each row's position in df, so callers can line it up with the input.
+    valid_rows: list[dict] = []
+    positions: list[int] = []
+    report: list[dict] = []
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        rows, good, errors = _validate_chunk(chunk)
+        valid_rows.extend(rows)
+        positions.extend(start + i for i in good)
+        if errors:
+            bad = sorted(errors)
+            payloads = json.loads(chunk.iloc[bad].to_json(orient="records", date_format="iso"))
+            for pos, payload in zip(bad, payloads):
+                report.append({"row": start + pos, "payload": payload, "errors": errors[pos]})
+    columns = list(TransactionSchema.model_fields)
+    return pd.DataFrame(valid_rows, columns=columns, index=positions), report
@@ -0,0 +1,16 @@
+from benchmarks.suite import build_cases, compare, run_suite
+
+
+def test_suite_runs_on_tiny_dataset():
+    cases = build_cases([20], [3], only={"ingest_transactions", "evaluate_rules_for_event", "simulate_rule"})
+    results = run_suite(cases, memory=True, log=lambda _: None)
+    assert {r["name"] for r in results} == {"ingest_transactions", "evaluate_rules_for_event", "simulate_rule"}
+    assert all(r["seconds"] >= 0 and r["peak_mb"] is not None for r in results)
+
+
+def test_compare_flags_regressions_past_tolerance():
+    baseline = {"results": [{"key": "run_rule[tx=1000]", "seconds": 1.0, "peak_mb": 10.0}]}
+    slower = [{"key": "run_rule[tx=1000]", "seconds": 1.5, "peak_mb": 10.5}]
+    within = [{"key": "run_rule[tx=1000]", "seconds": 1.1, "peak_mb": None}]
+    assert len(compare(slower, baseline, tolerance=0.25)) == 1
+    assert compare(within, baseline, tolerance=0.25) == []
@@ -0,0 +1,59 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from db import models
+from services.categorize import CATEGORY_KEYWORDS, MERCHANT_CATEGORIES, Categorizer
+from services.imports import ingest_transactions
+
+
+def test_patterns_fill_only_empty_cells():
+    df = pd.DataFrame(
+        {
+            "description": ["POS PURCHASE STARBUCKS #1234", "UBER EATS 8899", "Uber trip 12", "Payroll ACME", None, "Zzz"],
+            "category": [None, "", None, "Salary", None, None],
+            "merchant": [None, None, None, "ACME Inc", None, None],
+        }
+    )
+    out = Categorizer().categorize_frame(df)
+    assert out["category"].tolist() == ["Dining", "Dining", "Transport", "Salary", None, None]
+    assert out["merchant"].tolist() == ["Starbucks", "Uber Eats", "Uber", "ACME Inc", None, "Zzz"]
+
+
+@pytest.mark.parametrize(
+    "keyword, category", [(kw, category) for category, kws in CATEGORY_KEYWORDS.items() for kw in kws]
+)
+def test_every_keyword_matches_a_statement_line(keyword, category):
+    # Statement noise around the keyword, and keywords built from noise words ("credit card").
+    categories, _ = Categorizer().categorize(pd.Series([f"POS {keyword.upper()} #0042"]))
+    assert categories.tolist() == [category]
+
+
+@pytest.mark.parametrize("merchant, category", MERCHANT_CATEGORIES.items())
+def test_every_merchant_matches_a_statement_line(merchant, category):
+    categories, _ = Categorizer().categorize(pd.Series([f"VISA DEBIT {merchant.upper()} 8899"]))
+    assert categories.tolist() == [category]
+
+
+def test_descriptions_are_classified_once():
+    categorizer = Categorizer()
+    categorizer.categorize(pd.Series(["Coffee 1", "Coffee 1", "Rent"] * 1000))
+    assert len(categorizer._cache) == 2
+    categorizer.keywords.clear()  # cached answers no longer consult the pattern tables
+    assert categorizer.categorize(pd.Series(["Rent"]))[0].tolist() == ["Housing"]
+
+
+def test_import_learns_categories_from_history(session):
+    session.add(models.Transaction(tx_hash="old", date=date(2023, 1, 1), description="GYM CLUB 0042", amount=-30, category="Fitness"))
+    session.commit()
+    csv = b"date,description,amount\n2024-01-01,GYM CLUB 0077,-30\n2024-01-02,Netflix.com,-15\n"
+    ingest_transactions(session, io.BytesIO(csv))
+    rows = session.execute(
+        select(models.Transaction.description, models.Transaction.category, models.Transaction.merchant)
+        .where(models.Transaction.tx_hash != "old")
+        .order_by(models.Transaction.date)
+    ).all()
+    assert rows == [("GYM CLUB 0077", "Fitness", "Gym Club"), ("Netflix.com", "Subscriptions", "Netflix")]
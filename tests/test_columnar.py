@@ -0,0 +1,117 @@
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from db import models
+from db.engine import Base
+from services import columnar
+
+pytest.importorskip("pyarrow")
+
+
+def _add_txs(session, start, count, month=1):
+    session.add_all(
+        [
+            models.Transaction(tx_hash=f"c{start + i}", date=date(2024, month, 1 + i % 28), description="x", amount=float(i))
+            for i in range(count)
+        ]
+    )
+    session.commit()
+
+
+def test_sync_is_incremental_and_partitioned(session, tmp_path):
+    _add_txs(session, 0, 5, month=1)
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 5
+    _add_txs(session, 5, 3, month=2)
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 3
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 0
+
+    months = sorted(p.name for p in (tmp_path / "transactions").glob("month=*"))
+    assert months == ["month=2024-01", "month=2024-02"]
+
+    table = columnar.read_arrow("transactions", ["date", "amount"], root=tmp_path)
+    assert table.num_rows == 8 and table.column_names == ["date", "amount"]
+    recent = columnar.read_arrow("transactions", ["amount"], since=date(2024, 2, 1), root=tmp_path)
+    assert recent.num_rows == 3
+
+
+def test_compaction_and_reset(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "MAX_PARTS_PER_MONTH", 2)
+    for i in range(4):
+        _add_txs(session, i * 2, 2)
+        columnar.sync_table(session, "transactions", root=tmp_path)
+    parts = list((tmp_path / "transactions" / "month=2024-01").glob("*.arrow"))
+    assert len(parts) <= 2
+    assert columnar.read_arrow("transactions", root=tmp_path).num_rows == 8
+
+    # A watermark ahead of the database means the mirror belongs to another database.
+    columnar._write_watermark(tmp_path / "transactions", 10_000)
+    columnar.sync_table(session, "transactions", root=tmp_path)
+    assert columnar.read_arrow("transactions", root=tmp_path).num_rows == 8
+
+
+def test_replaced_database_rebuilds_the_mirror(session, tmp_path):
+    _add_txs(session, 0, 4)
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 4
+
+    # Wiped and reloaded: ids restart and pass the old watermark, so only the last mirrored row tells.
+    session.execute(delete(models.Transaction))
+    session.commit()
+    session.add_all(
+        [models.Transaction(tx_hash=f"n{i}", date=date(2024, 3, 1), description="new", amount=1.0) for i in range(6)]
+    )
+    session.commit()
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 6
+    table = columnar.read_arrow("transactions", ["description"], root=tmp_path)
+    assert table["description"].to_pylist() == ["new"] * 6
+
+    # The same rows in another database file.
+    state = columnar._read_watermark(tmp_path / "transactions")
+    columnar._write_watermark(tmp_path / "transactions", state["max_id"], "sqlite:0:0", state["last_row"])
+    assert columnar.sync_table(session, "transactions", root=tmp_path) == 6
+
+
+def test_read_frame_matches_sql_fallback(session, tmp_path, monkeypatch):
+    _add_txs(session, 0, 4)
+    session.add(models.Run(rule_id=1, event_key="e", status="completed", trace={}))
+    session.commit()
+    arrow_df = columnar.read_frame(session, "runs", root=tmp_path)
+    monkeypatch.setattr(columnar, "pa", None)
+    sql_df = columnar.read_frame(session, "runs", root=tmp_path)
+    assert arrow_df[["id", "status"]].to_dict("records") == sql_df[["id", "status"]].to_dict("records")
+
+
+def test_concurrent_syncs_write_each_row_once(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    root = tmp_path / "columnar"
+    with factory() as session:
+        _add_txs(session, 0, 20)
+
+    def sync(batch_size):
+        with factory() as session:
+            columnar.sync_table(session, "transactions", root=root, batch_size=batch_size)
+
+    # The first sync pauses after its first part file, before moving the watermark, while a second
+    # sync with a different batch size runs; unserialized, both would mirror rows 1-5.
+    write_part = columnar._write_part
+    other = threading.Thread(target=sync, args=(100,))
+
+    def pausing_write_part(*args):
+        path = write_part(*args)
+        if other.ident is None:
+            other.start()
+            other.join(timeout=0.5)
+        return path
+
+    monkeypatch.setattr(columnar, "_write_part", pausing_write_part)
+    sync(5)
+    other.join()
+    engine.dispose()
+
+    ids = columnar.read_arrow("transactions", ["id"], root=root)["id"].to_pylist()
+    assert sorted(ids) == list(range(1, 21))
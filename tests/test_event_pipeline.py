@@ -0,0 +1,133 @@
+import io
+
+import pytest
+from sqlalchemy import func, select
+
+from db import models
+from services.event_queue import EventQueue, InProcessQueue, QueueFull, SQLiteQueue
+from services import event_worker
+from services.event_worker import process_batch, run_worker
+from services.imports import ingest_transactions
+from services.rules_engine import evaluate_rules_for_event
+
+CSV = b"date,description,amount\n2024-01-01,Payroll Deposit,2200\n2024-01-02,Coffee,-4\n2024-01-03,Payroll Deposit,2100\n"
+
+
+def _seed_rule(session):
+    session.add(
+        models.Rule(
+            name="Payroll",
+            trigger_type="transaction",
+            trigger_config={"description_contains": "Payroll"},
+            conditions=[],
+            actions=[{"type": "allocate_percent", "pod_id": 1, "percent": 10}],
+        )
+    )
+    session.commit()
+
+
+def _run_count(session):
+    return session.scalar(select(func.count()).select_from(models.Run))
+
+
+def test_import_publishes_and_worker_evaluates(session):
+    _seed_rule(session)
+    queue = SQLiteQueue(session)
+    result = ingest_transactions(session, io.BytesIO(CSV), publisher=queue)
+    assert queue.depth() == result["created"] == 3
+
+    totals = run_worker(session, queue, batch_size=2, idle_exit=1, idle_sleep=0)
+
+    assert totals == {"received": 3, "processed": 3, "failed": 0, "refused": 0, "dead_lettered": 0}
+    assert queue.depth() == 0
+    assert _run_count(session) == 2
+
+
+def test_redelivery_is_idempotent(session):
+    _seed_rule(session)
+    queue = InProcessQueue()
+    result = ingest_transactions(session, io.BytesIO(CSV), publisher=queue)
+    # Receive without acking, then let the visibility timeout lapse so the batch is redelivered.
+    for delivery in queue.receive(10, visibility_timeout=0):
+        evaluate_rules_for_event(session, delivery.event)
+
+    redelivered = queue.receive(10)
+    assert [d.attempts for d in redelivered] == [2, 2, 2]
+    for delivery in redelivered:
+        evaluate_rules_for_event(session, delivery.event)
+    queue.ack(redelivered)
+
+    assert queue.depth() == 0
+    assert len(result["events"]) == 3
+    assert _run_count(session) == 2
+
+
+def test_publish_applies_backpressure(session):
+    queue = SQLiteQueue(session, max_depth=2)
+    queue.publish([{"event_key": "a"}, {"event_key": "b"}])
+    with pytest.raises(QueueFull):
+        queue.publish([{"event_key": "c"}], timeout=0)
+
+
+def test_publish_larger_than_max_depth_goes_out_in_chunks():
+    class DrainedQueue(InProcessQueue):
+        # Workers that keep up: every chunk is consumed before the next one is offered.
+        def __init__(self):
+            super().__init__(max_depth=4)
+            self.chunks = []
+
+        def _put(self, events):
+            self.chunks.append(len(events))
+
+    queue = DrainedQueue()
+    assert queue.publish([{"event_key": str(i)} for i in range(10)], timeout=0) == 10
+    assert queue.chunks == [4, 4, 2]
+    with pytest.raises(TypeError):
+        EventQueue()
+
+
+def test_events_survive_a_failed_publish_in_the_outbox(session):
+    class OutageQueue(InProcessQueue):
+        down = True
+
+        def _put(self, events):
+            if self.down:
+                raise ConnectionError("queue unreachable")
+            super()._put(events)
+
+    _seed_rule(session)
+    queue = OutageQueue()
+    result = ingest_transactions(session, io.BytesIO(CSV), publisher=queue)
+    assert result["created"] == 3 and result["unpublished"] == 3
+    assert session.scalar(select(func.count()).select_from(models.OutboxEvent)) == 3
+
+    queue.down = False
+    totals = run_worker(session, queue, batch_size=10, idle_exit=1, idle_sleep=0)
+    assert totals["processed"] == 3
+    assert session.scalar(select(func.count()).select_from(models.OutboxEvent)) == 0
+    assert _run_count(session) == 2
+
+
+def test_events_that_keep_failing_are_dead_lettered(session, monkeypatch):
+    def evaluate(session, event, dry_run=True):
+        if event["event_key"] == "poison":
+            raise ValueError("bad event")
+
+    monkeypatch.setattr(event_worker, "evaluate_rules_for_event", evaluate)
+    queue = SQLiteQueue(session, max_attempts=2)
+    queue.publish([{"event_key": "poison"}, {"event_key": "ok"}])
+
+    first = process_batch(session, queue, visibility_timeout=0)
+    assert (first["processed"], first["failed"], first["dead_lettered"]) == (1, 1, 0)
+    second = process_batch(session, queue, visibility_timeout=0)
+    assert (second["failed"], second["dead_lettered"]) == (1, 1)
+    assert queue.depth() == 0
+    dead = session.scalars(select(models.DeadLetterEvent)).all()
+    assert [(d.event_key, d.attempts, d.reason) for d in dead] == [("poison", 2, "ValueError: bad event")]
+
+    # Refused events are retried the same way before they are dead-lettered.
+    other = InProcessQueue(tenant="bob", max_attempts=1)
+    other._put([{"event_key": "misrouted", "tenant": "alice"}])
+    assert process_batch(session, other)["dead_lettered"] == 1
+    assert other.depth() == 0
+    assert [attempts for _, attempts, _ in other.dead_letters] == [1]
@@ -0,0 +1,66 @@
+import csv
+import io
+
+import pytest
+
+from services.exports import (
+    export_rows,
+    export_runs,
+    iter_run_rows,
+    iter_simulation_rows,
+    run_columns,
+    simulation_columns,
+)
+from services.rules_engine import run_rule
+from tests.test_rules_engine import seed_rule
+
+
+def _seed_runs(session, n):
+    actions = [
+        {"type": "allocate_percent", "pod_id": 1, "percent": 10},
+        {"type": "allocate_fixed", "pod_id": 2, "amount": 5},
+    ]
+    rule, tx = seed_rule(session, actions=actions, conditions=[{"type": "amount_gte", "value": 100}])
+    for i in range(n):
+        run_rule(session, rule, {"event_key": f"e{i}", "type": "transaction"}, tx)
+    return rule
+
+
+def test_csv_export_pages_runs_and_flattens_traces(session):
+    _seed_runs(session, 7)
+    out = io.BytesIO()
+    assert export_runs(session, out, include_actions=True) == 14
+    rows = list(csv.DictReader(io.StringIO(out.getvalue().decode())))
+    assert rows[0]["action_type"] == "allocate_percent" and rows[0]["action_allocated"] == "20.0"
+    assert rows[1]["action_pod_id"] == "2" and rows[1]["opening_balance"] == "40.0"
+    assert rows[0]["conditions"] == "amount 200.0 >= 100"
+
+    # Paging by id must not drop or repeat runs across batch boundaries.
+    ids = [r["run_id"] for r in iter_run_rows(session, batch_size=3)]
+    assert ids == sorted(set(ids)) and len(ids) == 7
+
+
+def test_parquet_export_writes_one_row_group_per_batch(session):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _seed_runs(session, 5)
+    out = io.BytesIO()
+    export_rows(iter_run_rows(session, batch_size=2), run_columns(), out, fmt="parquet", batch_size=2)
+    out.seek(0)
+    parquet = pq.ParquetFile(out)
+    assert parquet.metadata.num_rows == 5 and parquet.num_row_groups == 3
+    assert parquet.read().column("status").to_pylist() == ["completed"] * 5
+
+
+def test_simulation_rows_include_runs_without_actions():
+    traces = [
+        {"transaction_id": 1, "status": "condition_failed", "trace": {"conditions": [{"ok": False, "message": "amount 5 >= 100"}]}},
+        {
+            "transaction_id": 2,
+            "status": "completed",
+            "trace": {"actions": [{"action": {"type": "allocate_fixed"}, "status": "success", "message": "ok", "payload": {"allocated": 5}}]},
+        },
+    ]
+    rows = list(iter_simulation_rows(traces, include_actions=True))
+    assert [(r["transaction_id"], r["action_type"]) for r in rows] == [(1, None), (2, "allocate_fixed")]
+    assert rows[0]["failed_condition"] == "amount 5 >= 100"
+    assert set(rows[0]) == set(simulation_columns(include_actions=True))
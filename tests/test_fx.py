@@ -0,0 +1,110 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from db import models
+from services import fx
+from services.fx import FxTable
+from services.rules_engine import run_rule
+
+RATES = pd.DataFrame(
+    {
+        "date": ["2024-01-01", "2024-02-01", "2024-01-01"],
+        "from_currency": ["EUR", "EUR", "USD"],
+        "to_currency": ["USD", "USD", "CAD"],
+        "rate": [1.10, 1.20, 1.25],
+    }
+)
+
+
+def test_as_of_lookup_and_inverse_pairs():
+    table = FxTable(RATES)
+    assert table.rate("EUR", "USD", date(2024, 1, 31)) == 1.10
+    assert table.rate("EUR", "USD", date(2024, 2, 1)) == 1.20
+    assert table.rate("CAD", "USD", date(2024, 3, 1)) == pytest.approx(0.8)
+    assert table.rate("EUR", "USD", date(2023, 12, 31)) is None
+    assert table.to_base(100, "usd", date(2024, 1, 1), "USD") == 100
+
+
+def test_convert_frame_is_one_asof_join_and_keeps_order():
+    table = FxTable(RATES)
+    df = pd.DataFrame(
+        {
+            "date": [date(2024, 2, 5), date(2024, 1, 5), date(2024, 1, 5), date(2024, 1, 5), date(2023, 6, 1)],
+            "amount": [10.0, 10.0, 12.5, 7.0, 3.0],
+            "currency": ["EUR", "EUR", "CAD", None, "EUR"],
+        }
+    )
+    out = table.convert_frame(df, "USD")
+    # No rate before 2024 for the last row, so it passes through unconverted.
+    assert out["amount_base"].round(6).tolist() == [12.0, 11.0, 10.0, 7.0, 3.0]
+
+
+def test_pairs_without_quotes_cross_through_usd(session, monkeypatch, caplog):
+    table = FxTable(RATES)
+    assert table.rate("EUR", "CAD", date(2024, 2, 5)) == pytest.approx(1.2 * 1.25)
+    assert table.rate("CAD", "EUR", date(2024, 1, 5)) == pytest.approx(1 / (1.1 * 1.25))
+    df = pd.DataFrame(
+        {
+            "date": [date(2024, 2, 5), date(2024, 1, 5), date(2024, 1, 5), date(2023, 6, 1)],
+            "amount": [10.0, 10.0, 10.0, 3.0],
+            "currency": ["EUR", "USD", "CAD", "EUR"],
+        }
+    )
+    assert table.convert_frame(df, "CAD")["amount_base"].round(6).tolist() == [15.0, 12.5, 10.0, 3.0]
+    empty = FxTable(pd.DataFrame(columns=fx.RATE_COLUMNS))
+    assert empty.convert_frame(df, "CAD")["amount_base"].tolist() == [10.0, 10.0, 10.0, 3.0]
+
+    # A batch passes its table in; a pair with no rate at all is reported once, not per transaction.
+    monkeypatch.setattr(fx, "load_fx_table", lambda path=None: pytest.fail("table reloaded per transaction"))
+    session.add(models.UserSettings(base_currency="CAD"))
+    session.commit()
+    txs = [models.Transaction(date=date(2024, 1, 5), amount=10, currency=c) for c in ["EUR", "GBP", "GBP"]]
+    caplog.clear()
+    with caplog.at_level("WARNING", logger="services.fx"):
+        amounts = [fx.tx_amount_in_base(session, tx, table) for tx in txs]
+    assert amounts == [pytest.approx(13.75), 10, 10]
+    assert len(caplog.records) == 1
+
+
+def test_rules_engine_uses_base_currency_amounts(session, monkeypatch):
+    monkeypatch.setattr(fx, "load_fx_table", lambda path=None: FxTable(RATES))
+    session.add(models.UserSettings(base_currency="USD"))
+    rule = models.Rule(
+        name="Big income",
+        trigger_type="transaction",
+        trigger_config={},
+        conditions=[{"type": "amount_gte", "value": 1050}],
+        actions=[{"type": "allocate_percent", "pod_id": 1, "percent": 10}],
+    )
+    tx = models.Transaction(tx_hash="eur", date=date(2024, 2, 3), description="Salary", amount=1000, currency="EUR")
+    session.add_all([rule, tx])
+    session.commit()
+
+    run, results = run_rule(session, rule, {"type": "transaction", "event_key": "fx1"}, tx)
+
+    assert run.status == "completed"
+    assert run.trace["fx"]["amount_base"] == pytest.approx(1200)
+    assert results[0].payload["allocated"] == 120.0
+
+
+def test_base_currency_follows_saved_settings(session):
+    settings = models.UserSettings(base_currency="usd")
+    session.add(settings)
+    session.flush()
+    assert fx.base_currency(session) == "USD"
+
+    settings.base_currency = "EUR"
+    session.flush()
+    assert fx.base_currency(session) == "EUR"
+    session.commit()
+
+    # Saved through another session: picked up once this session's transaction ends.
+    other = type(session)(bind=session.get_bind())
+    assert fx.base_currency(session) == "EUR"
+    other.get(models.UserSettings, settings.id).base_currency = "CAD"
+    other.commit()
+    other.close()
+    session.commit()
+    assert fx.base_currency(session) == "CAD"
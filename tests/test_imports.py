@@ -0,0 +1,64 @@
+import hashlib
+from datetime import date
+
+from sqlalchemy import func, select
+
+from db import models
+from services.imports import ingest_files, ingest_transactions
+
+
+def _write(tmp_path, name, rows):
+    path = tmp_path / name
+    path.write_text("date,description,amount,account\n" + "".join(f"{r}\n" for r in rows))
+    return path
+
+
+def test_multi_file_import_dedups_across_files_and_existing_rows(session, tmp_path):
+    jan = _write(tmp_path, "jan.csv", ["2024-01-01,Payroll,2200,chk", "2024-01-05,Coffee,-4,chk"])
+    # Statements overlap at month boundaries: the Coffee row appears again in February's file.
+    feb = _write(tmp_path, "feb.csv", ["2024-01-05,Coffee,-4,chk", "2024-02-01,Payroll,2200,chk", "2024-02-03,Rent,x,chk"])
+    bad = tmp_path / "notes.csv"
+    bad.write_text("memo\nhello\n")
+    ingest_transactions(session, _write(tmp_path, "old.csv", ["2024-01-01,Payroll,2200,chk"]))
+
+    result = ingest_files(session, [jan, feb, bad], names=["jan.csv", "feb.csv", "notes.csv"], max_workers=2)
+
+    assert result["created"] == 2
+    assert result["quarantined"] == 1 and result["errors"][0]["source"] == "feb.csv"
+    assert [f["rows"] for f in result["files"]] == [2, 2, 0]
+    assert "Missing required columns" in result["files"][2]["error"]
+    rows = session.execute(select(models.Transaction.description, models.Transaction.date).order_by(models.Transaction.id)).all()
+    assert [(d, day.month) for d, day in rows] == [("Payroll", 1), ("Coffee", 1), ("Payroll", 2)]
+    ids = [e["transaction_id"] for e in result["events"]]
+    assert ids == session.scalars(select(models.Transaction.id).where(models.Transaction.id > 1).order_by(models.Transaction.id)).all()
+    assert session.scalar(select(func.count()).select_from(models.QuarantinedRow)) == 1
+
+
+def test_same_row_in_files_with_different_dtypes_is_imported_once(session, tmp_path):
+    # pandas reads a.csv's amounts as float (-4.5) and b.csv's as int, and only b.csv has an account
+    # column; the canonical key still matches the Payroll row across both.
+    a = _write(tmp_path, "a.csv", ["2024-01-01,Payroll,2200,", "2024-01-02,Coffee,-4.5,"])
+    b = tmp_path / "b.csv"
+    b.write_text("date,description,amount\n2024-01-01,Payroll ,2200\n2024-01-03,Rent,-1500\n")
+
+    result = ingest_files(session, [a, b])
+
+    assert result["created"] == 3
+    assert session.scalars(select(models.Transaction.description).order_by(models.Transaction.id)).all() == [
+        "Payroll",
+        "Coffee",
+        "Rent",
+    ]
+    assert session.scalar(select(models.Transaction.tx_hash).where(models.Transaction.description == "Payroll")) == (
+        hashlib.sha1(b"2024-01-01|Payroll|2200.00|").hexdigest()
+    )
+
+
+def test_rows_stored_under_legacy_keys_are_not_reimported(session, tmp_path):
+    # Keys the original per-row importer stored: raw values, so "2200" and "None" for a missing account.
+    legacy = hashlib.sha1(f"{date(2024, 1, 2)}|Payroll Deposit|2200|None".encode()).hexdigest()
+    session.add(models.Transaction(tx_hash=legacy, date=date(2024, 1, 2), description="Payroll Deposit", amount=2200))
+    session.commit()
+    path = tmp_path / "b.csv"
+    path.write_text("date,description,amount\n2024-01-02,Payroll Deposit,2200\n")
+    assert ingest_files(session, [path])["created"] == 0
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from db import models
+from db.engine import Base
+from services import columnar, jobs
+from services.jobs import JobRunner, save_upload
+
+
+@pytest.fixture(autouse=True)
+def columnar_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "ROOT", tmp_path / "columnar")
+
+
+@pytest.fixture()
+def factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _wait(runner, session, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.status(session, job_id)
+        if job["status"] not in jobs.ACTIVE_STATUSES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_import_job_runs_in_background(factory, tmp_path):
+    csv = b"date,description,amount\n2024-01-01,Payroll Deposit,2200\n2024-01-02,Coffee,-4\n"
+    path = save_upload("feed.csv", csv, upload_dir=tmp_path / "uploads")
+    runner = JobRunner(factory)
+    with factory() as session:
+        job_id = runner.submit("import", {"path": str(path), "delete_after": True})
+        job = _wait(runner, session, job_id)
+        assert job["status"] == "succeeded" and job["progress"] == 1.0
+        assert job["result"] == {"created": 2, "events": 2, "unpublished": 0, "quarantined": 0, "errors": []}
+        assert session.scalar(select(func.count()).select_from(models.Transaction)) == 2
+    assert not path.exists()
+    assert columnar.read_arrow("transactions").num_rows == 2
+    runner.shutdown()
+
+
+def test_import_job_accepts_several_files(factory, tmp_path):
+    paths = [
+        save_upload(name, body, upload_dir=tmp_path / "uploads")
+        for name, body in [
+            ("jan.csv", b"date,description,amount\n2024-01-01,Payroll,2200\n"),
+            ("feb.csv", b"date,description,amount\n2024-01-01,Payroll,2200\n2024-02-01,Payroll,2200\n"),
+        ]
+    ]
+    runner = JobRunner(factory)
+    with factory() as session:
+        job_id = runner.submit("import", {"paths": [str(p) for p in paths], "names": ["jan.csv", "feb.csv"], "delete_after": True})
+        job = _wait(runner, session, job_id)
+        assert job["status"] == "succeeded"
+        assert job["result"]["created"] == 2
+        assert [f["source"] for f in job["result"]["files"]] == ["jan.csv", "feb.csv"]
+    assert not any(p.exists() for p in paths)
+    runner.shutdown()
+
+
+def test_cancel_stops_job_and_rolls_back(factory, monkeypatch):
+    started = threading.Event()
+
+    def slow(session, params, progress):
+        session.add(models.Pod(name="half-done"))
+        session.flush()
+        started.set()
+        for i in range(500):
+            progress(i / 500, f"step {i}")
+            time.sleep(0.01)
+        return {}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "slow", slow)
+    runner = JobRunner(factory)
+    with factory() as session:
+        job_id = runner.submit("slow")
+        assert started.wait(5)
+        runner.cancel(job_id)
+        job = _wait(runner, session, job_id)
+        assert job["status"] == "cancelled"
+        assert session.scalar(select(func.count()).select_from(models.Pod)) == 0
+    runner.shutdown()
+
+
+def test_failed_job_records_error(factory, monkeypatch):
+    def boom(session, params, progress):
+        raise RuntimeError("bad file")
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "boom", boom)
+    runner = JobRunner(factory)
+    with factory() as session:
+        job = _wait(runner, session, runner.submit("boom"))
+    assert job["status"] == "failed" and job["error"] == "bad file"
+    runner.shutdown()
+
+
+def test_cancelled_simulation_and_demo_leave_nothing_behind(session, tmp_path, monkeypatch):
+    from services import simulator
+
+    def cancel_at(fraction):
+        def progress(value, message=None):
+            if value >= fraction:
+                raise jobs.JobCancelled()
+
+        return progress
+
+    with pytest.raises(jobs.JobCancelled):
+        jobs._demo_job(session, {"root_path": str(tmp_path)}, cancel_at(0.8))
+    session.rollback()
+    assert session.scalar(select(func.count()).select_from(models.Transaction)) == 0
+    assert session.scalar(select(func.count()).select_from(models.Account)) == 0
+
+    jobs._demo_job(session, {"root_path": str(tmp_path)}, lambda *args: None)
+    rule_id = session.scalar(select(models.Rule.id).where(models.Rule.name == "Income to Essentials"))
+    monkeypatch.setattr(simulator, "PROGRESS_EVERY", 1)
+    with pytest.raises(jobs.JobCancelled):
+        jobs._simulate_job(session, {"rule_id": rule_id, "days": 400}, cancel_at(0.01))
+    session.rollback()
+    assert session.scalar(select(func.count()).select_from(models.Run)) == 0
+
+
+def test_new_runner_only_fails_jobs_of_exited_processes(factory, monkeypatch):
+    host = jobs.socket.gethostname()
+    with factory() as session:
+        session.add_all(
+            [
+                models.Job(kind="import", status="running", owner=f"{host}:{jobs.os.getpid()}"),
+                models.Job(kind="import", status="queued", owner="other-host:1"),
+                models.Job(kind="import", status="running", owner=f"{host}:999999999"),
+                models.Job(kind="import", status="running"),
+            ]
+        )
+        session.commit()
+    runner = JobRunner(factory)
+    with factory() as session:
+        statuses = session.scalars(select(models.Job.status).order_by(models.Job.id)).all()
+    assert statuses == ["running", "queued", "failed", "failed"]
+    runner.shutdown()
@@ -0,0 +1,160 @@
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from db import models
+from db.engine import Base
+from services.ledger import balance_as_of, balances, current_balance, post_entry, record_snapshot
+from services.rules_engine import run_rule
+
+
+def test_running_balances_and_as_of_reads(session):
+    pod = models.Pod(name="Goals", current_balance=100, created_at=datetime(2024, 1, 1))
+    session.add(pod)
+    session.commit()
+
+    post_entry(session, "pod", pod.id, 50, entry_at=datetime(2024, 2, 1))
+    post_entry(session, "pod", pod.id, -20, entry_at=datetime(2024, 3, 1))
+    # Backdated entry shifts the materialized balances that follow it.
+    post_entry(session, "pod", pod.id, 5, entry_at=datetime(2024, 1, 15))
+    session.commit()
+
+    assert current_balance(session, "pod", pod.id) == 135
+    assert pod.current_balance == 135
+    assert balance_as_of(session, "pod", pod.id, date(2023, 12, 31)) is None
+    assert balance_as_of(session, "pod", pod.id, date(2024, 1, 20)) == 105
+    assert balance_as_of(session, "pod", pod.id, date(2024, 2, 1)) == 155
+    assert balance_as_of(session, "pod", pod.id, date(2024, 3, 1)) == 135
+    sources = session.scalars(select(models.LedgerEntry.source).order_by(models.LedgerEntry.entry_at)).all()
+    assert sources == ["opening", "adjustment", "adjustment", "adjustment"]
+
+
+def test_concurrent_posts_to_one_owner_both_land(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    Base.metadata.create_all(bind=engine)
+    make_session = sessionmaker(bind=engine)
+    with make_session() as setup:
+        pod = models.Pod(name="Goals", current_balance=100, created_at=datetime(2024, 1, 1))
+        setup.add(pod)
+        setup.commit()
+        pod_id = pod.id
+        post_entry(setup, "pod", pod_id, 0, entry_at=datetime(2024, 1, 2))
+        setup.commit()
+
+    # Two workers: the second has read the balance before the first one's post commits.
+    with make_session() as first, make_session() as second:
+        loaded = second.get(models.LedgerBalance, ("pod", pod_id))
+        assert loaded.balance == 100
+        post_entry(first, "pod", pod_id, 5, entry_at=datetime(2024, 2, 1))
+        first.commit()
+        entry = post_entry(second, "pod", pod_id, 7, entry_at=datetime(2024, 2, 2))
+        second.commit()
+        assert entry.balance_after == 112
+
+    with make_session() as check:
+        assert current_balance(check, "pod", pod_id) == 112
+        assert check.get(models.Pod, pod_id).current_balance == 112
+    engine.dispose()
+
+
+def test_balances_reads_many_owners_in_one_query(session):
+    pods = [models.Pod(name=f"P{i}", current_balance=10 * i, created_at=datetime(2024, 1, 1)) for i in range(3)]
+    session.add_all(pods)
+    session.commit()
+    post_entry(session, "pod", pods[1].id, 5, entry_at=datetime(2024, 2, 1))
+    post_entry(session, "pod", pods[1].id, 7, entry_at=datetime(2024, 2, 1))
+    post_entry(session, "pod", pods[2].id, -3, entry_at=datetime(2024, 3, 1))
+    session.commit()
+    ids = [p.id for p in pods] + [99]
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(session.get_bind(), "before_cursor_execute", record)
+    current = balances(session, "pod", ids)
+    as_of = balances(session, "pod", ids, date(2024, 2, 15))
+    event.remove(session.get_bind(), "before_cursor_execute", record)
+
+    assert len(statements) == 2
+    assert current == {pods[0].id: 0.0, pods[1].id: 22.0, pods[2].id: 17.0, 99: 0.0}
+    assert current == {i: current_balance(session, "pod", i) for i in ids}
+    assert as_of == {pods[0].id: 0.0, pods[1].id: 22.0, pods[2].id: 20.0, 99: 0.0}
+    assert as_of == {i: balance_as_of(session, "pod", i, date(2024, 2, 15)) or 0.0 for i in ids}
+
+
+def test_snapshots_reconcile_and_live_runs_post_allocations(session):
+    record_snapshot(session, "account", 1, 1000, snapshot_at=datetime(2024, 1, 1))
+    record_snapshot(session, "account", 1, 900, snapshot_at=datetime(2024, 2, 1))
+    session.commit()
+    assert current_balance(session, "account", 1) == 900
+    assert balance_as_of(session, "account", 1, date(2024, 1, 31)) == 1000
+
+    pod = models.Pod(name="Bills", current_balance=0)
+    rule = models.Rule(
+        name="Top up",
+        trigger_type="manual",
+        actions=[{"type": "top_up_pod", "pod_id": 1, "target": 300}],
+        conditions=[],
+    )
+    session.add_all([pod, rule])
+    session.commit()
+
+    dry, _ = run_rule(session, rule, {"type": "manual", "event_key": "dry"}, dry_run=True)
+    assert current_balance(session, "pod", pod.id) == 0
+    live, results = run_rule(session, rule, {"type": "manual", "event_key": "live"}, dry_run=False)
+    assert results[0].payload["allocated"] == 300
+    assert current_balance(session, "pod", pod.id) == 300
+    entry = session.scalar(select(models.LedgerEntry).where(models.LedgerEntry.owner_type == "pod"))
+    assert (entry.run_id, entry.source) == (live.id, "allocation")
+    # The next top-up sees the ledger balance and suggests nothing.
+    _, again = run_rule(session, rule, {"type": "manual", "event_key": "live2"}, dry_run=False)
+    assert again[0].payload["allocated"] == 0
+
+
+def test_simulation_uses_balance_in_effect_on_each_transaction_date(session):
+    from datetime import timedelta
+
+    from services.ledger import BalanceSeries
+    from services.simulator import simulate_rule
+
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    session.add_all(
+        [
+            models.BalanceSnapshot(source_type="account", source_id=1, balance=20, snapshot_at=today - timedelta(days=10)),
+            models.BalanceSnapshot(source_type="account", source_id=1, balance=500, snapshot_at=today - timedelta(days=2)),
+            models.Rule(
+                name="Sweep",
+                trigger_type="transaction",
+                trigger_config={},
+                conditions=[{"type": "balance_gte", "value": 100}],
+                actions=[{"type": "allocate_fixed", "pod_id": 1, "amount": 50, "up_to_available": True}],
+            ),
+        ]
+    )
+    for i, days_ago in enumerate([12, 5, 1]):
+        session.add(
+            models.Transaction(tx_hash=f"s{i}", date=(today - timedelta(days=days_ago)).date(), description="Pay", amount=10)
+        )
+    session.commit()
+
+    series = BalanceSeries.load(session)
+    assert series.at_many([today - timedelta(days=11), today - timedelta(days=5), today]) == [None, 20.0, 500.0]
+
+    report = simulate_rule(session, session.scalar(select(models.Rule.id)), days=30)
+    assert [t["status"] for t in report.traces] == ["condition_failed", "condition_failed", "completed"]
+    assert [t["trace"]["ledger"]["opening_balance"] for t in report.traces] == [None, 20.0, 500.0]
+
+    # A rerun reuses the runs of the first one, found in one query rather than one per transaction.
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(session.get_bind(), "before_cursor_execute", record)
+    again = simulate_rule(session, session.scalar(select(models.Rule.id)), days=30)
+    event.remove(session.get_bind(), "before_cursor_execute", record)
+    assert [t["status"] for t in again.traces] == ["condition_failed", "condition_failed", "completed"]
+    assert sum("FROM runs" in s for s in statements) == 1
@@ -0,0 +1,40 @@
+from datetime import date
+
+from db import models
+from services.metrics import NULL_TIMER, MetricsRegistry, registry
+from services.rules_engine import run_rule
+
+
+def test_disabled_registry_records_nothing():
+    reg = MetricsRegistry(enabled=False)
+    assert reg.timer("x", rule_id=1) is NULL_TIMER
+    reg.inc("y", status="completed")
+    assert reg.render_prometheus() == ""
+
+
+def test_run_rule_records_stage_histograms_and_status_counts(session):
+    registry.reset()
+    registry.enabled = True
+    try:
+        rule = models.Rule(
+            name="R1",
+            trigger_type="transaction",
+            trigger_config={"description_contains": "Payroll"},
+            conditions=[{"type": "amount_gte", "value": 100}],
+            actions=[{"type": "allocate_percent", "pod_id": 1, "percent": 10}],
+        )
+        tx = models.Transaction(tx_hash="m", date=date(2024, 1, 1), description="Payroll Deposit", amount=200)
+        session.add_all([rule, tx])
+        session.commit()
+        run_rule(session, rule, {"event_key": "m1", "type": "transaction"}, tx)
+        run_rule(session, rule, {"event_key": "m1", "type": "transaction"}, tx)
+        text = registry.render_prometheus()
+    finally:
+        registry.enabled = False
+        registry.reset()
+
+    assert "# TYPE flowledger_trigger_match_seconds histogram" in text
+    assert 'flowledger_condition_check_seconds_count{condition_type="amount_gte",rule_id="1"} 1' in text
+    assert 'flowledger_action_execution_seconds_bucket{action_type="allocate_percent",rule_id="1",le="+Inf"} 1' in text
+    assert 'flowledger_runs_total{rule_id="1",status="completed"} 1' in text
+    assert 'flowledger_runs_total{rule_id="1",status="duplicate"} 1' in text
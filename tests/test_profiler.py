@@ -0,0 +1,39 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from db import models
+from db.profiler import assert_max_queries, profile_queries, statement_shape
+from services.rules_engine import run_rule
+
+
+def test_statement_shape_groups_literals_and_in_lists():
+    a = statement_shape("SELECT * FROM runs WHERE rule_id = 1 AND event_key IN (?, ?, ?)")
+    b = statement_shape("SELECT  *  FROM runs WHERE rule_id = 22 AND event_key IN (?, ?)")
+    assert a == b
+
+
+def test_profile_flags_repeated_selects_as_n_plus_one(session):
+    rule = models.Rule(name="R", trigger_type="transaction", trigger_config={}, conditions=[], actions=[])
+    session.add(rule)
+    session.add_all(
+        [models.Transaction(tx_hash=f"h{i}", date=date(2024, 1, 1), description="x", amount=1) for i in range(6)]
+    )
+    session.commit()
+    txs = session.scalars(select(models.Transaction)).all()
+
+    with profile_queries(session, label="loop") as profile:
+        for tx in txs:
+            run_rule(session, rule, {"type": "transaction", "event_key": f"tx:{tx.id}"}, tx)
+
+    assert profile.count >= 12
+    assert any("FROM runs" in s.shape for s in profile.likely_n_plus_one())
+
+
+def test_assert_max_queries(session):
+    with assert_max_queries(session, 1):
+        session.scalars(select(models.Rule)).all()
+    with pytest.raises(AssertionError, match="at most 0 queries"):
+        with assert_max_queries(session, 0):
+            session.scalars(select(models.Rule)).all()
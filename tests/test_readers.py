@@ -0,0 +1,54 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from services.imports import ingest_transactions
+from services.readers import detect_format, read_transactions_frame
+
+OFX = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>EUR
+<BANKACCTFROM><BANKID>1<ACCTID>ACC-9<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240115120000[-5:EST]<TRNAMT>2200.00<FITID>1<NAME>Payroll Deposit</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240116<TRNAMT>-4.50<FITID>2<MEMO>Coffee Spot</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def test_parquet_reader_projects_columns(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "dump.parquet"
+    pd.DataFrame(
+        {"Date": ["2024-01-01"], "Description": ["Payroll"], "Amount": [10.0], "internal_blob": ["x" * 100]}
+    ).to_parquet(path)
+
+    df = read_transactions_frame(path)
+
+    assert list(df.columns) == ["Date", "Description", "Amount"]
+    with path.open("rb") as f:
+        assert detect_format(io.BytesIO(f.read())) == "parquet"
+
+
+def test_ofx_reader_streams_sgml_statement(monkeypatch):
+    monkeypatch.setattr("services.readers.OFX_CHUNK", 16)
+    source = io.BytesIO(OFX)
+    assert detect_format(source) == "ofx"
+
+    df = read_transactions_frame(source)
+
+    assert df["date"].tolist() == [date(2024, 1, 15), date(2024, 1, 16)]
+    assert df["description"].tolist() == ["Payroll Deposit", "Coffee Spot"]
+    assert df["amount"].tolist() == [2200.0, -4.5]
+    assert set(df["account"]) == {"ACC-9"} and set(df["currency"]) == {"EUR"}
+    assert df["merchant"].iloc[0] == "Payroll Deposit" and pd.isna(df["merchant"].iloc[1])
+
+
+def test_ingest_accepts_ofx(session, tmp_path):
+    path = tmp_path / "statement.qfx"
+    path.write_bytes(OFX)
+    assert ingest_transactions(session, path)["created"] == 2
+    assert ingest_transactions(session, path)["created"] == 0
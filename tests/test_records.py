@@ -0,0 +1,33 @@
+import sys
+from datetime import date
+
+from db import models
+from services.records import TxRecord, as_tx_record, get_tx_record, load_tx_records
+from services.rules_engine import evaluate_rules_for_event, run_rule
+from tests.test_rules_engine import seed_rule
+
+
+def test_records_load_only_needed_columns_and_stay_out_of_identity_map(session):
+    _, tx = seed_rule(session, conditions=[])
+    session.add(models.Transaction(tx_hash="old", date=date(2023, 1, 1), description="Old", amount=5))
+    session.commit()
+    tx_id = tx.id
+    session.expunge_all()
+
+    records = load_tx_records(session, since=date(2023, 6, 1))
+    assert records == [TxRecord(tx_id, date(2024, 1, 1), "Payroll Deposit", 200.0, None)]
+    assert get_tx_record(session, tx_id) == records[0]
+    assert len(session.identity_map) == 0
+    assert not hasattr(records[0], "__dict__")
+    assert sys.getsizeof(records[0]) < 100
+
+
+def test_engine_gives_same_result_for_record_and_orm_row(session):
+    rule, tx = seed_rule(session, conditions=[{"type": "amount_gte", "value": 100}])
+    orm_run, orm_results = run_rule(session, rule, {"event_key": "orm", "type": "transaction"}, tx)
+    rec_run, rec_results = run_rule(session, rule, {"event_key": "rec", "type": "transaction"}, as_tx_record(tx))
+    assert orm_run.trace == rec_run.trace
+    assert [r.payload for r in orm_results] == [r.payload for r in rec_results]
+
+    runs = evaluate_rules_for_event(session, {"type": "transaction", "event_key": "evt", "transaction_id": tx.id})
+    assert runs[0].trace == orm_run.trace
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime, timedelta
+
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, update
+
+from db import models
+from services.retention import RetentionPolicy, apply_retention
+from services.rules_engine import run_rule
+from tests.test_rules_engine import seed_rule
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def _seed(session, ages):
+    actions = [
+        {"type": "allocate_percent", "pod_id": 1, "percent": 10},
+        {"type": "allocate_fixed", "pod_id": 2, "amount": 5},
+    ]
+    rule, tx = seed_rule(session, actions=actions, conditions=[])
+    for i, days in enumerate(ages):
+        run, _ = run_rule(session, rule, {"event_key": f"e{i}", "type": "transaction"}, tx)
+        session.execute(update(models.Run).where(models.Run.id == run.id).values(created_at=NOW - timedelta(days=days)))
+        session.add(models.ErrorLog(run_id=run.id, message="boom", details={"i": i}))
+    session.commit()
+    return rule, tx
+
+
+def _count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def test_compacts_old_runs_into_summaries_and_archive(session, tmp_path):
+    rule, tx = _seed(session, [40, 40, 35, 5])
+    policy = RetentionPolicy(detail_days=30, archive_dir=tmp_path, batch_size=2)
+    report = apply_retention(session, policy, now=NOW)
+
+    assert report.runs_compacted == 3
+    assert report.action_results_deleted == 6
+    assert report.error_logs_deleted == 3
+    # Identity rows stay, so a redelivered event is still recognised as a duplicate.
+    assert _count(session, models.Run) == 4
+    assert _count(session, models.ActionResult) == 2
+    session.expire_all()
+    old = session.scalar(select(models.Run).where(models.Run.event_key == "e0"))
+    assert old.trace == {"compacted": True}
+    again, results = run_rule(session, rule, {"event_key": "e0", "type": "transaction"}, tx)
+    assert again.id == old.id and results == []
+
+    summaries = {s.day.isoformat(): s for s in session.scalars(select(models.RunDailySummary))}
+    assert set(summaries) == {"2024-04-22", "2024-04-27"}
+    day = summaries["2024-04-22"]
+    assert (day.runs, day.actions, day.errors, day.allocated) == (2, 4, 2, 50.0)
+
+    archived = pq.read_table(tmp_path / "runs").to_pylist()
+    assert sorted(r["event_key"] for r in archived) == ["e0", "e1", "e2"]
+    assert json.loads(archived[0]["trace"])["trigger"] is True
+    assert len(pq.read_table(tmp_path / "action_results")) == 6
+
+
+def test_rerun_only_compacts_new_rows(session, tmp_path):
+    _seed(session, [40, 5])
+    policy = RetentionPolicy(detail_days=30, archive=False, archive_dir=tmp_path)
+    assert apply_retention(session, policy, now=NOW).runs_compacted == 1
+    assert apply_retention(session, policy, now=NOW).runs_compacted == 0
+    assert apply_retention(session, policy, now=NOW + timedelta(days=30)).runs_compacted == 1
+    assert session.scalar(select(func.sum(models.RunDailySummary.runs))) == 2
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+
+from db import models
+from services import rule_compiler
+from services.rule_compiler import (
+    ActionOutcome,
+    RuleValidationError,
+    compiled_rule,
+    ensure_valid,
+    register_action,
+    validate_rule,
+)
+from services.rules_engine import run_rule
+from tests.test_rules_engine import seed_rule
+
+
+def test_validation_reports_unknown_types_and_bad_values():
+    errors = validate_rule(
+        "transaction",
+        {},
+        [{"type": "amount_gte", "value": "lots"}, {"type": "weekday_eq", "value": 1}],
+        [{"type": "allocate_fixed", "amount": 5}, "nope"],
+    )
+    assert errors[0].startswith("Condition 1 (amount_gte)")
+    assert errors[1].startswith("Condition 2: unknown type 'weekday_eq'")
+    assert errors[2] == "Action 1 (allocate_fixed): missing 'pod_id'"
+    assert errors[3] == "Action 2: must be a JSON object"
+    with pytest.raises(RuleValidationError):
+        ensure_valid("cron", {}, [], [])
+    assert validate_rule("schedule", {"freq": "fortnightly"}, [], []) == ["Trigger config: unknown freq 'fortnightly'"]
+    assert validate_rule("schedule", {"freq": "weekly"}, [], [{"type": "liability_suggestion"}]) == []
+
+
+def test_compiled_rule_is_cached_until_content_changes(session):
+    rule, _ = seed_rule(session)
+    first = compiled_rule(rule)
+    assert compiled_rule(rule) is first
+    rule.conditions = [{"type": "amount_gte", "value": 500}]
+    session.commit()
+    second = compiled_rule(rule)
+    assert second is not first and second.content_hash != first.content_hash
+    rule_compiler.invalidate(rule.id)
+    assert compiled_rule(rule) is not second
+
+
+
+def test_content_hash_is_computed_once_per_definition(session, monkeypatch):
+    rule, _ = seed_rule(session)
+    calls = []
+    hash_rule = rule_compiler.content_hash
+    monkeypatch.setattr(rule_compiler, "content_hash", lambda r: calls.append(r) or hash_rule(r))
+    first = compiled_rule(rule)
+    for _ in range(5):
+        assert compiled_rule(rule) is first
+    assert len(calls) <= 1
+
+    # Edited through another session: seen once this session reloads the row.
+    other = type(session)(bind=session.get_bind())
+    other.get(models.Rule, rule.id).conditions = [{"type": "amount_gte", "value": 1}]
+    other.commit()
+    other.close()
+    session.expire(rule)
+    assert compiled_rule(rule) is not first
+
+def test_registered_action_plugin_runs_in_engine(session):
+    @register_action("round_up")
+    def _round_up(config):
+        pod_id = config["pod_id"]
+
+        def run(session, ctx, allocated):
+            spare = round(-ctx.amount % 1, 2)
+            return ActionOutcome("success", f"Round up {spare}", {"allocated": spare, "pod_id": pod_id}, spare)
+
+        return run
+
+    try:
+        actions, conditions = [{"type": "round_up", "pod_id": 1}], [{"type": "amount_lte", "value": 0}]
+        assert validate_rule("transaction", {}, conditions, actions) == []
+        rule, _ = seed_rule(session, actions=actions, conditions=conditions)
+        tx = models.Transaction(tx_hash="c", date=date(2024, 1, 2), description="Payroll coffee", amount=-3.4)
+        run, results = run_rule(session, rule, {"event_key": "ru", "type": "transaction"}, tx)
+        assert run.status == "completed"
+        assert results[0].payload == {"allocated": 0.4, "pod_id": 1}
+    finally:
+        rule_compiler.ACTIONS.pop("round_up")
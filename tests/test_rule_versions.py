@@ -0,0 +1,95 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from db import models
+from services.rule_compiler import RuleValidationError
+from services.rule_versions import diff_rule_versions, list_versions, record_version
+
+
+def seed(session):
+    rule = models.Rule(
+        name="Payday",
+        priority=100,
+        trigger_type="transaction",
+        trigger_config={"description_contains": "payroll"},
+        conditions=[{"type": "amount_gte", "value": 100}],
+        actions=[{"type": "allocate_fixed", "pod_id": 1, "amount": 50, "up_to_available": True}],
+    )
+    session.add(rule)
+    recent = date.today() - timedelta(days=5)
+    session.add(
+        models.BalanceSnapshot(source_type="account", source_id=1, balance=500, snapshot_at=datetime.combine(recent, time.min))
+    )
+    for i, (description, amount) in enumerate([("Payroll ACME", 2000), ("Payroll bonus", 80), ("Coffee", -4)]):
+        session.add(models.Transaction(tx_hash=f"v{i}", date=recent, description=description, amount=amount))
+    session.commit()
+    return rule
+
+
+def test_record_version_skips_unchanged_definitions(session):
+    rule = seed(session)
+    assert record_version(session, rule).version == 1
+    session.commit()
+    assert record_version(session, rule) is None
+    rule.actions = [{"type": "allocate_fixed", "pod_id": 1, "amount": 75}]
+    assert record_version(session, rule).version == 2
+    session.commit()
+    assert [v.version for v in list_versions(session, rule.id)] == [2, 1]
+
+
+def test_diff_reports_only_changed_outcomes(session):
+    rule = seed(session)
+    draft = {
+        "name": rule.name,
+        "priority": rule.priority,
+        "trigger_type": rule.trigger_type,
+        "trigger_config": rule.trigger_config,
+        "conditions": [{"type": "amount_gte", "value": 50}],
+        "actions": rule.actions + [{"type": "liability_suggestion", "title": "Review payday"}],
+    }
+    report = diff_rule_versions(session, rule, draft)
+
+    assert report.old_label == "current" and report.new_label == "draft"
+    assert report.transactions_scanned == 2
+    by_description = {c["description"]: c for c in report.changed}
+    assert by_description["Payroll ACME"]["changes"] == ["tasks"]
+    assert by_description["Payroll bonus"]["changes"] == ["status", "allocated", "tasks"]
+    assert by_description["Payroll bonus"]["old"]["status"] == "condition_failed"
+    assert by_description["Payroll bonus"]["new"]["allocated"] == {"1": 50.0}
+    assert report.summary["old_total_allocated"] == 50.0
+    assert report.summary["new_total_allocated"] == 100.0
+    assert report.summary["new_tasks"] == 2
+    # A dry comparison: nothing is written.
+    assert session.scalar(select(func.count()).select_from(models.Run)) == 0
+    assert session.scalar(select(func.count()).select_from(models.LedgerEntry)) == 0
+
+
+def test_diff_scans_union_of_trigger_matches(session):
+    rule = seed(session)
+    record_version(session, rule)
+    session.commit()
+    old = list_versions(session, rule.id)[0]
+    draft = {**{f: getattr(rule, f) for f in ("name", "priority", "trigger_type", "conditions", "actions")}}
+    draft["trigger_config"] = {"description_contains": "coffee"}
+    draft["conditions"] = []
+
+    report = diff_rule_versions(session, old, draft)
+    assert report.old_label == "v1"
+    assert report.transactions_scanned == 3
+    assert {c["description"] for c in report.changed} == {"Payroll ACME", "Payroll bonus", "Coffee"}
+    assert report.summary["status_changes"] == 3
+
+
+def test_diff_rejects_invalid_drafts_and_survives_malformed_versions(session):
+    rule = seed(session)
+    draft = {f: getattr(rule, f) for f in ("name", "priority", "trigger_type", "conditions", "actions")}
+    with pytest.raises(RuleValidationError):
+        diff_rule_versions(session, rule, {**draft, "trigger_config": ["payroll"]})
+
+    # A stored version saved before validation existed: its trigger never fires instead of crashing.
+    legacy = models.RuleVersion(rule_id=rule.id, version=1, content_hash="x", **draft, trigger_config=["payroll"])
+    report = diff_rule_versions(session, legacy, rule)
+    assert report.transactions_scanned == 2
+    assert {c["old"]["status"] for c in report.changed} == {"skipped"}
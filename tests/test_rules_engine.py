@@ -53,8 +53,72 @@ def test_percent_rounding_and_up_to(session):
     assert results[1].status == "failed"
 
 
+def test_percent_after_fixed_uses_transaction_amount(session):
+    actions = [
+        {"type": "allocate_fixed", "pod_id": 1, "amount": 10},
+        {"type": "allocate_percent", "pod_id": 1, "percent": 50},
+    ]
+    rule, tx = seed_rule(session, actions=actions, conditions=[])
+    _, results = run_rule(session, rule, {"event_key": "e3", "type": "transaction"}, tx)
+    assert results[1].payload["allocated"] == 100.0
+
+
 def test_idempotent_run_creation(session):
     rule, tx = seed_rule(session, conditions=[])
     run1, _ = run_rule(session, rule, {"event_key": "same", "type": "transaction"}, tx)
     run2, _ = run_rule(session, rule, {"event_key": "same", "type": "transaction"}, tx)
     assert run1.id == run2.id
+
+
+def test_event_rules_share_one_ledger_and_commit_once(session):
+    from sqlalchemy import event as sa_event
+
+    from services.rules_engine import evaluate_rules_for_event
+
+    rule, tx = seed_rule(session, conditions=[])
+    rule.actions = [{"type": "allocate_fixed", "pod_id": 1, "amount": 30, "up_to_available": True}]
+    rule.priority = 200
+    session.add(
+        models.Rule(
+            name="R2",
+            trigger_type="transaction",
+            trigger_config={},
+            conditions=[],
+            actions=[{"type": "allocate_fixed", "pod_id": 1, "amount": 25, "up_to_available": True}],
+        )
+    )
+    session.commit()
+
+    commits = []
+    sa_event.listen(session, "after_commit", lambda s: commits.append(1))
+    runs = evaluate_rules_for_event(session, {"type": "transaction", "event_key": "pay", "transaction_id": tx.id})
+    assert len(commits) == 1
+    assert [r.trace["actions"][0]["payload"]["allocated"] for r in runs] == [30.0, 10.0]
+    assert runs[1].trace["ledger"] == {
+        "opening_balance": 40.0,
+        "allocated_before": 30.0,
+        "available_before": 10.0,
+        "allocated": 10.0,
+        "available_after": 0.0,
+    }
+    again = evaluate_rules_for_event(session, {"type": "transaction", "event_key": "pay", "transaction_id": tx.id})
+    assert [r.id for r in again] == [r.id for r in runs]
+
+
+def test_event_matches_each_rule_trigger_once(session, monkeypatch):
+    from services import rule_compiler
+    from services.rules_engine import evaluate_rules_for_event
+
+    calls = []
+    factory = rule_compiler.TRIGGERS["transaction"]
+
+    def counting(config):
+        trigger = factory(config)
+        return lambda event, tx: calls.append(1) or trigger(event, tx)
+
+    monkeypatch.setitem(rule_compiler.TRIGGERS, "transaction", counting)
+    rule_compiler.invalidate(session=session)
+    _, tx = seed_rule(session, conditions=[])
+    runs = evaluate_rules_for_event(session, {"type": "transaction", "event_key": "once", "transaction_id": tx.id})
+    assert [r.status for r in runs] == ["completed"]
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from db import models
+from services.rules_engine import scheduler_tick
+from services.scheduler import fire_index_at_or_before, next_fire_after, run_due
+
+ANCHOR = datetime(2024, 1, 31, 9, 0)
+
+
+def _schedule_rule(session, name, freq, conditions=None):
+    rule = models.Rule(
+        name=name,
+        trigger_type="schedule",
+        trigger_config={"freq": freq},
+        conditions=conditions or [],
+        actions=[{"type": "liability_suggestion", "title": name}],
+        created_at=ANCHOR,
+    )
+    session.add(rule)
+    session.commit()
+    return rule
+
+
+def test_next_fire_times():
+    assert next_fire_after("daily", ANCHOR, datetime(2024, 2, 3, 8)) == datetime(2024, 2, 3, 9)
+    assert next_fire_after("biweekly", ANCHOR, ANCHOR) == datetime(2024, 2, 14, 9)
+    # Monthly clamps to month end and keeps the anchor day afterwards.
+    assert next_fire_after("monthly", ANCHOR, ANCHOR) == datetime(2024, 2, 29, 9)
+    assert next_fire_after("monthly", ANCHOR, datetime(2024, 3, 1)) == datetime(2024, 3, 31, 9)
+    assert fire_index_at_or_before("monthly", ANCHOR, datetime(2024, 3, 31, 8)) == 1
+
+
+def test_only_due_rules_are_evaluated(session):
+    daily = _schedule_rule(session, "daily", "daily")
+    monthly = _schedule_rule(session, "monthly", "monthly")
+
+    first = run_due(session, now=datetime(2024, 2, 1, 10))
+    assert {r.rule_id for r in first} == {daily.id, monthly.id}
+
+    # Hourly ticks before the next window evaluate nothing.
+    assert run_due(session, now=datetime(2024, 2, 1, 11)) == []
+    assert scheduler_tick(session, now=datetime(2024, 2, 1, 12)) == []
+
+    second = run_due(session, now=datetime(2024, 2, 2, 9, 30))
+    assert [r.rule_id for r in second] == [daily.id]
+    schedule = session.get(models.RuleSchedule, daily.id)
+    assert schedule.next_run_at == datetime(2024, 2, 3, 9)
+
+
+def test_catch_up_modes(session):
+    rule = _schedule_rule(session, "daily", "daily", conditions=[{"type": "day_of_month_eq", "value": 3}])
+    run_due(session, now=datetime(2024, 2, 1, 10))
+
+    runs = run_due(session, now=datetime(2024, 2, 5, 10), catch_up="all")
+    keys = [r.event_key for r in runs]
+    assert keys == [f"schedule:daily:202402{d:02d}0900" for d in (2, 3, 4, 5)]
+    # The catch-up window for the 3rd sees its own date, not today's.
+    assert [r.status for r in runs].count("completed") == 1
+
+    later = run_due(session, now=datetime(2024, 2, 9, 10), catch_up="latest")
+    assert [r.event_key for r in later] == ["schedule:daily:202402090900"]
+    assert session.scalar(select(models.RuleSchedule.last_run_at).where(models.RuleSchedule.rule_id == rule.id)) == datetime(
+        2024, 2, 9, 9
+    )
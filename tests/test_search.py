@@ -0,0 +1,56 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, update
+
+from db import models
+from services.search import fts_ready, search_transactions, trigger_history
+
+
+def seed(session):
+    rows = [
+        ("Payroll Deposit ACME", "Acme Corp", 2500),
+        ("Coffee Shop", "Beanery", -4),
+        ("PAYROLL bonus", None, 300),
+        ("100% Juice_Bar", "Juicy", -6),
+    ]
+    for i, (description, merchant, amount) in enumerate(rows):
+        session.add(
+            models.Transaction(
+                tx_hash=f"h{i}", date=date(2024, 1, i + 1), description=description, merchant=merchant, amount=amount
+            )
+        )
+    session.commit()
+
+
+@pytest.fixture(params=["fts", "like"])
+def search_session(request, session):
+    seed(session)
+    if request.param == "like":
+        session.info["fts_ready"] = False
+    else:
+        assert fts_ready(session)
+    return session
+
+
+def test_search_matches_substrings_case_insensitively(search_session):
+    assert [t.description for t in search_transactions(search_session, "roll")] == ["PAYROLL bonus", "Payroll Deposit ACME"]
+    assert [t.description for t in search_transactions(search_session, "beaner")] == ["Coffee Shop"]
+    assert [t.description for t in search_transactions(search_session, "% j")] == ["100% Juice_Bar"]
+    assert [t.description for t in search_transactions(search_session, "e_")] == ["100% Juice_Bar"]
+    assert search_transactions(search_session, "acme corp", columns=("description",)) == []
+
+
+def test_trigger_history_matches_engine_semantics(search_session):
+    rule = models.Rule(trigger_type="transaction", trigger_config={"description_contains": "payroll"})
+    assert [t.amount for t in trigger_history(search_session, rule)] == [2500, 300]
+    assert len(trigger_history(search_session, models.Rule(trigger_type="transaction", trigger_config={}))) == 4
+    assert trigger_history(search_session, models.Rule(trigger_type="schedule", trigger_config={})) == []
+
+
+def test_index_follows_updates_and_deletes(session):
+    seed(session)
+    session.execute(update(models.Transaction).where(models.Transaction.tx_hash == "h1").values(description="Payroll fix"))
+    session.execute(delete(models.Transaction).where(models.Transaction.tx_hash == "h0"))
+    session.commit()
+    assert [t.description for t in search_transactions(session, "payroll")] == ["PAYROLL bonus", "Payroll fix"]
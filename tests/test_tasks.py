@@ -0,0 +1,45 @@
+from datetime import date, datetime, timedelta
+
+from db import models
+from db.profiler import assert_max_queries
+from services.tasks import count_tasks, mark_many_done, page_tasks, task_counts
+
+
+def seed_tasks(session, n=7):
+    start = datetime(2024, 1, 1)
+    # Two tasks share each created_at so the cursor has to break ties on id.
+    for i in range(n):
+        session.add(
+            models.Task(
+                title=f"Pay {i}",
+                task_type="liability_payment",
+                due_date=date(2024, 1, 1) + timedelta(days=i),
+                created_at=start + timedelta(hours=i // 2),
+            )
+        )
+    session.commit()
+
+
+def test_keyset_pages_cover_every_task_once_newest_first(session):
+    seed_tasks(session)
+    seen, cursor = [], None
+    while True:
+        page = page_tasks(session, after=cursor, limit=3)
+        seen += [t.title for t in page.items]
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert seen == [f"Pay {i}" for i in (6, 5, 4, 3, 2, 1, 0)]
+
+    filtered = page_tasks(session, due_from=date(2024, 1, 3), due_to=date(2024, 1, 4))
+    assert [t.title for t in filtered.items] == ["Pay 3", "Pay 2"] and filtered.next_cursor is None
+    assert count_tasks(session, due_from=date(2024, 1, 3)) == 5
+
+
+def test_bulk_mark_done_is_one_update(session):
+    seed_tasks(session, n=4)
+    ids = [t.id for t in page_tasks(session, limit=3).items]
+    with assert_max_queries(session.get_bind(), 1):
+        assert mark_many_done(session, ids) == 3
+    assert task_counts(session) == {"done": 3, "open": 1}
+    assert mark_many_done(session, ids) == 0
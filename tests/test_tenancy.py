@@ -0,0 +1,136 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+from db import models
+from db.tenancy import TenantRegistry
+from services.event_queue import SQLiteQueue, get_queue
+from services.event_worker import process_batch
+from services.rule_compiler import compiled_rule
+
+
+def _rule(name, contains):
+    return models.Rule(
+        name=name,
+        trigger_type="transaction",
+        trigger_config={"description_contains": contains},
+        conditions=[],
+        actions=[],
+    )
+
+
+@pytest.fixture()
+def registry(tmp_path):
+    registry = TenantRegistry(root=tmp_path, max_engines=2)
+    yield registry
+    registry.evict()
+
+
+def test_tenants_get_separate_shards_and_rule_caches(registry, tmp_path):
+    with registry.session("alice") as alice, registry.session("bob") as bob:
+        # Names are unique per tenant, not per deployment.
+        alice.add(_rule("Payday", "payroll"))
+        bob.add(_rule("Payday", "salary"))
+        alice.add(models.Transaction(tx_hash="a", date=date(2024, 1, 1), description="Payroll", amount=10))
+        alice.commit()
+        bob.commit()
+
+        a_rule = alice.scalar(select(models.Rule))
+        b_rule = bob.scalar(select(models.Rule))
+        assert a_rule.id == b_rule.id == 1
+        # Same rule id in both tenants, but each compiles its own definition.
+        assert compiled_rule(a_rule) is not compiled_rule(b_rule)
+        assert alice.info["rule_cache"][1].content_hash != bob.info["rule_cache"][1].content_hash
+        assert bob.scalar(select(models.Transaction)) is None
+
+    assert (tmp_path / "alice" / "moneymesh.db").exists() and (tmp_path / "bob" / "moneymesh.db").exists()
+
+
+def test_least_recently_used_engine_is_evicted(registry):
+    alice = registry.handle("alice")
+    registry.handle("bob")
+    registry.handle("alice")
+    registry.handle("carol")
+    assert registry.tenants() == ["alice", "carol"]
+
+    # The evicted tenant reopens on demand with its data intact.
+    with registry.session("alice") as session:
+        session.add(_rule("Keep", "x"))
+        session.commit()
+    registry.evict("alice")
+    assert registry.handle("alice") is not alice
+    with registry.session("alice") as session:
+        assert session.scalar(select(models.Rule.name)) == "Keep"
+
+
+def test_idle_engines_are_evicted(tmp_path):
+    registry = TenantRegistry(root=tmp_path, idle_seconds=0)
+    registry.handle("alice")
+    registry.handle("bob")
+    assert registry.tenants() == ["bob"]
+    registry.evict()
+
+    # Requests for an open tenant evict idle ones too, without waiting for a new tenant to open.
+    registry = TenantRegistry(root=tmp_path, idle_seconds=60)
+    alice = registry.handle("alice")
+    registry.handle("bob")
+    alice.last_used -= 120
+    registry.handle("bob")
+    assert registry.tenants() == ["bob"]
+    registry.evict()
+
+
+@pytest.mark.parametrize("tenant", ["", "../etc", "Alice", "a b", "x" * 64])
+def test_rejects_unsafe_tenant_ids(registry, tenant):
+    with pytest.raises(ValueError):
+        registry.handle(tenant)
+
+
+class FakeSQS:
+    def __init__(self):
+        self.queues: dict[str, list[dict]] = {}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        depth = len(self.queues.get(QueueUrl, []))
+        return {"Attributes": {"ApproximateNumberOfMessages": depth, "ApproximateNumberOfMessagesNotVisible": 0}}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.queues.setdefault(QueueUrl, []).extend(Entries)
+        return {}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, **kwargs):
+        messages = self.queues.get(QueueUrl, [])[:MaxNumberOfMessages]
+        return {"Messages": [{"ReceiptHandle": m["Id"], "Body": m["MessageBody"]} for m in messages]}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        pass
+
+
+def test_tenant_events_never_cross(registry, monkeypatch):
+    monkeypatch.setenv("FLOWLEDGER_SQS_QUEUE_URL", "https://sqs.example/123/flowledger")
+    client = FakeSQS()
+    with registry.session("alice") as alice, registry.session("bob") as bob:
+        for session, name in ((alice, "Payday"), (bob, "Salary")):
+            session.add(_rule(name, "payroll"))
+            session.add(models.Transaction(tx_hash="t", date=date(2024, 1, 1), description="Payroll", amount=10))
+            session.commit()
+        alice_queue, bob_queue = get_queue(alice, client=client), get_queue(bob, client=client)
+        assert alice_queue.queue_url.endswith("flowledger-alice") and bob_queue.queue_url.endswith("flowledger-bob")
+
+        alice_queue.publish([{"type": "transaction", "event_key": "tx:1", "transaction_id": 1}])
+        assert [json.loads(m["MessageBody"])["tenant"] for m in client.queues[alice_queue.queue_url]] == ["alice"]
+        assert bob_queue.queue_url not in client.queues
+
+        # Even a misrouted event is refused by the other tenant's worker rather than evaluated there.
+        client.queues[bob_queue.queue_url] = list(client.queues[alice_queue.queue_url])
+        assert process_batch(bob, bob_queue, dry_run=False)["refused"] == 1
+        assert bob.scalar(select(func.count()).select_from(models.Run)) == 0
+        assert process_batch(alice, alice_queue, dry_run=False)["processed"] == 1
+        assert alice.scalar(select(func.count()).select_from(models.Run)) == 1
+
+        # The table-backed queue is in each tenant's own database and carries the tenant too.
+        SQLiteQueue(bob).publish([{"type": "transaction", "event_key": "tx:1", "transaction_id": 1}])
+        assert SQLiteQueue(alice).depth() == 0
+        assert [d.event["tenant"] for d in SQLiteQueue(bob).receive()] == ["bob"]
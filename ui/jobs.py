@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import streamlit as st
+
+from db.tenancy import session_factory
+from services.jobs import ACTIVE_STATUSES, JobRunner
+from ui.tenant import current_tenant
+
+POLL_SECONDS = 1.0
+
+
+@st.cache_resource
+def _runner_for(tenant: str | None) -> JobRunner:
+    # One runner per tenant: its jobs table lives in the tenant's database.
+    return JobRunner(session_factory(tenant))
+
+
+def get_runner() -> JobRunner:
+    return _runner_for(current_tenant())
+
+
+def render_job(session, state_key: str, on_success=None) -> dict | None:
+    # Polls the job stored under st.session_state[state_key] without blocking the script run.
+    job_id = st.session_state.get(state_key)
+    if job_id is None:
+        return None
+    runner = get_runner()
+    active = (runner.status(session, job_id) or {}).get("status") in ACTIVE_STATUSES
+
+    @st.fragment(run_every=POLL_SECONDS if active else None)
+    def _panel():
+        job = runner.status(session, job_id)
+        if job is None:
+            st.session_state.pop(state_key, None)
+            return
+        if job["status"] in ACTIVE_STATUSES:
+            st.progress(job["progress"], text=f"{job['kind']} #{job['id']}: {job['message'] or job['status']}")
+            if st.button("Cancel", key=f"cancel_{state_key}_{job_id}"):
+                runner.cancel(job_id)
+            return
+        if active:
+            # Finished since the page rendered: rerun the whole page to stop polling.
+            st.rerun()
+        if job["status"] == "succeeded":
+            if on_success:
+                on_success(job["result"])
+        elif job["status"] == "cancelled":
+            st.warning(f"{job['kind']} #{job['id']} cancelled")
+        else:
+            st.error(f"{job['kind']} #{job['id']} failed: {job['error']}")
+
+    _panel()
+    return runner.status(session, job_id)
@@ -3,25 +3,29 @@ from __future__ import annotations
 import pandas as pd
 import streamlit as st
 from sqlalchemy import select
+from sqlalchemy.orm import Session
 
 from db import models
+from services import columnar
+from services.exports import export_to_spool, iter_run_rows, run_columns
+
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _run_export(bind, fmt: str, include_actions: bool):
+    # Runs on Streamlit's download thread when the button is clicked, so it opens its own session.
+    def build():
+        with Session(bind) as session:
+            return export_to_spool(iter_run_rows(session, include_actions), run_columns(include_actions), fmt)
+
+    return build
 
 
 def render(session):
     st.header("Activity Feed & Audit")
 
-    runs = session.scalars(select(models.Run).order_by(models.Run.created_at.desc())).all()
-    rows = [
-        {
-            "run_id": r.id,
-            "rule_id": r.rule_id,
-            "event_key": r.event_key,
-            "status": r.status,
-            "created_at": r.created_at,
-        }
-        for r in runs
-    ]
-    df = pd.DataFrame(rows)
+    df = columnar.read_frame(session, "runs").rename(columns={"id": "run_id"})
+    df = df.sort_values("created_at", ascending=False, ignore_index=True)
 
     if not df.empty:
         df["created_at"] = pd.to_datetime(df["created_at"])
@@ -40,10 +44,19 @@ def render(session):
 
         st.subheader("Run Timeline")
         st.dataframe(df, use_container_width=True)
-        st.download_button("Export CSV", data=df.to_csv(index=False), file_name="activity_feed.csv", mime="text/csv")
+        e1, e2, e3 = st.columns(3)
+        fmt = e1.radio("Export format", ["csv", "parquet"], horizontal=True)
+        include_actions = e2.checkbox("One row per action result")
+        e3.download_button(
+            "Export runs",
+            data=_run_export(session.get_bind(), fmt, include_actions),
+            file_name=f"activity_feed.{fmt}",
+            mime=MIME_TYPES[fmt],
+        )
     else:
         st.info("No runs yet. Execute a simulation or scheduled tick to populate activity.")
 
     st.subheader("Latest run explanation")
-    if runs:
-        st.json(runs[0].trace)
+    latest = session.scalar(select(models.Run).order_by(models.Run.created_at.desc()).limit(1))
+    if latest:
+        st.json(latest.trace)
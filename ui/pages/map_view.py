@@ -9,6 +9,7 @@ import streamlit.components.v1 as components
 from sqlalchemy import select
 
 from db import models
+from services.ledger import balances, record_snapshot
 
 
 def _render_table_fallback(nodes, edges, reason: str):
@@ -51,12 +52,34 @@ def _render_overview(nodes, edges):
         st.bar_chart(count_by_type, x="type", y="count", color="#9775fa")
 
 
+def _render_balances(session):
+    st.subheader("Balances")
+    as_of = st.date_input("As of", value=None, help="Leave empty for current balances")
+    pods = session.scalars(select(models.Pod).order_by(models.Pod.name)).all()
+    accounts = session.scalars(select(models.Account).order_by(models.Account.name)).all()
+    pod_balances = balances(session, "pod", [p.id for p in pods], as_of)
+    account_balances = balances(session, "account", [a.id for a in accounts], as_of)
+    rows = [{"type": "pod", "name": p.name, "balance": pod_balances[p.id], "target": p.target_balance} for p in pods]
+    rows += [{"type": "account", "name": a.name, "balance": account_balances[a.id], "target": None} for a in accounts]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    if accounts:
+        with st.form("snapshot"):
+            account = st.selectbox("Account", accounts, format_func=lambda a: a.name)
+            amount = st.number_input("Observed balance", step=1.0)
+            if st.form_submit_button("Record balance"):
+                record_snapshot(session, "account", account.id, float(amount))
+                session.commit()
+                st.success(f"Recorded {account.name} balance")
+
+
 def render(session):
     st.header("Money Map")
     nodes = session.scalars(select(models.MoneyMapNode)).all()
     edges = session.scalars(select(models.MoneyMapEdge)).all()
 
     _render_overview(nodes, edges)
+    _render_balances(session)
 
     if st.button("Create quick edge"):
         if len(nodes) >= 2:
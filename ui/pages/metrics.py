@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pandas as pd
+import streamlit as st
+
+from services.metrics import registry
+
+
+def render(session):
+    st.header("Rules Engine Metrics")
+    st.caption("Latency histograms and run counts recorded in this process. Set FLOWLEDGER_METRICS=1 to enable at startup.")
+
+    c1, c2 = st.columns(2)
+    enabled = c1.toggle("Record metrics", value=registry.enabled)
+    if enabled != registry.enabled:
+        registry.enabled = enabled
+    if c2.button("Reset metrics"):
+        registry.reset()
+        st.success("Metrics cleared")
+
+    counters = pd.DataFrame(registry.counter_rows())
+    histograms = pd.DataFrame(registry.histogram_rows())
+
+    if counters.empty and histograms.empty:
+        st.info("No metrics recorded yet. Enable recording and run a simulation or scheduled tick.")
+        return
+
+    if not counters.empty:
+        st.subheader("Runs by Status")
+        by_status = counters.groupby("status", as_index=False)["value"].sum()
+        st.bar_chart(by_status, x="status", y="value", color="#4dabf7")
+        st.dataframe(counters.drop(columns=["metric"]), use_container_width=True)
+
+    if not histograms.empty:
+        st.subheader("Slowest Rules")
+        per_rule = (
+            histograms.assign(total_ms=histograms["avg_ms"] * histograms["count"])
+            .groupby("rule_id", as_index=False)[["count", "total_ms"]]
+            .sum()
+            .sort_values("total_ms", ascending=False)
+        )
+        st.dataframe(per_rule, use_container_width=True)
+
+        st.subheader("Stage Latency")
+        st.dataframe(histograms, use_container_width=True)
+
+    with st.expander("Prometheus exposition"):
+        text = registry.render_prometheus()
+        st.code(text, language="text")
+        st.download_button("Download metrics", data=text, file_name="flowledger_metrics.prom", mime="text/plain")
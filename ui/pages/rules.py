@@ -5,7 +5,11 @@ import streamlit as st
 from sqlalchemy import select
 
 from db import models
+from services.rule_compiler import RuleValidationError, ensure_valid, invalidate, validate_rule
+from services.rule_versions import DEFINITION_FIELDS, diff_rule_versions, list_versions, record_version
 from services.rules_engine import run_rule
+from services.scheduler import reschedule_rule
+from services.search import search_transactions, trigger_history
 
 
 def render(session):
@@ -18,26 +22,50 @@ def render(session):
     conditions_text = st.text_area("Conditions JSON list", value='[{"type":"amount_gte","value":100}]')
     actions_text = st.text_area("Actions JSON list", value='[{"type":"allocate_fixed","pod_id":1,"amount":50,"up_to_available":true}]')
 
+    if trigger_type == "transaction":
+        with st.expander("Which past transactions would this trigger match?"):
+            try:
+                preview = models.Rule(trigger_type=trigger_type, trigger_config=json.loads(trigger_config))
+            except json.JSONDecodeError:
+                st.caption("Trigger config is not valid JSON yet")
+            else:
+                matches = trigger_history(session, preview, limit=200)
+                st.caption(f"{len(matches)}{'+' if len(matches) == 200 else ''} matching transactions")
+                st.dataframe([{"date": t.date, "description": t.description, "amount": t.amount} for t in matches[-20:]])
+
     c1, c2, c3 = st.columns(3)
     if c1.button("Save draft") and rule_name:
-        rule = models.Rule(
-            name=rule_name,
-            priority=int(priority),
-            trigger_type=trigger_type,
-            trigger_config=json.loads(trigger_config),
-            conditions=json.loads(conditions_text),
-            actions=json.loads(actions_text),
-            enabled=False,
-        )
-        session.add(rule)
-        session.commit()
-        st.success("Draft saved")
+        try:
+            config, conditions, actions = json.loads(trigger_config), json.loads(conditions_text), json.loads(actions_text)
+            ensure_valid(trigger_type, config, conditions, actions)
+        except json.JSONDecodeError as exc:
+            st.error(f"Invalid JSON: {exc}")
+        except RuleValidationError as exc:
+            st.error("Rule not saved:\n" + "\n".join(f"- {e}" for e in exc.errors))
+        else:
+            rule = models.Rule(
+                name=rule_name,
+                priority=int(priority),
+                trigger_type=trigger_type,
+                trigger_config=config,
+                conditions=conditions,
+                actions=actions,
+                enabled=False,
+            )
+            session.add(rule)
+            session.flush()
+            record_version(session, rule)
+            session.commit()
+            invalidate(rule.id, session)
+            st.success("Draft saved")
 
     if c2.button("Enable/Disable rule"):
         rules = session.scalars(select(models.Rule).order_by(models.Rule.created_at.desc())).all()
         if rules:
             rules[0].enabled = not rules[0].enabled
             session.commit()
+            invalidate(rules[0].id, session)
+            reschedule_rule(session, rules[0])
             st.info(f"Toggled {rules[0].name} => {rules[0].enabled}")
 
     if c3.button("Simulate"):
@@ -47,8 +75,96 @@ def render(session):
             run, _ = run_rule(session, rule, {"type": "transaction", "event_key": f"manual-sim:{rule.id}:{tx.id}", "transaction_id": tx.id}, tx=tx)
             st.json(run.trace)
 
+    term = st.text_input("Search transactions (description or merchant)")
+    if term:
+        found = search_transactions(session, term)
+        st.dataframe([{"date": t.date, "description": t.description, "amount": t.amount} for t in found])
+
     st.subheader("Rules")
+    rules = session.scalars(select(models.Rule).order_by(models.Rule.priority.desc())).all()
     rows = []
-    for r in session.scalars(select(models.Rule).order_by(models.Rule.priority.desc())).all():
+    for r in rules:
         rows.append({"id": r.id, "name": r.name, "priority": r.priority, "trigger": r.trigger_type, "enabled": r.enabled})
     st.dataframe(rows)
+    if rules:
+        _render_edit(session, rules)
+
+
+def _show_diff(report):
+    s = report.summary
+    st.caption(
+        f"{report.old_label} vs {report.new_label}: {report.transactions_scanned} transactions scanned, "
+        f"{len(report.changed)} changed"
+    )
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Status changes", s["status_changes"])
+    c2.metric("Allocated", s["new_total_allocated"], round(s["new_total_allocated"] - s["old_total_allocated"], 2))
+    c3.metric("Tasks", s["new_tasks"], s["new_tasks"] - s["old_tasks"])
+    st.dataframe(
+        [
+            {
+                "date": c["date"],
+                "description": c["description"],
+                "amount": c["amount"],
+                "changes": ", ".join(c["changes"]),
+                "old status": c["old"]["status"],
+                "new status": c["new"]["status"],
+                "old allocated": c["old"]["allocated"],
+                "new allocated": c["new"]["allocated"],
+            }
+            for c in report.changed
+        ]
+    )
+
+
+def _render_edit(session, rules):
+    st.subheader("Edit rule")
+    rule = st.selectbox("Rule", rules, format_func=lambda r: f"#{r.id} {r.name}")
+    current = {field: getattr(rule, field) for field in DEFINITION_FIELDS}
+    edited_text = st.text_area("Definition JSON", value=json.dumps(current, indent=2), height=300, key=f"rule_edit_{rule.id}")
+    days = st.number_input("Compare over last N days", min_value=1, max_value=730, value=90)
+    try:
+        parsed = json.loads(edited_text)
+    except json.JSONDecodeError as exc:
+        st.error(f"Invalid JSON: {exc}")
+        return
+    if not isinstance(parsed, dict):
+        st.error("The definition must be a JSON object")
+        return
+    edited = {**current, **parsed}
+    errors = validate_rule(edited["trigger_type"], edited["trigger_config"], edited["conditions"], edited["actions"])
+
+    c1, c2 = st.columns(2)
+    if c1.button("Preview impact"):
+        if errors:
+            st.error("Cannot preview:\n" + "\n".join(f"- {e}" for e in errors))
+        else:
+            bar = st.progress(0.0)
+            _show_diff(
+                diff_rule_versions(session, rule, edited, days=int(days), progress=lambda p, text: bar.progress(p, text=text))
+            )
+            bar.empty()
+    if c2.button("Save new version"):
+        if errors:
+            st.error("Rule not saved:\n" + "\n".join(f"- {e}" for e in errors))
+        else:
+            # Rules created before versioning get their current definition stored first, so it can be compared.
+            record_version(session, rule)
+            for field in DEFINITION_FIELDS:
+                setattr(rule, field, edited[field])
+            session.flush()
+            version = record_version(session, rule)
+            session.commit()
+            invalidate(rule.id, session)
+            reschedule_rule(session, rule)
+            st.success(f"Saved version {version.version}" if version else "No changes to save")
+
+    versions = list_versions(session, rule.id)
+    if len(versions) > 1:
+        with st.expander("Version history"):
+            st.dataframe([{"version": v.version, "saved": v.created_at, "hash": v.content_hash[:10]} for v in versions])
+            v1, v2 = st.columns(2)
+            old = v1.selectbox("Compare", versions[1:], format_func=lambda v: f"v{v.version}")
+            new = v2.selectbox("with", versions, format_func=lambda v: f"v{v.version}")
+            if st.button("Compare versions"):
+                _show_diff(diff_rule_versions(session, old, new, days=int(days)))
@@ -2,27 +2,81 @@ from __future__ import annotations
 
 import streamlit as st
 
-from services.demo_loader import load_demo_data
-from services.imports import ingest_transactions
+from services.jobs import save_upload
+from services.readers import EXTENSIONS
+from ui.jobs import get_runner, render_job
+
+
+def _import_done(result: dict):
+    st.success(f"Imported {result['created']} transactions")
+    if result.get("quarantined"):
+        st.warning(f"{result['quarantined']} rows failed validation and were quarantined")
+        st.dataframe(
+            [
+                {"file": e.get("source"), "row": e["row"], "errors": "; ".join(f"{x['field']}: {x['message']}" for x in e["errors"])}
+                for e in result["errors"]
+            ],
+            use_container_width=True,
+        )
+    for f in result.get("files", []):
+        if f["error"]:
+            st.error(f"{f['source']} was not imported: {f['error']}")
+    if result.get("events"):
+        st.caption(f"{result['events']} events queued; run `python -m services.event_worker` to evaluate them.")
+    if result.get("unpublished"):
+        st.warning(f"The queue was unavailable; {result['unpublished']} events wait in the outbox for the worker to send.")
+
+
+def _demo_done(result: dict):
+    st.success("Demo data is ready. Visit Money Map.")
+
+
+def _retention_done(result: dict):
+    st.success(
+        f"Compacted {result['runs_compacted']} runs ({result['action_results_deleted']} action results, "
+        f"{result['error_logs_deleted']} error logs) into daily summaries; {result['archived_files']} archive files written"
+    )
 
 
 def render(session):
     st.header("Settings & Data")
-    up = st.file_uploader("Upload transactions CSV")
-    if up and st.button("Import CSV"):
-        result = ingest_transactions(session, up)
-        st.success(f"Imported {result['created']} transactions")
+    uploads = st.file_uploader(
+        "Upload transactions (CSV, Parquet, Arrow, OFX/QFX)", type=sorted(EXTENSIONS), accept_multiple_files=True
+    )
+    publish = st.checkbox("Queue imported transactions for the rules worker", value=True)
+    if uploads and st.button("Import"):
+        paths = [str(save_upload(up.name, up.getvalue())) for up in uploads]
+        if len(uploads) == 1:
+            params = {"path": paths[0], "name": uploads[0].name}
+        else:
+            # Several statements are parsed in parallel and deduplicated against each other.
+            params = {"paths": paths, "names": [up.name for up in uploads]}
+        st.session_state["import_job"] = get_runner().submit(
+            "import", {**params, "publish": publish, "delete_after": True}
+        )
+    render_job(session, "import_job", on_success=_import_done)
 
     if st.button("Load Demo Data"):
-        load_demo_data(session, ".")
-        st.toast("Demo loaded")
-        st.success("Demo data is ready. Visit Money Map.")
+        st.session_state["demo_job"] = get_runner().submit("demo", {"root_path": "."})
+        st.toast("Loading demo data in the background")
+    render_job(session, "demo_job", on_success=_demo_done)
+
+    st.subheader("Retention")
+    detail_days = st.number_input("Keep run detail for (days)", min_value=1, max_value=3650, value=90)
+    archive = st.checkbox("Archive compacted rows to Parquet", value=True)
+    if st.button("Compact old runs"):
+        st.session_state["retention_job"] = get_runner().submit("retention", {"detail_days": int(detail_days), "archive": archive})
+    render_job(session, "retention_job", on_success=_retention_done)
 
     st.markdown(
         """
 **CSV Defaults**
 - Required columns: `date` (YYYY-MM-DD), `description`, `amount` (+inflow, -outflow)
 - Optional columns: `account`, `category`, `merchant`, `currency`
-- Imports are read-only and deduplicated by content hash.
+- Parquet/Arrow files are read with the same column names; other columns are not decoded.
+- OFX/QFX statements map `DTPOSTED`, `TRNAMT`, `NAME`/`MEMO`, `ACCTID` and `CURDEF`.
+- The format is detected from the file extension, then from the file header.
+- Rows are validated in chunks against `TransactionSchema`; invalid rows are quarantined and the rest are imported.
+- Imports are read-only and deduplicated by content hash, across all files uploaded together and existing rows.
         """
     )
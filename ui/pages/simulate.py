@@ -7,14 +7,21 @@ import streamlit as st
 from sqlalchemy import select
 
 from db import models
-from services.simulator import simulate_rule
+from services import columnar
+from services.exports import export_to_spool, iter_simulation_rows, simulation_columns
+from services.fx import base_currency, load_fx_table
+from schemas.domain import SimulationReport
+from ui.jobs import get_runner, render_job
 
 
-def _forecast_cashflow(transactions: list[models.Transaction], horizon_days: int = 30) -> pd.DataFrame:
-    if not transactions:
+def _forecast_cashflow(transactions: list[models.Transaction] | pd.DataFrame, horizon_days: int = 30) -> pd.DataFrame:
+    if len(transactions) == 0:
         return pd.DataFrame(columns=["date", "projected_net"])
 
-    df = pd.DataFrame([{"date": t.date, "amount": t.amount} for t in transactions])
+    if isinstance(transactions, pd.DataFrame):
+        df = transactions[["date", "amount"]]
+    else:
+        df = pd.DataFrame([{"date": t.date, "amount": t.amount} for t in transactions])
     daily = df.groupby("date", as_index=False)["amount"].sum().sort_values("date")
     daily["date"] = pd.to_datetime(daily["date"])
 
@@ -54,31 +61,45 @@ def render(session):
     days = st.number_input("Lookback days", min_value=7, max_value=365, value=90)
 
     if st.button("Run simulation", type="primary"):
-        report = simulate_rule(session, picked.id, days=days)
-
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Warnings", len(report.summary.get("warnings", [])))
-        c2.metric("Tasks Created", report.summary.get("tasks_created", 0))
-        c3.metric("Pods Allocated", len(report.summary.get("totals_allocated_per_pod", {})))
-
-        st.subheader("Allocation Breakdown")
-        totals = report.summary.get("totals_allocated_per_pod", {})
-        if totals:
-            alloc_df = pd.DataFrame([{"pod": str(k), "allocated": v} for k, v in totals.items()])
-            st.bar_chart(alloc_df, x="pod", y="allocated", color="#69db7c")
-        else:
-            st.info("No allocations in selected period.")
-
-        st.subheader("Cashflow Projection (next 30 days)")
-        txs = session.scalars(select(models.Transaction).order_by(models.Transaction.date)).all()
-        forecast_df = _forecast_cashflow(txs, horizon_days=30)
-        if not forecast_df.empty:
-            st.line_chart(forecast_df.set_index("date"))
-            st.dataframe(forecast_df.tail(10), use_container_width=True)
-        else:
-            st.info("Not enough history to generate projection.")
-
-        with st.expander("Step-by-step trace"):
-            for t in report.traces[:60]:
-                st.write(f"Tx {t['transaction_id']}: {t['status']}")
-                st.json(t["trace"])
+        st.session_state["simulate_job"] = get_runner().submit("simulate", {"rule_id": picked.id, "days": int(days)})
+
+    render_job(session, "simulate_job", on_success=lambda result: _render_report(session, SimulationReport(**result)))
+
+
+def _render_report(session, report: SimulationReport):
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Warnings", len(report.summary.get("warnings", [])))
+    c2.metric("Tasks Created", report.summary.get("tasks_created", 0))
+    c3.metric("Pods Allocated", len(report.summary.get("totals_allocated_per_pod", {})))
+
+    st.subheader("Allocation Breakdown")
+    totals = report.summary.get("totals_allocated_per_pod", {})
+    if totals:
+        alloc_df = pd.DataFrame([{"pod": str(k), "allocated": v} for k, v in totals.items()])
+        st.bar_chart(alloc_df, x="pod", y="allocated", color="#69db7c")
+    else:
+        st.info("No allocations in selected period.")
+
+    st.subheader("Cashflow Projection (next 30 days)")
+    txs = columnar.read_frame(session, "transactions", columns=["date", "amount", "currency"])
+    txs = load_fx_table().convert_frame(txs, base_currency(session)).assign(amount=lambda d: d["amount_base"])
+    forecast_df = _forecast_cashflow(txs, horizon_days=30)
+    if not forecast_df.empty:
+        st.line_chart(forecast_df.set_index("date"))
+        st.dataframe(forecast_df.tail(10), use_container_width=True)
+    else:
+        st.info("Not enough history to generate projection.")
+
+    e1, e2 = st.columns(2)
+    include_actions = e1.checkbox("One row per action", key="simulate_export_actions")
+    e2.download_button(
+        "Export traces (CSV)",
+        data=lambda: export_to_spool(iter_simulation_rows(report.traces, include_actions), simulation_columns(include_actions)),
+        file_name=f"simulation_{report.rule_name}.csv",
+        mime="text/csv",
+    )
+
+    with st.expander("Step-by-step trace"):
+        for t in report.traces[:60]:
+            st.write(f"Tx {t['transaction_id']}: {t['status']}")
+            st.json(t["trace"])
@@ -1,19 +1,77 @@
 from __future__ import annotations
 
+import pandas as pd
 import streamlit as st
-from services.tasks import list_tasks, mark_done
+
+from services.tasks import count_tasks, mark_done, mark_many_done, page_tasks, task_counts
+
+PAGE_KEY = "tasks_cursors"
+# Confirmation shown on the run after an update; st.rerun() would drop anything drawn before it.
+FLASH_KEY = "tasks_flash"
+
+
+def _reset_paging():
+    st.session_state[PAGE_KEY] = [None]
 
 
 def render(session):
     st.header("Next Actions")
-    status_filter = st.selectbox("Filter", ["all", "open", "done"])
-    tasks = list_tasks(session, None if status_filter == "all" else status_filter)
-    for task in tasks:
-        with st.container(border=True):
-            st.write(f"#{task.id} {task.title} ({task.status})")
-            st.caption(f"type: {task.task_type} due: {task.due_date}")
-            note = st.text_input(f"Note for {task.id}", key=f"note_{task.id}")
-            ref = st.text_input(f"Reference for {task.id}", key=f"ref_{task.id}")
-            if task.status != "done" and st.button(f"Mark done {task.id}"):
+    flash = st.session_state.pop(FLASH_KEY, None)
+    if flash:
+        st.success(flash)
+    counts = task_counts(session)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Open", counts.get("open", 0))
+    c2.metric("Done", counts.get("done", 0))
+    c3.metric("Total", sum(counts.values()))
+
+    f1, f2, f3 = st.columns(3)
+    status_filter = f1.selectbox("Filter", ["all", "open", "done"], on_change=_reset_paging)
+    due_from = f2.date_input("Due from", value=None, on_change=_reset_paging)
+    due_to = f3.date_input("Due to", value=None, on_change=_reset_paging)
+    status = None if status_filter == "all" else status_filter
+
+    # Stack of cursors for the pages visited so far; the last one is the current page.
+    cursors = st.session_state.setdefault(PAGE_KEY, [None])
+    page = page_tasks(session, status, due_from, due_to, after=cursors[-1])
+    total = count_tasks(session, status, due_from, due_to)
+    st.caption(f"Page {len(cursors)} · {total} matching tasks")
+
+    frame = pd.DataFrame(
+        [
+            {"select": False, "id": t.id, "title": t.title, "status": t.status, "type": t.task_type, "due": t.due_date}
+            for t in page.items
+        ],
+        columns=["select", "id", "title", "status", "type", "due"],
+    )
+    edited = st.data_editor(
+        frame,
+        hide_index=True,
+        disabled=["id", "title", "status", "type", "due"],
+        key=f"tasks_page_{len(cursors)}",
+        use_container_width=True,
+    )
+    selected = edited.loc[edited["select"], "id"].astype(int).tolist()
+
+    b1, b2, b3 = st.columns(3)
+    if b1.button(f"Mark {len(selected)} selected done", disabled=not selected):
+        updated = mark_many_done(session, selected)
+        st.session_state[FLASH_KEY] = f"Marked {updated} tasks done"
+        st.rerun()
+    if b2.button("Previous page", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if b3.button("Next page", disabled=page.next_cursor is None):
+        cursors.append(page.next_cursor)
+        st.rerun()
+
+    open_tasks = [t for t in page.items if t.status != "done"]
+    if open_tasks:
+        with st.form("task_done"):
+            task = st.selectbox("Complete with note", open_tasks, format_func=lambda t: f"#{t.id} {t.title}")
+            note = st.text_input("Note")
+            ref = st.text_input("Reference")
+            if st.form_submit_button("Mark done"):
                 mark_done(session, task.id, note, ref)
-                st.success("Updated")
+                st.session_state[FLASH_KEY] = "Updated"
+                st.rerun()
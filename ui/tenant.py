@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import os
+
+import streamlit as st
+
+from db.tenancy import check_tenant_id
+
+# The reverse proxy that authenticates users sets this header, and must strip any copy the client
+# sent. FLOWLEDGER_TENANT pins a deployment to one tenant and then the header is ignored. With
+# neither, the app uses the single-household database.
+TENANT_HEADER = "X-Flowledger-Tenant"
+
+
+def current_tenant() -> str | None:
+    tenant = os.environ.get("FLOWLEDGER_TENANT") or st.context.headers.get(TENANT_HEADER)
+    return check_tenant_id(tenant.strip().lower()) if tenant else None